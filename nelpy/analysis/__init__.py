@@ -9,6 +9,7 @@ nelpy.analysis provides several commonly used analyses.
 
 from .replay import *
 from .ergodic import *
+from .sweep import *
 # from .ripple import *
 # from .decoding import *
 
@@ -1,54 +1,163 @@
-__all__ = ['linregress_ting',
+__all__ = ['run_shuffles',
+           'linregress_ting',
            'linregress_array',
            'linregress_bst',
            'time_swap_array',
            'column_cycle_array',
+           'time_swap_indices',
+           'column_cycle_shifts',
            'trajectory_score_array',
+           'trajectory_score_surrogates',
            'trajectory_score_bst',
+           'trajectory_line_search_array',
+           'trajectory_line_search_bst',
            'get_significant_events',
            'three_consecutive_bins_above_q',
            'score_hmm_time_resolved',
            'score_hmm_logprob_cumulative']
 
+import os
 import warnings
 import copy
 import numpy as np
 
-from scipy import stats
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from .. import auxiliary
 from ..decoding import decode1D as decode
 from ..decoding import get_mode_pth_from_array, get_mean_pth_from_array
+from ..decoding import _get_chunk_size
+
+def _run_shuffle_chunk(func, indices, seeds, args, kwargs, pass_index):
+    """Evaluate func once for each seed, with a fresh Generator each time."""
+    if pass_index:
+        return [func(np.random.default_rng(seed), ii, *args, **kwargs)
+                for ii, seed in zip(indices, seeds)]
+    return [func(np.random.default_rng(seed), *args, **kwargs) for seed in seeds]
+
+def run_shuffles(func, n_shuffles, *, args=(), kwargs=None, random_state=None,
+                 n_jobs=1, backend='process', pass_index=False):
+    """Evaluate a shuffle function n_shuffles times, possibly in parallel.
+
+    Every shuffle iteration gets its own independent numpy.random.Generator,
+    spawned from a single SeedSequence, so that the results for a given
+    random_state are identical regardless of n_jobs or backend.
+
+    Parameters
+    ----------
+    func : callable
+        Function with signature func(rng, *args, **kwargs) computing the
+        result of a single shuffle iteration, where rng is a
+        numpy.random.Generator. With the 'process' backend, func, args
+        and kwargs must be picklable (e.g., func must be defined at the
+        module level).
+    n_shuffles : int
+        Number of shuffle iterations.
+    args : tuple, optional
+        Positional arguments passed to func.
+    kwargs : dict, optional
+        Keyword arguments passed to func.
+    random_state : None, int, array_like or numpy.random.SeedSequence, optional
+        Seed from which the per-shuffle streams are spawned. Default is
+        None, in which case the seed is drawn from the global numpy
+        random state, so that np.random.seed() still makes the shuffles
+        reproducible.
+    n_jobs : int, optional
+        Number of workers. If n_jobs < 0, os.cpu_count() workers are
+        used. Default is 1 (no parallelism).
+    backend : str, optional
+        Either 'process' (default) or 'thread'.
+    pass_index : bool, optional
+        If True, func is called as func(rng, ii, *args, **kwargs), where
+        ii is the iteration number. This is useful to spread independent
+        tasks, e.g., one per event, across the workers. Default is False.
 
-def linregress_ting(bst, tuningcurve, n_shuffles=250):
-    """perform linear regression on all the events in bst, and return the R^2 values"""
+    Returns
+    -------
+    results : list
+        Return values of func, in order of shuffle iteration.
+    """
+    if kwargs is None:
+        kwargs = {}
+    if not float(n_shuffles).is_integer():
+        raise ValueError("n_shuffles must be an integer!")
+    n_shuffles = int(n_shuffles)
 
-    if float(n_shuffles).is_integer:
+    if isinstance(random_state, np.random.SeedSequence):
+        seedseq = random_state
+    elif random_state is None:
+        seedseq = np.random.SeedSequence(np.random.randint(2**32, dtype=np.int64))
+    else:
+        seedseq = np.random.SeedSequence(random_state)
+    seeds = seedseq.spawn(n_shuffles)
+
+    if n_jobs is None:
+        n_jobs = 1
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, n_shuffles)
+
+    if n_jobs <= 1:
+        return _run_shuffle_chunk(func, range(n_shuffles), seeds, args,
+                                  kwargs, pass_index)
+
+    if backend == 'process':
+        Executor = ProcessPoolExecutor
+    elif backend == 'thread':
+        Executor = ThreadPoolExecutor
+    else:
+        raise ValueError("backend must be either 'process' or 'thread'")
+
+    chunks = np.array_split(np.arange(n_shuffles), n_jobs)
+    with Executor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(_run_shuffle_chunk,
+                                   func,
+                                   chunk,
+                                   [seeds[ii] for ii in chunk],
+                                   args,
+                                   kwargs,
+                                   pass_index) for chunk in chunks]
+        results = [result for future in futures for result in future.result()]
+
+    return results
+
+def _linregress_shuffle(rng, mode_pth, bdries):
+    """R^2 values of all events after permuting the time bins once.
+
+    The decoded bins of every event are permuted in one go, by sorting
+    random keys offset by the event index."""
+    valid = ~np.isnan(mode_pth)
+    x = np.flatnonzero(valid)
+    y = mode_pth[valid]
+    valid_bdries = np.insert(np.cumsum(valid), 0, 0)[bdries]
+    seg_id = np.repeat(np.arange(len(bdries) - 1), np.diff(valid_bdries))
+    perm = np.argsort(seg_id + rng.random(len(x)), kind='mergesort')
+    _, _, r2values = _linregress_segments(x[perm], y, valid_bdries)
+    return r2values
+
+def linregress_ting(bst, tuningcurve, n_shuffles=250, *, random_state=None, n_jobs=1):
+    """perform linear regression on all the events in bst, and return the R^2 values
+
+    Shuffles are evaluated with run_shuffles, so that random_state and
+    n_jobs are passed on to it. Every shuffle fits all of the events at
+    once (see _linregress_segments)."""
+
+    if float(n_shuffles).is_integer():
         n_shuffles = int(n_shuffles)
     else:
         raise ValueError("n_shuffles must be an integer!")
 
     posterior, bdries, mode_pth, mean_pth = decode(bst=bst, ratemap=tuningcurve)
 
-#     bdries = np.insert(np.cumsum(bst.lengths), 0, 0)
-    r2values = np.zeros(bst.n_epochs)
+    _, _, r2values = _linregress_segments(np.arange(len(mode_pth)), mode_pth, bdries)
+
     r2values_shuffled = np.zeros((n_shuffles, bst.n_epochs))
-    for idx in range(bst.n_epochs):
-        y = mode_pth[bdries[idx]:bdries[idx+1]]
-        x = np.arange(bdries[idx],bdries[idx+1], step=1)
-        x = x[~np.isnan(y)]
-        y = y[~np.isnan(y)]
-
-        if len(y) > 0:
-            slope, intercept, rvalue, pvalue, stderr = stats.linregress(x, y)
-            r2values[idx] = rvalue**2
-        else:
-            r2values[idx] = np.nan #
-        for ss in range(n_shuffles):
-            if len(y) > 0:
-                slope, intercept, rvalue, pvalue, stderr = stats.linregress(np.random.permutation(x), y)
-                r2values_shuffled[ss, idx] = rvalue**2
-            else:
-                r2values_shuffled[ss, idx] = np.nan # event contained NO decoded activity... unlikely or even impossible with current code
+    if n_shuffles > 0:
+        r2values_shuffled[:] = run_shuffles(_linregress_shuffle,
+                                            n_shuffles,
+                                            args=(mode_pth, bdries),
+                                            random_state=random_state,
+                                            n_jobs=n_jobs)
 
 #     sig_idx = np.argwhere(r2values[0,:] > np.percentile(r2values, q=q, axis=0))
 #     np.argwhere(((R2[1:,:] >= R2[0,:]).sum(axis=0))/(R2.shape[0]-1)<0.05) # equivalent to above
@@ -61,16 +170,8 @@ def linregress_array(posterior):
 
     mode_pth = get_mode_pth_from_array(posterior)
 
-    y = mode_pth
-    x = np.arange(len(y))
-    x = x[~np.isnan(y)]
-    y = y[~np.isnan(y)]
-
-    if len(y) > 0:
-        slope, intercept, rvalue, pvalue, stderr = stats.linregress(x, y)
-        return slope, intercept, rvalue**2
-    else:
-        return np.nan, np.nan, np.nan
+    slopes, intercepts, r2values = _linregress_rows(mode_pth)
+    return slopes[0], intercepts[0], r2values[0]
 
 
 def linregress_bst(bst, tuningcurve):
@@ -78,68 +179,67 @@ def linregress_bst(bst, tuningcurve):
 
     posterior, bdries, mode_pth, mean_pth = decode(bst=bst, ratemap=tuningcurve)
 
-    slopes = np.zeros(bst.n_epochs)
-    intercepts = np.zeros(bst.n_epochs)
-    r2values = np.zeros(bst.n_epochs)
-    for idx in range(bst.n_epochs):
-        y = mode_pth[bdries[idx]:bdries[idx+1]]
-        x = np.arange(bdries[idx],bdries[idx+1], step=1)
-        x = x[~np.isnan(y)]
-        y = y[~np.isnan(y)]
-
-        if len(y) > 0:
-            slope, intercept, rvalue, pvalue, stderr = stats.linregress(x, y)
-            slopes[idx] = slope
-            intercepts[idx] = intercept
-            r2values[idx] = rvalue**2
-        else:
-            slopes[idx] = np.nan
-            intercepts[idx] = np.nan
-            r2values[idx] = np.nan #
+    slopes, intercepts, r2values = _linregress_segments(np.arange(len(mode_pth)), mode_pth, bdries)
 #     if bst.n_epochs == 1:
 #         return np.asscalar(slopes), np.asscalar(intercepts), np.asscalar(r2values)
     return slopes, intercepts, r2values
 
-def time_swap_array(posterior):
+def time_swap_array(posterior, rng=None):
     """Time swap.
     Note: it is often possible to simply shuffle the time bins, and not the actual data, for computational
-    efficiency. Still, this function works as expected."""
+    efficiency. Still, this function works as expected.
+
+    If rng (a numpy.random.Generator) is None, the global numpy random
+    state is used."""
+    if rng is None:
+        rng = np.random
     out = copy.deepcopy(posterior)
     rows, cols = posterior.shape
 
     colidx = np.arange(cols)
-    shuffle_cols = np.random.permutation(colidx)
+    shuffle_cols = rng.permutation(colidx)
     out = out[:,shuffle_cols]
 
     return out
 
-def time_swap_bst(bst):
-    """Time swap on BinnedSpikeTrainArray, swapping only within each epoch."""
+def time_swap_bst(bst, rng=None):
+    """Time swap on BinnedSpikeTrainArray, swapping only within each epoch.
+
+    If rng (a numpy.random.Generator) is None, the global numpy random
+    state is used."""
+    if rng is None:
+        rng = np.random
     out = copy.deepcopy(bst) # should this be deep? YES! Oh my goodness, yes!
     shuffled = np.arange(bst.n_bins)
     edges = np.insert(np.cumsum(bst.lengths),0,0)
     for ii in range(bst.n_epochs):
         segment = shuffled[edges[ii]:edges[ii+1]]
-        shuffled[edges[ii]:edges[ii+1]] = np.random.permutation(segment)
+        shuffled[edges[ii]:edges[ii+1]] = rng.permutation(segment)
 
     out._data = out._data[:,shuffled]
 
     return out
 
-def column_cycle_array(posterior, amt=None):
+def column_cycle_array(posterior, amt=None, rng=None):
     """Also called 'position cycle' by Kloosterman et al.
     If amt is an array of the same length as posterior, then
     cycle each column by the corresponding amount in amt.
-    Otherwise, cycle each column by a random amount."""
+    Otherwise, cycle each column by a random amount, drawn from rng (a
+    numpy.random.Generator), or from the global numpy random state if
+    rng is None."""
     out = copy.deepcopy(posterior)
     rows, cols = posterior.shape
 
     if amt is None:
+        if rng is None:
+            randint = np.random.randint
+        else:
+            randint = rng.integers
         for col in range(cols):
             if np.isnan(np.sum(posterior[:,col])):
                 continue
             else:
-                out[:,col] = np.roll(posterior[:,col], np.random.randint(1, rows))
+                out[:,col] = np.roll(posterior[:,col], randint(1, rows))
     else:
         if len(amt) == cols:
             for col in range(cols):
@@ -151,6 +251,243 @@ def column_cycle_array(posterior, amt=None):
             raise TypeError("amt does not seem to be the correct shape!")
     return out
 
+def time_swap_indices(n_bins, n_shuffles, rng=None):
+    """Column indices of n_shuffles time swaps of an array with n_bins columns.
+
+    The ss'th time-swapped posterior is posterior[:, indices[ss]], but
+    the surrogates can usually be scored without building them.
+
+    Parameters
+    ----------
+    n_bins : int
+        Number of time bins (columns) to permute.
+    n_shuffles : int
+        Number of permutations.
+    rng : numpy.random.Generator or int, optional
+        Random number generator, or seed for one.
+
+    Returns
+    -------
+    indices : array of shape (n_shuffles, n_bins)
+        Each row is a random permutation of range(n_bins).
+    """
+    rng = np.random.default_rng(rng)
+    indices = np.tile(np.arange(n_bins), (n_shuffles, 1))
+    return rng.permuted(indices, axis=1)
+
+def column_cycle_shifts(n_rows, n_cols, n_shuffles, rng=None):
+    """Cyclic shifts of n_shuffles column cycles of an (n_rows, n_cols) array.
+
+    In the ss'th surrogate, column cc is np.roll(posterior[:,cc],
+    shifts[ss,cc]), exactly as in column_cycle_array.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of position bins (rows).
+    n_cols : int
+        Number of time bins (columns).
+    n_shuffles : int
+        Number of surrogates.
+    rng : numpy.random.Generator or int, optional
+        Random number generator, or seed for one.
+
+    Returns
+    -------
+    shifts : array of shape (n_shuffles, n_cols)
+        Shifts drawn uniformly from [1, n_rows).
+    """
+    rng = np.random.default_rng(rng)
+    return rng.integers(1, n_rows, size=(n_shuffles, n_cols))
+
+def _segment_sums(values, bdries):
+    """Sums of values over the segments [bdries[i], bdries[i+1]) of the last axis."""
+    bdries = np.asarray(bdries)
+    n_segments = len(bdries) - 1
+    out_shape = values.shape[:-1] + (n_segments,)
+    if values.shape[-1] == 0 or n_segments < 1:
+        return np.zeros(out_shape)
+    sums = np.zeros(out_shape)
+    # reduce over the non-empty segments only; with empty segments
+    # skipped, each one ends where the next one starts, and the last one
+    # ends at bdries[-1]
+    nonempty = bdries[:-1] < bdries[1:]
+    if nonempty.any():
+        values = values[..., :bdries[-1]]
+        sums[..., nonempty] = np.add.reduceat(values, bdries[:-1][nonempty], axis=-1)
+    return sums
+
+def _linregress_segments(x, y, bdries):
+    """Least squares line fits of y against x, for every segment at once.
+
+    The segments are [bdries[i], bdries[i+1]) along the last axis, as
+    for mode_pth and bdries returned by decode. NaN entries of y are
+    masked out of every reduction, and the results match those of
+    scipy.stats.linregress on the remaining points: segments with fewer
+    than two points (or constant x) have NaN slopes, and segments with
+    constant y have r = 0.
+
+    Parameters
+    ----------
+    x : array of shape (..., n_bins)
+        Independent variable. Leading dimensions (e.g. shuffles) are
+        broadcast against y.
+    y : array of shape (..., n_bins)
+        Dependent variable, possibly containing NaNs.
+    bdries : array of shape (n_segments + 1,)
+        Segment boundaries.
+
+    Returns
+    -------
+    slopes, intercepts, r2values : arrays of shape (..., n_segments)
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float),
+                               np.asarray(y, dtype=float))
+    bdries = np.asarray(bdries, dtype=int)
+    valid = ~np.isnan(y)
+    seg_id = np.repeat(np.arange(len(bdries) - 1), np.diff(bdries))
+
+    n = _segment_sums(valid, bdries)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xmean = _segment_sums(np.where(valid, x, 0), bdries) / n
+        ymean = _segment_sums(np.where(valid, y, 0), bdries) / n
+        dx = np.where(valid, x - xmean[..., seg_id], 0)
+        dy = np.where(valid, y - ymean[..., seg_id], 0)
+        ssxm = _segment_sums(dx * dx, bdries)
+        ssym = _segment_sums(dy * dy, bdries)
+        ssxym = _segment_sums(dx * dy, bdries)
+
+        r_den = np.sqrt(ssxm * ssym)
+        r = np.where(r_den == 0, 0.0, ssxym / r_den)
+        r = np.clip(r, -1.0, 1.0)
+        slopes = ssxym / ssxm
+        intercepts = ymean - slopes * xmean
+
+    r2values = np.where(n > 0, r**2, np.nan)
+    return slopes, intercepts, r2values
+
+def _linregress_rows(y):
+    """Least squares line fit to each row of y, against the column index.
+
+    NaN entries are ignored, as in _linregress_segments.
+
+    Returns
+    -------
+    slopes, intercepts, r2values : arrays of shape (n_rows,)
+    """
+    y = np.atleast_2d(y)
+    n_rows, n_cols = y.shape
+    x = np.tile(np.arange(n_cols), n_rows)
+    bdries = np.arange(n_rows + 1) * n_cols
+    return _linregress_segments(x, y.ravel(), bdries)
+
+def _band_scores(posterior, cols, shifts, slopes, intercepts, w):
+    """Sum of the probabilities in a band of 2*w+1 rows around lines.
+
+    Surrogate column cc of shuffle ss is posterior[:, cols[ss,cc]],
+    cyclically shifted down by shifts[ss,cc] rows, and the line of
+    shuffle ss is slopes[ss]*cc + intercepts[ss]. Only the entries in
+    the bands are gathered, so that no surrogate posteriors are built.
+
+    Returns
+    -------
+    scores : array of shape (n_shuffles,)
+    """
+    rows = posterior.shape[0]
+    n_cols = cols.shape[1]
+    line_y = np.round(slopes[:, np.newaxis]*np.arange(n_cols)
+                      + intercepts[:, np.newaxis])
+    line_y = np.where(np.isnan(line_y), 0, line_y).astype(int)
+    # as in trajectory_score_array, a band can never exceed all the rows
+    band = np.arange(-w, -w + min(2*w+1, rows))
+    rowidx = (line_y[:, :, np.newaxis] + band - shifts[:, :, np.newaxis]) % rows
+    scores = np.nansum(posterior[rowidx, cols[:, :, np.newaxis]], axis=(1, 2))
+    scores[np.isnan(slopes)] = np.nan
+    return scores
+
+def _cycled_modes(posterior, modes, shifts):
+    """Modes of the column-cycled surrogates of posterior.
+
+    The mode of a cycled column is the mode of the column, cycled.
+    Where a column has tied maxima, np.argmax takes the first one in
+    cycled order, which is the tied row that lands highest after the
+    shift.
+
+    Returns
+    -------
+    cycled_modes : array of shape (n_shuffles, n_cols)
+    """
+    rows = posterior.shape[0]
+    cycled_modes = (modes + shifts) % rows
+    with np.errstate(invalid='ignore'):
+        ismax = posterior == posterior.max(axis=0)
+    tied = np.flatnonzero(ismax.sum(axis=0) > 1)
+    if len(tied) > 0:
+        cycled_rows = (np.arange(rows)[:, np.newaxis]
+                       + shifts[:, np.newaxis, tied]) % rows
+        cycled_rows = np.where(ismax[:, tied], cycled_rows, rows)
+        cycled_modes[:, tied] = cycled_rows.min(axis=1)
+    return cycled_modes
+
+def trajectory_score_surrogates(posterior, n_shuffles=250, w=None,
+                                normalize=False, rng=None):
+    """Trajectory scores of time-swapped and column-cycled posteriors.
+
+    All n_shuffles surrogates of each kind are generated as index
+    arrays (see time_swap_indices and column_cycle_shifts), their lines
+    are fit in bulk, and only the probabilities in the bands around
+    those lines are gathered from the original posterior. The scores
+    are those of trajectory_score_array applied to each surrogate.
+
+    Parameters
+    ----------
+    posterior : array of shape (n_xbins, n_tbins)
+        Posterior of a single event.
+    n_shuffles : int, optional (default is 250)
+        Number of surrogates of each kind.
+    w : int, optional (default is 0)
+        Half band width for calculating the trajectory score.
+    normalize : bool, optional (default is False)
+        If True, the scores will be normalized by the number of non-NaN
+        bins in the event.
+    rng : numpy.random.Generator or int, optional
+        Random number generator, or seed for one.
+
+    Returns
+    -------
+    scores_time_swap, scores_col_cycle : arrays of shape (n_shuffles,)
+    """
+    if w is None:
+        w = 0
+    if not float(w).is_integer():
+        raise ValueError("w has to be an integer!")
+    w = int(w)
+    rng = np.random.default_rng(rng)
+
+    rows, cols = posterior.shape
+    modes = get_mode_pth_from_array(posterior)
+
+    if normalize:
+        num_non_nan_bins = round(np.nansum(posterior))
+    else:
+        num_non_nan_bins = 1
+
+    # time swap:
+    colidx = time_swap_indices(cols, n_shuffles, rng=rng)
+    noshift = np.zeros_like(colidx)
+    slopes, intercepts, _ = _linregress_rows(modes[colidx])
+    scores_time_swap = _band_scores(posterior, colidx, noshift, slopes,
+                                    intercepts, w) / num_non_nan_bins
+
+    # column cycle:
+    shifts = column_cycle_shifts(rows, cols, n_shuffles, rng=rng)
+    colidx = np.tile(np.arange(cols), (n_shuffles, 1))
+    slopes, intercepts, _ = _linregress_rows(_cycled_modes(posterior, modes, shifts))
+    scores_col_cycle = _band_scores(posterior, colidx, shifts, slopes,
+                                    intercepts, w) / num_non_nan_bins
+
+    return scores_time_swap, scores_col_cycle
+
 def trajectory_score_array(posterior, slope=None, intercept=None, w=None, weights=None, normalize=False):
     """Docstring goes here
 
@@ -166,7 +503,7 @@ def trajectory_score_array(posterior, slope=None, intercept=None, w=None, weight
 
     if w is None:
         w = 0
-    if not float(w).is_integer:
+    if not float(w).is_integer():
         raise ValueError("w has to be an integer!")
     if slope is None or intercept is None:
         slope, intercept, _ = linregress_array(posterior=posterior)
@@ -189,8 +526,18 @@ def trajectory_score_array(posterior, slope=None, intercept=None, w=None, weight
     return np.nansum(temp[:2*w+1,:])/num_non_nan_bins
 
 
+def _trajectory_score_event_shuffles(rng, idx, posterior, bdries, n_shuffles, w, normalize):
+    """Surrogate trajectory scores of the idx'th event."""
+    posterior_array = posterior[:, bdries[idx]:bdries[idx+1]]
+    return trajectory_score_surrogates(posterior_array,
+                                       n_shuffles=n_shuffles,
+                                       w=w,
+                                       normalize=normalize,
+                                       rng=rng)
+
 def trajectory_score_bst(bst, tuningcurve, w=None, n_shuffles=250,
-                         weights=None, normalize=False):
+                         weights=None, normalize=False, *,
+                         random_state=None, n_jobs=1):
     """Compute the trajectory scores from Davidson et al. for each event
     in the BinnedSpikeTrainArray.
 
@@ -244,6 +591,11 @@ def trajectory_score_bst(bst, tuningcurve, w=None, n_shuffles=250,
     normalize : bool, optional (default is False)
         If True, the scores will be normalized by the number of non-NaN
         bins in each event.
+    random_state : None, int or numpy.random.SeedSequence, optional
+        Seed for the shuffles. See run_shuffles.
+    n_jobs : int, optional (default is 1)
+        Number of workers over which the shuffles are spread. See
+        run_shuffles.
 
     Returns
     -------
@@ -255,10 +607,10 @@ def trajectory_score_bst(bst, tuningcurve, w=None, n_shuffles=250,
 
     if w is None:
         w = 0
-    if not float(w).is_integer:
+    if not float(w).is_integer():
         raise ValueError("w has to be an integer!")
 
-    if float(n_shuffles).is_integer:
+    if float(n_shuffles).is_integer():
         n_shuffles = int(n_shuffles)
     else:
         raise ValueError("n_shuffles must be an integer!")
@@ -270,34 +622,264 @@ def trajectory_score_bst(bst, tuningcurve, w=None, n_shuffles=250,
     # surrounding the regression line
 
     scores = np.zeros(bst.n_epochs)
-    if n_shuffles > 0:
-        scores_time_swap = np.zeros((n_shuffles, bst.n_epochs))
-        scores_col_cycle = np.zeros((n_shuffles, bst.n_epochs))
-
     for idx in range(bst.n_epochs):
         posterior_array = posterior[:, bdries[idx]:bdries[idx+1]]
         scores[idx] = trajectory_score_array(posterior=posterior_array,
                                              w=w,
                                              normalize=normalize)
-        for shflidx in range(n_shuffles):
-            # time swap:
-
-            posterior_ts = time_swap_array(posterior_array)
-            posterior_cs = column_cycle_array(posterior_array)
-            scores_time_swap[shflidx, idx] = trajectory_score_array(
-                posterior=posterior_ts,
-                w=w,
-                normalize=normalize)
-            scores_col_cycle[shflidx, idx] = trajectory_score_array(
-                posterior=posterior_cs,
-                w=w,
-                normalize=normalize)
 
     if n_shuffles > 0:
+        scores_time_swap = np.zeros((n_shuffles, bst.n_epochs))
+        scores_col_cycle = np.zeros((n_shuffles, bst.n_epochs))
+        # each event is shuffled in bulk, with its own random stream
+        results = run_shuffles(_trajectory_score_event_shuffles,
+                               bst.n_epochs,
+                               args=(posterior, bdries, n_shuffles, w, normalize),
+                               random_state=random_state,
+                               n_jobs=n_jobs,
+                               pass_index=True)
+        for idx, (ts, cs) in enumerate(results):
+            scores_time_swap[:, idx] = ts
+            scores_col_cycle[:, idx] = cs
         return scores, scores_time_swap, scores_col_cycle
     return scores
 
-def shuffle_transmat(transmat):
+def _line_search(cumpost, cols, shifts, xloc, bdries, slopes, intercepts, w,
+                 memory_budget):
+    """Best line (over a grid) of each event, by summing along lines.
+
+    cumpost is the cumulative sum over rows of the posterior (NaNs set
+    to zero) stacked on top of itself, with a leading row of zeros, so
+    that the probability in any cyclic range of rows of a column is the
+    difference of two of its entries. Surrogate bin jj is column
+    cols[jj] of the posterior, cyclically shifted down by shifts[jj]
+    rows, and xloc[jj] is its column index within its event.
+
+    Returns
+    -------
+    best_scores : array of shape (n_events,)
+    best_lines : array of shape (n_events,)
+        Index into the flattened (n_slopes, n_intercepts) grid.
+    """
+    rows = (cumpost.shape[0] - 1) // 2
+    n_events = len(bdries) - 1
+    lines_slope = np.repeat(slopes, len(intercepts))
+    lines_intercept = np.tile(intercepts, len(slopes))
+    n_lines = len(lines_slope)
+
+    # flat indices into cumpost, so that a single take gathers each sum
+    n_bins = cumpost.shape[1]
+    flat = cumpost.ravel()
+    offsets = (rows - shifts)*n_bins + cols
+
+    best_scores = np.full(n_events, -np.inf)
+    best_lines = np.zeros(n_events, dtype=int)
+    # roughly six float64 / int64 arrays of shape (n_lines, n_bins) per chunk
+    chunk_size = _get_chunk_size(n_lines, 48*max(1, len(cols)), memory_budget)
+    for start in range(0, n_lines, chunk_size):
+        stop = min(start + chunk_size, n_lines)
+        line_y = lines_slope[start:stop, np.newaxis]*xloc
+        line_y += lines_intercept[start:stop, np.newaxis]
+        np.round(line_y, out=line_y)
+        np.clip(line_y, -w - 1, rows + w, out=line_y)
+        line_y = line_y.astype(np.intp)
+        # only the part of the band that lies on the track is counted,
+        # as the rows [lo, hi) of each column
+        hi = line_y + (w + 1)
+        np.minimum(hi, rows, out=hi)
+        lo = line_y
+        lo -= w
+        np.maximum(lo, 0, out=lo)
+        np.minimum(lo, hi, out=lo)
+        hi *= n_bins
+        hi += offsets
+        lo *= n_bins
+        lo += offsets
+        values = flat.take(hi)
+        values -= flat.take(lo)
+        scores = _segment_sums(values, bdries)
+        chunk_best = np.argmax(scores, axis=0)
+        chunk_scores = scores[chunk_best, np.arange(n_events)]
+        better = chunk_scores > best_scores
+        best_scores[better] = chunk_scores[better]
+        best_lines[better] = chunk_best[better] + start
+    return best_scores, best_lines
+
+def _line_search_shuffle(rng, cumpost, xloc, bdries, slopes, intercepts, w,
+                         memory_budget):
+    """Best line scores of all events, after one time swap and one column
+    cycle shuffle of every event."""
+    rows = (cumpost.shape[0] - 1) // 2
+    n_bins = len(xloc)
+    seg_id = np.repeat(np.arange(len(bdries) - 1), np.diff(bdries))
+    identity = np.arange(n_bins)
+
+    cols = np.argsort(seg_id + rng.random(n_bins), kind='mergesort')
+    scores_time_swap, _ = _line_search(cumpost, cols, np.zeros(n_bins, dtype=int),
+                                       xloc, bdries, slopes, intercepts, w,
+                                       memory_budget)
+    if rows > 1:
+        shifts = rng.integers(1, rows, size=n_bins)
+    else:
+        shifts = np.zeros(n_bins, dtype=int)
+    scores_col_cycle, _ = _line_search(cumpost, identity, shifts, xloc, bdries,
+                                       slopes, intercepts, w, memory_budget)
+    return scores_time_swap, scores_col_cycle
+
+def _trajectory_line_search(posterior, bdries, slopes=None, intercepts=None,
+                            w=None, normalize=False, n_shuffles=0,
+                            random_state=None, n_jobs=1, memory_budget=2**27):
+    """Line search over all events in a concatenated posterior."""
+    if w is None:
+        w = 0
+    if not float(w).is_integer():
+        raise ValueError("w has to be an integer!")
+    w = int(w)
+    if float(n_shuffles).is_integer():
+        n_shuffles = int(n_shuffles)
+    else:
+        raise ValueError("n_shuffles must be an integer!")
+
+    rows, n_bins = posterior.shape
+    if slopes is None:
+        slopes = np.linspace(-rows/2, rows/2, 2*rows + 1)
+    if intercepts is None:
+        intercepts = np.arange(rows)
+    slopes = np.atleast_1d(np.asarray(slopes, dtype=float))
+    intercepts = np.atleast_1d(np.asarray(intercepts, dtype=float))
+    bdries = np.asarray(bdries, dtype=int)
+    n_events = len(bdries) - 1
+
+    posterior = np.nan_to_num(posterior)
+    cumpost = np.zeros((2*rows + 1, n_bins))
+    cumpost[1:] = np.cumsum(np.vstack((posterior, posterior)), axis=0)
+    xloc = np.arange(n_bins) - np.repeat(bdries[:-1], np.diff(bdries))
+
+    scores, best_lines = _line_search(cumpost, np.arange(n_bins),
+                                      np.zeros(n_bins, dtype=int), xloc,
+                                      bdries, slopes, intercepts, w,
+                                      memory_budget)
+    best_slopes = slopes[best_lines // len(intercepts)]
+    best_intercepts = intercepts[best_lines % len(intercepts)]
+
+    if normalize:
+        num_non_nan_bins = np.round(_segment_sums(posterior.sum(axis=0), bdries))
+    else:
+        num_non_nan_bins = np.ones(n_events)
+
+    # events without any bins have no line
+    empty = bdries[:-1] == bdries[1:]
+    scores[empty] = np.nan
+    best_slopes[empty] = np.nan
+    best_intercepts[empty] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = scores / num_non_nan_bins
+
+    if n_shuffles == 0:
+        return scores, best_slopes, best_intercepts
+
+    results = run_shuffles(_line_search_shuffle,
+                           n_shuffles,
+                           args=(cumpost, xloc, bdries, slopes, intercepts, w,
+                                 memory_budget),
+                           random_state=random_state,
+                           n_jobs=n_jobs)
+    scores_time_swap = np.array([ts for ts, _ in results])
+    scores_col_cycle = np.array([cs for _, cs in results])
+    scores_time_swap[:, empty] = np.nan
+    scores_col_cycle[:, empty] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores_time_swap = scores_time_swap / num_non_nan_bins
+        scores_col_cycle = scores_col_cycle / num_non_nan_bins
+    return (scores, best_slopes, best_intercepts,
+            scores_time_swap, scores_col_cycle)
+
+def trajectory_line_search_array(posterior, slopes=None, intercepts=None, w=None,
+                                 normalize=False, memory_budget=2**27):
+    """Find the line that maximizes the trajectory score of a posterior.
+
+    See trajectory_line_search_bst.
+
+    Returns
+    -------
+    score, slope, intercept
+    """
+    posterior = np.atleast_2d(posterior)
+    bdries = np.array([0, posterior.shape[1]])
+    scores, slopes, intercepts = _trajectory_line_search(posterior, bdries,
+                                                         slopes=slopes,
+                                                         intercepts=intercepts,
+                                                         w=w,
+                                                         normalize=normalize,
+                                                         memory_budget=memory_budget)
+    return scores[0], slopes[0], intercepts[0]
+
+def trajectory_line_search_bst(bst, tuningcurve, slopes=None, intercepts=None,
+                               w=None, n_shuffles=250, normalize=False, *,
+                               random_state=None, n_jobs=1, memory_budget=2**27):
+    """Find the lines that maximize the trajectory scores of Davidson et
+    al. for each event in the BinnedSpikeTrainArray.
+
+    Unlike trajectory_score_bst, which scores the line fit to the modes
+    of the posterior, every line on a (slope, intercept) grid is scored,
+    and the best one is kept. This is a discrete Radon transform of the
+    posterior: the row cumulative sums of each column are computed once,
+    so that the probability in the band of 2*w+1 rows around a line in a
+    column is the difference of two cumulative sums. All events are
+    searched together, and each shuffle time swaps and column cycles all
+    events at once.
+
+    Lines are not wrapped around the track. Only the part of a band
+    that lies on the track contributes to the score.
+
+    Parameters
+    ----------
+    bst : BinnedSpikeTrainArray
+        BinnedSpikeTrainArray containing all the candidate events to
+        score.
+    tuningcurve : TuningCurve1D
+        Tuning curve to decode events in bst.
+    slopes : array_like, optional
+        Slopes to search, in position bins per time bin. Default is
+        np.linspace(-n_xbins/2, n_xbins/2, 2*n_xbins+1).
+    intercepts : array_like, optional
+        Intercepts to search, as the position bin at the first time bin
+        of each event. Default is np.arange(n_xbins).
+    w : int, optional (default is 0)
+        Half band width for calculating the trajectory score.
+    n_shuffles : int, optional (default is 250)
+        Number of times to perform both time_swap and column_cycle
+        shuffles.
+    normalize : bool, optional (default is False)
+        If True, the scores will be normalized by the number of non-NaN
+        bins in each event.
+    random_state : None, int or numpy.random.SeedSequence, optional
+        Seed for the shuffles. See run_shuffles.
+    n_jobs : int, optional (default is 1)
+        Number of workers over which the shuffles are spread. See
+        run_shuffles.
+    memory_budget : int, optional (default is 2**27)
+        Approximate number of bytes to use when scoring a batch of
+        lines. If None, all lines are scored at once.
+
+    Returns
+    -------
+    scores, slopes, intercepts, [scores_time_swap, scores_col_cycle]
+        scores, slopes and intercepts are of size (bst.n_epochs, )
+        scores_time_swap and scores_col_cycle are each of size
+            (n_shuffles, bst.n_epochs)
+    """
+    posterior, bdries, mode_pth, mean_pth = decode(bst=bst,
+                                                   ratemap=tuningcurve)
+    return _trajectory_line_search(posterior, bdries, slopes=slopes,
+                                   intercepts=intercepts, w=w,
+                                   normalize=normalize,
+                                   n_shuffles=n_shuffles,
+                                   random_state=random_state,
+                                   n_jobs=n_jobs,
+                                   memory_budget=memory_budget)
+
+def shuffle_transmat(transmat, rng=None):
     """Shuffle transition probability matrix within each row, leaving self transitions in tact.
 
     It is assumed that the transmat is stochastic-row-wise, meaning that A_{ij} = Pr(S_{t+1}=j|S_t=i).
@@ -306,18 +888,22 @@ def shuffle_transmat(transmat):
     ----------
     transmat : array of size (n_states, n_states)
         Transition probability matrix, where A_{ij} = Pr(S_{t+1}=j|S_t=i).
+    rng : numpy.random.Generator, optional
+        Random number generator. Default is the global numpy random state.
 
     Returns
     -------
     shuffled : array of size (n_states, n_states)
         Shuffled transition probability matrix.
     """
+    if rng is None:
+        rng = np.random
     shuffled = transmat.copy()
 
     nrows, ncols = transmat.shape
     for rowidx in range(nrows):
         all_but_diagonal = np.append(np.arange(rowidx), np.arange(rowidx+1, ncols))
-        shuffle_idx = np.random.permutation(all_but_diagonal)
+        shuffle_idx = rng.permutation(all_but_diagonal)
         shuffle_idx = np.insert(shuffle_idx, rowidx, rowidx)
         shuffled[rowidx,:] = shuffled[rowidx, shuffle_idx]
 
@@ -346,7 +932,16 @@ def score_hmm_logprob(bst, hmm, normalize=False):
 
     return logprob
 
-def score_hmm_transmat_shuffle(bst, hmm, n_shuffles=250, normalize=False):
+def _score_hmm_transmat_shuffle(rng, bst, hmm, normalize):
+    """Score events under hmm with a shuffled transition matrix."""
+    hmm_shuffled = copy.deepcopy(hmm)
+    hmm_shuffled.transmat_ = shuffle_transmat(hmm.transmat_, rng=rng)
+    return score_hmm_logprob(bst=bst,
+                             hmm=hmm_shuffled,
+                             normalize=normalize)
+
+def score_hmm_transmat_shuffle(bst, hmm, n_shuffles=250, normalize=False, *,
+                               random_state=None, n_jobs=1):
     """Score sequences using a hidden Markov model, and a model where
     the transition probability matrix has been shuffled.BaseException
 
@@ -362,6 +957,11 @@ def score_hmm_transmat_shuffle(bst, hmm, n_shuffles=250, normalize=False):
         shuffles.
     normalize : bool, optional (default is False)
         If True, the scores will be normalized by event lengths.
+    random_state : None, int or numpy.random.SeedSequence, optional
+        Seed for the shuffles. See run_shuffles.
+    n_jobs : int, optional (default is 1)
+        Number of workers over which the shuffles are spread. See
+        run_shuffles.
 
     Returns
     -------
@@ -369,26 +969,34 @@ def score_hmm_transmat_shuffle(bst, hmm, n_shuffles=250, normalize=False):
     shuffled : array of size (n_shuffles, n_events)
     """
 
-    if float(n_shuffles).is_integer:
+    if float(n_shuffles).is_integer():
         n_shuffles = int(n_shuffles)
     else:
         raise ValueError("n_shuffles must be an integer!")
 
-    hmm_shuffled = copy.deepcopy(hmm)
     scores = score_hmm_logprob(bst=bst,
                                hmm=hmm,
                                normalize=normalize)
     n_events = bst.n_epochs
     shuffled = np.zeros((n_shuffles, n_events))
-    for ii in range(n_shuffles):
-        hmm_shuffled.transmat_ = shuffle_transmat(hmm_shuffled.transmat_)
-        shuffled[ii,:] = score_hmm_logprob(bst=bst,
-                                           hmm=hmm_shuffled,
-                                           normalize=normalize)
+    if n_shuffles > 0:
+        shuffled[:] = run_shuffles(_score_hmm_transmat_shuffle,
+                                   n_shuffles,
+                                   args=(bst, hmm, normalize),
+                                   random_state=random_state,
+                                   n_jobs=n_jobs)
 
     return scores, shuffled
 
-def score_hmm_timeswap_shuffle(bst, hmm, n_shuffles=250, normalize=False):
+def _score_hmm_timeswap_shuffle(rng, bst, hmm, normalize):
+    """Score time-swapped events under hmm."""
+    bst_shuffled = time_swap_bst(bst=bst, rng=rng)
+    return score_hmm_logprob(bst=bst_shuffled,
+                             hmm=hmm,
+                             normalize=normalize)
+
+def score_hmm_timeswap_shuffle(bst, hmm, n_shuffles=250, normalize=False, *,
+                               random_state=None, n_jobs=1):
     """Score sequences using a hidden Markov model, and a model where
     the transition probability matrix has been shuffled.
 
@@ -404,6 +1012,11 @@ def score_hmm_timeswap_shuffle(bst, hmm, n_shuffles=250, normalize=False):
         shuffles.
     normalize : bool, optional (default is False)
         If True, the scores will be normalized by event lengths.
+    random_state : None, int or numpy.random.SeedSequence, optional
+        Seed for the shuffles. See run_shuffles.
+    n_jobs : int, optional (default is 1)
+        Number of workers over which the shuffles are spread. See
+        run_shuffles.
 
     Returns
     -------
@@ -416,11 +1029,12 @@ def score_hmm_timeswap_shuffle(bst, hmm, n_shuffles=250, normalize=False):
                                normalize=normalize)
     n_events = bst.n_epochs
     shuffled = np.zeros((n_shuffles, n_events))
-    for ii in range(n_shuffles):
-        bst_shuffled = time_swap_bst(bst=bst)
-        shuffled[ii,:] = score_hmm_logprob(bst=bst_shuffled,
-                                           hmm=hmm,
-                                           normalize=normalize)
+    if n_shuffles > 0:
+        shuffled[:] = run_shuffles(_score_hmm_timeswap_shuffle,
+                                   n_shuffles,
+                                   args=(bst, hmm, normalize),
+                                   random_state=random_state,
+                                   n_jobs=n_jobs)
 
     return scores, shuffled
 
@@ -579,7 +1193,16 @@ def score_hmm_logprob_cumulative(bst, hmm, normalize=False):
 
     return logprob
 
-def score_hmm_time_resolved(bst, hmm, n_shuffles=250, normalize=False):
+def _score_hmm_time_resolved_shuffle(rng, bst, hmm, normalize):
+    """Cumulative scores per bin under hmm with a shuffled transition matrix."""
+    hmm_shuffled = copy.deepcopy(hmm)
+    hmm_shuffled.transmat_ = shuffle_transmat(hmm.transmat_, rng=rng)
+    return score_hmm_logprob_cumulative(bst=bst,
+                                        hmm=hmm_shuffled,
+                                        normalize=normalize)
+
+def score_hmm_time_resolved(bst, hmm, n_shuffles=250, normalize=False, *,
+                            random_state=None, n_jobs=1):
     """Score sequences using a hidden Markov model, and a model where
     the transition probability matrix has been shuffled.BaseException
 
@@ -595,6 +1218,11 @@ def score_hmm_time_resolved(bst, hmm, n_shuffles=250, normalize=False):
         shuffles.
     normalize : bool, optional (default is False)
         If True, the scores will be normalized by event lengths.
+    random_state : None, int or numpy.random.SeedSequence, optional
+        Seed for the shuffles. See run_shuffles.
+    n_jobs : int, optional (default is 1)
+        Number of workers over which the shuffles are spread. See
+        run_shuffles.
 
     Returns
     -------
@@ -602,12 +1230,11 @@ def score_hmm_time_resolved(bst, hmm, n_shuffles=250, normalize=False):
     shuffled : array of size (n_shuffles, n_events)
     """
 
-    if float(n_shuffles).is_integer:
+    if float(n_shuffles).is_integer():
         n_shuffles = int(n_shuffles)
     else:
         raise ValueError("n_shuffles must be an integer!")
 
-    hmm_shuffled = copy.deepcopy(hmm)
     Lbraw = score_hmm_logprob_cumulative(bst=bst,
                                hmm=hmm,
                                normalize=normalize)
@@ -625,12 +1252,12 @@ def score_hmm_time_resolved(bst, hmm, n_shuffles=250, normalize=False):
 
     n_bins = bst.n_bins
     shuffled = np.zeros((n_shuffles, n_bins))
-    for ii in range(n_shuffles):
-        hmm_shuffled.transmat_ = shuffle_transmat(hmm_shuffled.transmat_)
-        Lbtmat = score_hmm_logprob_cumulative(bst=bst,
-                               hmm=hmm_shuffled,
-                               normalize=normalize)
-
+    Lbtmats = run_shuffles(_score_hmm_time_resolved_shuffle,
+                           n_shuffles,
+                           args=(bst, hmm, normalize),
+                           random_state=random_state,
+                           n_jobs=n_jobs)
+    for ii, Lbtmat in enumerate(Lbtmats):
         # per event, compute L(:b|tmat) - L(:b-1|raw)
         NL = copy.deepcopy(Lbtmat)
         for jj in range(bst.n_epochs):
@@ -664,7 +1291,21 @@ def three_consecutive_bins_above_q(pvals, lengths, q=0.75, n_consecutive=3):
 
     return np.array(idx)
 
-def _scoreOrderD_time_swap(hmm, state_sequences, lengths, n_shuffles=250, normalize=False):
+def _order_time_swap_shuffle(rng, logP, state_sequences):
+    """Order scores of all state sequences after permuting each once."""
+    n_sequences = len(state_sequences)
+    shuffled = np.zeros(n_sequences)
+    for seqid in range(n_sequences):
+        pth = rng.permutation(state_sequences[seqid])
+        plen = len(pth)
+        logPseq = 0
+        for ii in range(plen-1):
+            logPseq += logP[pth[ii],pth[ii+1]]
+        shuffled[seqid] = logPseq - np.log(plen)
+    return shuffled
+
+def _scoreOrderD_time_swap(hmm, state_sequences, lengths, n_shuffles=250, normalize=False, *,
+                           random_state=None, n_jobs=1):
     """Compute order score of state sequences
 
     A score of 0 means there's only one state.
@@ -674,8 +1315,8 @@ def _scoreOrderD_time_swap(hmm, state_sequences, lengths, n_shuffles=250, normal
     n_sequences = len(state_sequences)
     shuffled = np.zeros((n_shuffles, n_sequences))
 
+    logP = np.log(hmm.transmat_)
     for seqid in range(n_sequences):
-        logP = np.log(hmm.transmat_)
         pth = state_sequences[seqid]
         plen = len(pth)
         logPseq = 0
@@ -683,13 +1324,13 @@ def _scoreOrderD_time_swap(hmm, state_sequences, lengths, n_shuffles=250, normal
             logPseq += logP[pth[ii],pth[ii+1]]
         score = logPseq - np.log(plen)
         scoresD.append(score)
-        for nn in range(n_shuffles):
-            logPseq = 0
-            pth = np.random.permutation(pth)
-            for ii in range(plen-1):
-                logPseq += logP[pth[ii],pth[ii+1]]
-            score = logPseq - np.log(plen)
-            shuffled[nn, seqid] = score
+
+    if n_shuffles > 0:
+        shuffled[:] = run_shuffles(_order_time_swap_shuffle,
+                                   n_shuffles,
+                                   args=(logP, state_sequences),
+                                   random_state=random_state,
+                                   n_jobs=n_jobs)
 
     scoresD = np.array(scoresD)
 
@@ -699,9 +1340,11 @@ def _scoreOrderD_time_swap(hmm, state_sequences, lengths, n_shuffles=250, normal
 
     return scoresD, shuffled
 
-def score_hmm_order_time_swap(bst, hmm, n_shuffles=250, normalize=False):
+def score_hmm_order_time_swap(bst, hmm, n_shuffles=250, normalize=False, *,
+                              random_state=None, n_jobs=1):
     lp, paths, centers = hmm.decode(X=bst)
-    scores, shuffled = _scoreOrderD_time_swap(hmm, paths, lengths=bst.lengths, n_shuffles=n_shuffles, normalize=normalize)
+    scores, shuffled = _scoreOrderD_time_swap(hmm, paths, lengths=bst.lengths, n_shuffles=n_shuffles, normalize=normalize,
+                                              random_state=random_state, n_jobs=n_jobs)
     if normalize:
         scores = scores/bst.lengths
         shuffled = shuffled/bst.lengths
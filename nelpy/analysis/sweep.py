@@ -0,0 +1,257 @@
+"""Parameter sweeps of decoding quality"""
+
+__all__ = ['decoding_parameter_sweep']
+
+import os
+import time
+import tracemalloc
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .. import auxiliary
+from .. import core
+from ..auxiliary._tuningcurve import _extern_cache
+from ..decoding import decode1D, k_fold_cross_validation, _window_bounds
+
+# columns of the table returned by decoding_parameter_sweep
+_SWEEP_DTYPE = [('ds', float),
+                ('sigma', float),
+                ('n_extern', int),
+                ('w', int),
+                ('median_error', float),
+                ('mean_error', float),
+                ('rmse', float),
+                ('n_decoded', int),
+                ('time', float),
+                ('setup_time', float),
+                ('peak_memory', float)]
+
+# state shared with the sweep worker processes; it is set once per worker
+# by _init_sweep_worker, so that the bst is only pickled once per worker
+_sweep_shared = None
+
+def _init_sweep_worker(shared):
+    global _sweep_shared
+    _sweep_shared = shared
+
+def _rebinned(shared, factor):
+    """The finest bst rebinned by factor, reused within a worker."""
+    rebinned = shared['rebinned']
+    bst = rebinned.get(factor)
+    if bst is None:
+        bst = shared['bst'].rebin(w=factor)
+        rebinned[factor] = bst
+    return bst
+
+def _error_metrics(errors):
+    """Median, mean and root mean squared error of the decoded windows."""
+    errors = errors[~np.isnan(errors)]
+    if errors.size == 0:
+        return np.nan, np.nan, np.nan, 0
+    return (np.median(errors), errors.mean(), np.sqrt((errors**2).mean()),
+            errors.size)
+
+def _decode_errors(tcs, folds, targets, w):
+    """Absolute decoding errors of all the validation windows of all folds."""
+    errors = []
+    for tc, (_, bst_validation, validation) in zip(tcs, folds):
+        _, _, _, mean_pth = decode1D(bst_validation, tc, w=w,
+                                     return_posterior=False)
+        target = np.concatenate([targets[ii] for ii in validation])
+        errors.append(np.abs(target - mean_pth))
+    return np.concatenate(errors)
+
+def _sweep_group(ds_idx, n_extern_idx, shared=None):
+    """Evaluate all (sigma, w) grid points for a single (ds, n_extern).
+
+    The rebinned bst, the extern values, and the occupancy and unsmoothed
+    ratemap of every cross-validation fold are computed once, and shared
+    by all of the sigma and w values.
+    """
+    if shared is None:
+        shared = _sweep_shared
+    extern = shared['extern']
+    ds = shared['ds'][ds_idx]
+    n_extern = shared['n_extern'][n_extern_idx]
+    extmin, extmax = shared['extmin'], shared['extmax']
+
+    setup_start = time.perf_counter()
+    bst = _rebinned(shared, shared['factors'][ds_idx])
+    at = bst.bin_centers
+    ext = _extern_cache.get(extern, at)
+    bins = np.linspace(extmin, extmax, n_extern+1)
+    bin_idx = np.digitize(ext, bins, True)
+    epoch_bin_idx = np.split(np.arange(len(at)), np.cumsum(bst.lengths)[:-1])
+
+    folds = []
+    for training, validation in k_fold_cross_validation(bst.n_epochs, k=shared['k']):
+        bst_training = bst[training]
+        idx = np.concatenate([epoch_bin_idx[ii] for ii in training])
+        _extern_cache.insert(extern, bst_training.bin_centers, ext[..., idx],
+                             bins=bins, bin_idx=bin_idx[idx])
+        tc = auxiliary.TuningCurve1D(bst=bst_training, extern=extern,
+                                     n_extern=n_extern, extmin=extmin,
+                                     extmax=extmax)
+        folds.append((tc, bst[validation], validation))
+
+    # target values at the centers of the decoding windows; windows never
+    # straddle epochs, so that every fold takes the windows of its epochs
+    targets = {}
+    for w in shared['w']:
+        left, right, posterior_lengths = _window_bounds(bst.lengths, w)
+        target = _extern_cache.get(extern, (at[left] + at[right-1])/2)
+        targets[w] = np.split(target, np.cumsum(posterior_lengths)[:-1])
+    setup_time = time.perf_counter() - setup_start
+
+    rows = []
+    for sigma_idx, sigma in enumerate(shared['sigma']):
+        smooth_start = time.perf_counter()
+        if sigma > 0:
+            tcs = [tc.smooth(sigma=sigma) for tc, _, _ in folds]
+        else:
+            tcs = [tc for tc, _, _ in folds]
+        # smoothing is shared by all the w values of this sigma
+        smooth_time = (time.perf_counter() - smooth_start) / len(shared['w'])
+
+        for w_idx, w in enumerate(shared['w']):
+            start = time.perf_counter()
+            errors = _decode_errors(tcs, folds, targets[w], w)
+            elapsed = time.perf_counter() - start + smooth_time
+            metrics = _error_metrics(errors)
+            peak_memory = np.nan
+            if shared['measure_memory'] and not tracemalloc.is_tracing():
+                # decode again in a separate, untimed pass, so that the
+                # tracing overhead does not inflate the timings
+                tracemalloc.start()
+                _decode_errors(tcs, folds, targets[w], w)
+                _, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            rows.append(((ds_idx, sigma_idx, n_extern_idx, w_idx),
+                         (ds, sigma, n_extern, w) + metrics
+                         + (elapsed, setup_time, peak_memory)))
+
+    return rows
+
+def decoding_parameter_sweep(st, extern, *, ds, sigma=3, n_extern=100, w=1,
+                             k=5, extmin=0, extmax=100, n_jobs=1,
+                             backend='process', measure_memory=False):
+    """Cross-validated decoding error over a grid of decoding parameters.
+
+    Every combination of ds, sigma, n_extern and w is evaluated using
+    k-fold cross-validation over the epochs, with TuningCurve1D and
+    decode1D. The spike trains are binned only once, at the finest ds,
+    and coarser bin sizes are obtained with BinnedSpikeTrainArray.rebin.
+    For each (ds, n_extern), the occupancy and ratemaps of the folds are
+    estimated once and shared by all sigma and w values. These groups of
+    grid points are spread across the workers.
+
+    Parameters
+    ----------
+    st : SpikeTrainArray or BinnedSpikeTrainArray
+        Spike trains to decode. If a BinnedSpikeTrainArray is given, it
+        is used as the finest binning, and every ds must be a multiple of
+        its bin width.
+    extern : query-able object of external correlates (e.g. pos AnalogSignalArray)
+    ds : float or array_like
+        Bin widths (in seconds). Each must be an integer multiple of the
+        smallest one.
+    sigma : float or array_like, optional
+        Smoothing of the tuning curves, in units of extern. A sigma of 0
+        means no smoothing. Default is 3.
+    n_extern : int or array_like, optional
+        Number of tuning curve bins. Default is 100.
+    w : int or array_like, optional
+        Number of bins per decoding window. Default is 1.
+    k : int, optional
+        Number of folds for k-fold cross-validation. Default is 5.
+    extmin, extmax : float, optional
+        Range of the tuning curves. Default is [0, 100].
+    n_jobs : int, optional
+        Number of workers. If n_jobs < 0, os.cpu_count() workers are
+        used. Default is 1 (no parallelism).
+    backend : str, optional
+        Either 'process' (default) or 'thread'.
+    measure_memory : bool, optional
+        If True, every grid point is decoded a second time, outside of
+        the timed region, while tracing memory allocations. Memory
+        figures are not available when using more than one thread.
+        Default is False.
+
+    Returns
+    -------
+    table : np.recarray
+        One record per grid point, in the order of
+        itertools.product(ds, sigma, n_extern, w), with fields
+            ds, sigma, n_extern, w : the grid point
+            median_error, mean_error, rmse : absolute decoding error over
+                all validation windows that could be decoded
+            n_decoded : number of such windows
+            time : seconds spent smoothing and decoding the grid point
+            setup_time : seconds spent rebinning and estimating the fold
+                occupancies and ratemaps, shared by all the grid points
+                with the same ds and n_extern
+            peak_memory : peak bytes allocated while decoding the grid
+                point, or np.nan if not measured (see measure_memory)
+        The table can be turned into a DataFrame with pd.DataFrame(table).
+    """
+    ds = np.atleast_1d(np.asarray(ds, dtype=float))
+    sigma = np.atleast_1d(np.asarray(sigma, dtype=float))
+    n_extern = np.atleast_1d(np.asarray(n_extern, dtype=int))
+    w = np.atleast_1d(np.asarray(w, dtype=int))
+    if backend not in ('process', 'thread'):
+        raise ValueError("backend must be either 'process' or 'thread'")
+
+    if isinstance(st, core.BinnedSpikeTrainArray):
+        bst = st
+    else:
+        bst = st.bin(ds=ds.min())
+
+    factors = ds / bst.ds
+    if not np.allclose(factors, np.round(factors)) or np.any(np.round(factors) < 1):
+        raise ValueError("every ds must be an integer multiple of {}".format(bst.ds))
+    factors = np.round(factors).astype(int)
+
+    if n_jobs is None:
+        n_jobs = 1
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    groups = [(ii, jj) for ii in range(len(ds)) for jj in range(len(n_extern))]
+    n_jobs = min(n_jobs, len(groups))
+
+    shared = {'bst': bst,
+              'extern': extern,
+              'ds': ds,
+              'factors': factors,
+              'sigma': sigma,
+              'n_extern': n_extern,
+              'w': w,
+              'k': k,
+              'extmin': extmin,
+              'extmax': extmax,
+              'rebinned': {},
+              'measure_memory': measure_memory and (n_jobs <= 1 or backend != 'thread')}
+
+    if n_jobs <= 1:
+        results = [_sweep_group(ii, jj, shared) for ii, jj in groups]
+    else:
+        if backend == 'process':
+            executor = ProcessPoolExecutor(max_workers=n_jobs,
+                                           initializer=_init_sweep_worker,
+                                           initargs=(shared,))
+            extra_args = ()
+        else:
+            executor = ThreadPoolExecutor(max_workers=n_jobs)
+            extra_args = (shared,)
+
+        with executor:
+            futures = [executor.submit(_sweep_group, ii, jj, *extra_args)
+                       for ii, jj in groups]
+            results = [future.result() for future in futures]
+
+    rows = [row for result in results for row in result]
+    order = np.argsort([np.ravel_multi_index(grid_idx, (len(ds), len(sigma), len(n_extern), len(w)))
+                        for grid_idx, _ in rows])
+    table = np.array([rows[ii][1] for ii in order], dtype=_SWEEP_DTYPE)
+
+    return table.view(np.recarray)
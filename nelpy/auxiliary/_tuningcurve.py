@@ -1,10 +1,15 @@
 __all__ = ['TuningCurve1D', 'TuningCurve2D', 'DirectionalTuningCurve1D']
 
 import copy
+import hashlib
 import numpy as np
 import numbers
 import scipy.ndimage.filters
+import threading
 import warnings
+import weakref
+
+from collections import OrderedDict
 
 from .. import utils
 
@@ -22,6 +27,181 @@ warnings.formatwarning = lambda message, category, filename, lineno, \
     line=None: formatwarning_orig(
         message, category, filename, lineno, line='')
 
+def _accumulate_by_bin(data, bin_idx, n_bins):
+    """Sum the columns of data that fall into the same bin.
+
+    Parameters
+    ----------
+    data : np.array
+        With shape (n_units, n_samples).
+    bin_idx : np.array
+        Zero-based bin index of every sample, with shape (n_samples,).
+    n_bins : int
+        Total number of bins.
+
+    Returns
+    -------
+    accumulated : np.array
+        With shape (n_units, n_bins), equivalent to looping over the
+        samples and doing accumulated[:, bin_idx[tt]] += data[:, tt].
+    """
+    data = np.atleast_2d(data)
+    n_units = data.shape[0]
+    # offset every unit into its own block of bins, so that a single
+    # weighted bincount accumulates all of the units at once
+    flat_idx = bin_idx + n_bins*np.arange(n_units)[:, np.newaxis]
+    accumulated = np.bincount(flat_idx.ravel(), weights=data.ravel(),
+                              minlength=n_units*n_bins)
+    return accumulated.reshape(n_units, n_bins)
+
+
+class _ExternCache:
+    """Bounded LRU cache of externs evaluated at bin centers.
+
+    Building a tuning curve evaluates the extern (e.g., position) at the
+    bin centers of the BinnedSpikeTrainArray more than once, and repeated
+    builds (cross-validation folds, directional tuning curves, parameter
+    sweeps) keep asking for the same points again. This cache stores the
+    interpolated values, and their bin indices, keyed on the extern
+    object and on the contents of the bin centers.
+
+    Entries are only valid for as long as the extern is not modified in
+    place; call clear() if that happens.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of (extern, bin centers) entries to keep. The least
+        recently used entry is evicted first. Default is 16.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _digest(arr):
+        arr = np.ascontiguousarray(arr)
+        return (arr.shape, arr.dtype.str, hashlib.sha1(arr).hexdigest())
+
+    @staticmethod
+    def _evaluate(extern, at):
+        _, ext = extern.asarray(at=at)
+        return ext
+
+    def _lookup(self, extern, at):
+        key = (id(extern), self._digest(at))
+        with self._lock:
+            entry = self._entries.get(key)
+            # ids can be reused once an extern has been garbage collected
+            if entry is not None and entry['extern']() is not extern:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        return key, entry
+
+    def _store(self, key, extern, ext):
+        try:
+            ref = weakref.ref(extern)
+        except TypeError:
+            # extern cannot be tracked reliably, so do not cache it
+            return {'ext': ext, 'bin_idx': {}}
+        ext = np.asanyarray(ext)
+        ext.flags.writeable = False
+        entry = {'extern': ref, 'ext': ext, 'bin_idx': {}}
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _entry(self, extern, at):
+        key, entry = self._lookup(extern, at)
+        if entry is None:
+            entry = self._store(key, extern, self._evaluate(extern, at))
+        return entry
+
+    def get(self, extern, at):
+        """Return extern evaluated at the points in at.
+
+        The result is the same as extern.asarray(at=at).yvals, and is
+        read-only.
+        """
+        return self._entry(extern, at)['ext']
+
+    def insert(self, extern, at, ext, bins=None, bin_idx=None):
+        """Store ext as the value of extern evaluated at the points in at.
+
+        This lets callers that already hold the values for a superset of
+        the points hand out subsets without interpolating again. If bins
+        and bin_idx are given, bin_idx is stored as the (unrestricted)
+        bin indices of ext for those bin edges.
+        """
+        key, _ = self._lookup(extern, at)
+        entry = self._store(key, extern, ext)
+        if bin_idx is not None:
+            bin_idx = np.asanyarray(bin_idx)
+            bin_idx.flags.writeable = False
+            entry['bin_idx'][(None, self._digest(bins))] = bin_idx
+
+    def bin_indices(self, extern, at, bins, signal=None):
+        """Return np.digitize(ext, bins, True) for the extern evaluated at
+        the points in at, where ext is restricted to a single row if
+        signal is specified.
+        """
+        entry = self._entry(extern, at)
+        key = (signal, self._digest(bins))
+        bin_idx = entry['bin_idx'].get(key)
+        if bin_idx is None:
+            ext = entry['ext']
+            if signal is not None:
+                ext = ext[signal, :]
+            bin_idx = np.digitize(ext, bins, True)
+            bin_idx.flags.writeable = False
+            entry['bin_idx'][key] = bin_idx
+        return bin_idx
+
+    def prefetch(self, extern, ats):
+        """Evaluate extern at several sets of points in a single pass.
+
+        Parameters
+        ----------
+        extern : query-able object of external correlates
+        ats : list of array_like
+            Points at which the extern will be requested later, e.g., the
+            bin centers of several BinnedSpikeTrainArrays. Points that are
+            shared between the sets are only interpolated once.
+        """
+        missing = []
+        for at in ats:
+            key, entry = self._lookup(extern, at)
+            if entry is None and key not in (k for k, _ in missing):
+                missing.append((key, np.asanyarray(at)))
+        if not missing:
+            return
+        at_all, inverse = np.unique(
+            np.concatenate([at.ravel() for _, at in missing]),
+            return_inverse=True)
+        ext_all = np.asanyarray(self._evaluate(extern, at_all))
+        ext_all = ext_all.reshape(-1, len(at_all))
+        offsets = np.cumsum([at.size for _, at in missing])[:-1]
+        for (key, at), idx in zip(missing, np.split(inverse, offsets)):
+            # squeeze to match the shape returned by extern.asarray()
+            self._store(key, extern, ext_all[:, idx].squeeze())
+
+_extern_cache = _ExternCache()
+
+
 
 ########################################################################
 # class TuningCurve2D
@@ -121,6 +301,8 @@ class TuningCurve2D:
 
         if transform_func is None:
             self.trans_func = self._trans_func
+        else:
+            self.trans_func = transform_func
 
         # compute occupancy
         self._occupancy = self._compute_occupancy()
@@ -369,7 +551,7 @@ class TuningCurve2D:
         Assumes first signal is x-dim, second is y-dim.
         """
 
-        _, ext = extern.asarray(at=at)
+        ext = _extern_cache.get(extern, at)
         x, y = ext[0,:], ext[1,:]
 
         return x, y
@@ -399,10 +581,14 @@ class TuningCurve2D:
         if min_duration is None:
             min_duration = self._min_duration
 
-        x, y = self.trans_func(self._extern, at=self._bst.bin_centers)
-
-        ext_bin_idx_x = np.digitize(x, self.xbins, True)
-        ext_bin_idx_y = np.digitize(y, self.ybins, True)
+        at = self._bst.bin_centers
+        if self.trans_func == self._trans_func:
+            ext_bin_idx_x = _extern_cache.bin_indices(self._extern, at, self.xbins, signal=0)
+            ext_bin_idx_y = _extern_cache.bin_indices(self._extern, at, self.ybins, signal=1)
+        else:
+            x, y = self.trans_func(self._extern, at=at)
+            ext_bin_idx_x = np.digitize(x, self.xbins, True)
+            ext_bin_idx_y = np.digitize(y, self.ybins, True)
 
         # make sure that all the events fit between extmin and extmax:
         # TODO: this might rather be a warning, but it's a pretty serious warning...
@@ -415,14 +601,14 @@ class TuningCurve2D:
         if ext_bin_idx_y.min() == 0:
             raise ValueError("ext values less than 'ext_ymin'")
 
-        ratemap = np.zeros((self.n_units, self.n_xbins, self.n_ybins))
-
-        for tt, (bidxx, bidxy) in enumerate(zip(ext_bin_idx_x, ext_bin_idx_y)):
-            ratemap[:,bidxx-1, bidxy-1] += self._bst.data[:,tt]
+        # row-major flat index into the (n_xbins, n_ybins) grid
+        flat_bin_idx = (ext_bin_idx_x-1)*self.n_ybins + ext_bin_idx_y-1
+        ratemap = _accumulate_by_bin(self._bst.data, flat_bin_idx,
+                                     self.n_xbins*self.n_ybins)
+        ratemap = ratemap.reshape(self.n_units, self.n_xbins, self.n_ybins)
 
         # apply minimum observation duration
-        for uu in range(self.n_units):
-            ratemap[uu][self.occupancy*self._bst.ds < min_duration] = 0
+        ratemap[:, self.occupancy*self._bst.ds < min_duration] = 0
 
         return ratemap / self._bst.ds
 
@@ -718,6 +904,8 @@ class TuningCurve1D:
 
         if transform_func is None:
             self.trans_func = self._trans_func
+        else:
+            self.trans_func = transform_func
 
         # compute occupancy
         self._occupancy = self._compute_occupancy()
@@ -969,7 +1157,7 @@ class TuningCurve1D:
     def _trans_func(self, extern, at):
         """Default transform function to map extern into numerical bins"""
 
-        _, ext = extern.asarray(at=at)
+        ext = _extern_cache.get(extern, at)
 
         return ext
 
@@ -988,9 +1176,12 @@ class TuningCurve1D:
         if min_duration is None:
             min_duration = self._min_duration
 
-        ext = self.trans_func(self._extern, at=self._bst.bin_centers)
-
-        ext_bin_idx = np.digitize(ext, self.bins, True)
+        at = self._bst.bin_centers
+        if self.trans_func == self._trans_func:
+            ext_bin_idx = _extern_cache.bin_indices(self._extern, at, self.bins)
+        else:
+            ext = self.trans_func(self._extern, at=at)
+            ext_bin_idx = np.digitize(ext, self.bins, True)
         # make sure that all the events fit between extmin and extmax:
         # TODO: this might rather be a warning, but it's a pretty serious warning...
         if ext_bin_idx.max() > self.n_bins:
@@ -998,14 +1189,11 @@ class TuningCurve1D:
         if ext_bin_idx.min() == 0:
             raise ValueError("ext values less than 'ext_min'")
 
-        ratemap = np.zeros((self.n_units, self.n_bins))
-
-        for tt, bidx in enumerate(ext_bin_idx):
-            ratemap[:,bidx-1] += self._bst.data[:,tt]
+        ratemap = _accumulate_by_bin(self._bst.data, ext_bin_idx-1,
+                                     self.n_bins)
 
         # apply minimum observation duration
-        for uu in range(self.n_units):
-            ratemap[uu][self.occupancy*self._bst.ds < min_duration] = 0
+        ratemap[:, self.occupancy*self._bst.ds < min_duration] = 0
 
         return ratemap / self._bst.ds
 
@@ -1413,7 +1601,7 @@ class DirectionalTuningCurve1D(TuningCurve1D):
     __attributes__.extend(TuningCurve1D.__attributes__)
 
     def __init__(self, *, bst_l2r, bst_r2l, bst_combined, extern, sigma=None, bw=None, n_extern=None, transform_func=None, minbgrate=None, extmin=0, extmax=1, extlabels=None, unit_ids=None, unit_labels=None, unit_tags=None, label=None, empty=False,
-    min_peakfiringrate=None, max_avgfiringrate=None, unimodal=False):
+    min_peakfiringrate=None, max_avgfiringrate=None, unimodal=False, min_duration=None):
         """
 
         If sigma is nonzero, then smoothing is applied.
@@ -1453,6 +1641,10 @@ class DirectionalTuningCurve1D(TuningCurve1D):
         else:
             raise NotImplementedError
 
+        if min_duration is None:
+            min_duration = 0
+
+        self._min_duration = min_duration
         self._min_peakfiringrate = min_peakfiringrate
         self._max_avgfiringrate = max_avgfiringrate
         self._unimodal = unimodal
@@ -1463,6 +1655,14 @@ class DirectionalTuningCurve1D(TuningCurve1D):
 
         if transform_func is None:
             self.trans_func = self._trans_func
+        else:
+            self.trans_func = transform_func
+
+        if self.trans_func == self._trans_func:
+            # evaluate extern at the bins of all three bsts in one pass
+            _extern_cache.prefetch(extern, [bst_l2r.bin_centers,
+                                            bst_r2l.bin_centers,
+                                            bst_combined.bin_centers])
 
         # left to right:
         self._bst = bst_l2r
@@ -438,15 +438,20 @@ class AnalogSignalArray:
         except AttributeError:
             raise AttributeError("EpochArray expected")
 
-        indices = []
-        for eptime in epocharray.time:
-            t_start = eptime[0]
-            t_stop = eptime[1]
-            indices.append((self._time >= t_start) & (self._time < t_stop))
-        indices = np.any(np.column_stack(indices), axis=1)
-        if np.count_nonzero(indices) < len(self._time):
+        # the samples in the (merged) epochs are contiguous runs of the
+        # sorted sample times, found with a binary search
+        merged = epocharray.merge()
+        left = np.searchsorted(self._time, merged.starts, side='left')
+        right = np.searchsorted(self._time, merged.stops, side='left')
+        lengths = right - left
+        n_kept = lengths.sum()
+        if n_kept < len(self._time):
             warnings.warn(
                 'ignoring signal outside of support')
+        # a single concatenated index, so that the restricted data are
+        # always copies, however many runs are kept
+        offsets = np.insert(np.cumsum(lengths), 0, 0)[:-1]
+        indices = np.arange(n_kept) + np.repeat(left - offsets, lengths)
         try:
             self._ydata = self._ydata[:,indices]
         except IndexError:
@@ -492,9 +497,44 @@ class AnalogSignalArray:
     @property
     def lengths(self):
         """(list) The number of samples in each epoch."""
-        # TODO: make this faster and better!
-        lengths = [segment.n_samples for segment in self]
-        return np.asanyarray(lengths).squeeze()
+        left, right = self._get_epoch_offsets()
+        return np.asanyarray(right - left).squeeze()
+
+    def _get_epoch_offsets(self):
+        """Sample offsets [left, right) of each epoch of the support.
+
+        The offsets are found with a binary search of the (sorted)
+        sample times, and cached until _time or _support is replaced.
+        """
+        if self.isempty or self._support is None or self._support.isempty:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        cache = getattr(self, '_epoch_offsets', None)
+        if (cache is not None and cache[0] is self._time
+                and cache[1] is self._support._time):
+            return cache[2], cache[3]
+        left = np.searchsorted(self._time, self._support.starts, side='left')
+        right = np.searchsorted(self._time, self._support.stops, side='left')
+        self._epoch_offsets = (self._time, self._support._time, left, right)
+        return left, right
+
+    def _epoch_view(self, index):
+        """AnalogSignalArray of a single epoch, whose data are views.
+
+        Returns None if index is out of bounds.
+        """
+        n_epochs = self.n_epochs
+        if not -n_epochs <= index < n_epochs:
+            return None
+        left, right = self._get_epoch_offsets()
+        left, right = left[index], right[index]
+
+        asa = copy.copy(self)
+        asa._epochsignalslicer = EpochSignalSlicer(asa)
+        asa._interp = None
+        asa._support = self._support[index]
+        asa._ydata = self._ydata[:, left:right]
+        asa._time = self._time[left:right]
+        return asa
 
     @property
     def labels(self):
@@ -615,7 +655,12 @@ class AnalogSignalArray:
         return PrettyInt(len(self.time))
 
     def __iter__(self):
-        """AnalogSignal iterator initialization"""
+        """AnalogSignal iterator initialization
+
+        Each epoch is returned as an AnalogSignalArray whose ydata and
+        time are views into this one, so writing to them changes this
+        AnalogSignalArray as well. Smoothing in place copies first.
+        """
         # initialize the internal index to zero when used as iterator
         self._index = 0
         return self
@@ -625,32 +670,10 @@ class AnalogSignalArray:
         index = self._index
         if index > self.n_epochs - 1:
             raise StopIteration
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            epoch = EpochArray(empty=True)
-            exclude = ["_time"]
-            attrs = (x for x in self._support.__attributes__ if x not in exclude)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                for attr in attrs:
-                    exec("epoch." + attr + " = self._support." + attr)
-                try:
-                    epoch._time = self._support.time[[index], :]  # use np integer indexing! Cool!
-                except IndexError:
-                    # index is out of bounds, so return an empty EpochArray
-                    pass
-
         self._index += 1
 
-        asa = AnalogSignalArray([],empty=True)
-        exclude = ['_interp','_support']
-        attrs = (x for x in self.__attributes__ if x not in exclude)
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            for attr in attrs:
-                exec("asa." + attr + " = self." + attr)
-        asa._restrict_to_epoch_array(epocharray=epoch)
-        if(asa.support.isempty):
+        asa = self._epoch_view(index)
+        if asa is None:
             warnings.warn("Support is empty. Empty AnalogSignalArray returned")
             asa = AnalogSignalArray([],empty=True)
         return asa
@@ -663,6 +686,10 @@ class AnalogSignalArray:
         idx : EpochArray, int, slice
             intersect passed epocharray with support,
             index particular a singular epoch or multiple epochs with slice
+
+        A single (int) epoch is returned with ydata and time that are views
+        into this AnalogSignalArray, so writing to them changes it as well.
+        Smoothing in place copies first. Other indices return copies.
         """
         epochslice, signalslice = self._epochsignalslicer[idx]
 
@@ -675,6 +702,14 @@ class AnalogSignalArray:
             if epochslice.start == None and epochslice.stop == None and epochslice.step == None:
                 return asa
 
+        if isinstance(epochslice, (int, np.integer)):
+            # a single epoch is a view into the data
+            view = asa._epoch_view(int(epochslice))
+            if view is None:
+                warnings.warn("Index resulted in empty epoch array")
+                return AnalogSignalArray([], empty=True)
+            return view
+
         newepochs = self._support[epochslice]
         # TODO: this needs to change so that n_signals etc. are preserved
         ################################################################
@@ -19,6 +19,76 @@ warnings.formatwarning = lambda message, category, filename, lineno, \
     line=None: formatwarning_orig(
         message, category, filename, lineno, line='')
 
+########################################################################
+# set algebra
+########################################################################
+def _sweep_membership(epocharrays):
+    """Membership of the elementary intervals between all epoch boundaries.
+
+    Each epoch contributes a +1 marker at its start and a -1 marker at
+    its stop. The boundaries of all epoch arrays, sorted, delimit
+    elementary intervals, and the cumulative sum of the markers of each
+    array over these intervals counts how many of its epochs cover them.
+
+    Returns
+    -------
+    boundaries : array of shape (n_boundaries,)
+    membership : boolean array of shape (n_arrays, n_boundaries - 1)
+        Whether each elementary interval [boundaries[i], boundaries[i+1])
+        is covered by each epoch array.
+    """
+    times = [epocharray.time for epocharray in epocharrays
+             if not epocharray.isempty]
+    if len(times) == 0:
+        return np.array([]), np.zeros((len(epocharrays), 0), dtype=bool)
+    boundaries = np.unique(np.concatenate([time.ravel() for time in times]))
+    n_bounds = len(boundaries)
+
+    membership = np.zeros((len(epocharrays), max(n_bounds - 1, 0)), dtype=bool)
+    for ii, epocharray in enumerate(epocharrays):
+        if epocharray.isempty:
+            continue
+        markers = np.bincount(np.searchsorted(boundaries, epocharray.starts),
+                              minlength=n_bounds)
+        markers -= np.bincount(np.searchsorted(boundaries, epocharray.stops),
+                               minlength=n_bounds)
+        membership[ii] = np.cumsum(markers)[:-1] > 0
+    return boundaries, membership
+
+def _epochs_from_membership(boundaries, selected):
+    """Merged epoch times of the selected elementary intervals."""
+    padded = np.concatenate(([False], selected, [False]))
+    changes = np.diff(padded.astype(int))
+    starts = boundaries[np.flatnonzero(changes == 1)]
+    stops = boundaries[np.flatnonzero(changes == -1)]
+    return np.vstack([starts, stops]).T.astype(float)
+
+def _set_operation(epocharrays, rule):
+    """Combine epoch arrays, keeping the time covered according to rule.
+
+    Parameters
+    ----------
+    epocharrays : list of EpochArray
+        The first one provides the attributes of the result.
+    rule : callable
+        Maps the (n_arrays, n_intervals) membership matrix onto a boolean
+        array of the selected elementary intervals.
+
+    Returns
+    -------
+    epocharray : EpochArray
+        Sorted and merged epochs.
+    """
+    for epocharray in epocharrays:
+        if not isinstance(epocharray, EpochArray):
+            raise TypeError("unsupported operand type {}; expected EpochArray".format(str(type(epocharray))))
+    boundaries, membership = _sweep_membership(epocharrays)
+    selected = rule(membership) if membership.shape[1] > 0 else np.array([], dtype=bool)
+
+    out = copy.copy(epocharrays[0])
+    out._time = _epochs_from_membership(boundaries, selected)
+    return out
+
 ########################################################################
 # class EpochArray
 ########################################################################
@@ -234,8 +304,10 @@ class EpochArray:
             new = copy.copy(self)
             return new.shrink(other, direction='both')
         elif isinstance(other, EpochArray):
-            # A - B = A intersect ~B
-            return self.intersect(~other)
+            # A - B = A intersect ~B, so that the result stays within the
+            # domain of B
+            return _set_operation([self, other.domain, other],
+                                  lambda membership: membership[0] & membership[1] & ~membership[2])
         else:
             raise TypeError("unsupported operand type(s) for +: 'EpochArray' and {}".format(str(type(other))))
 
@@ -276,11 +348,17 @@ class EpochArray:
     def __or__(self, other):
         """join and merge epoch array; set union"""
         if isinstance(other, EpochArray):
-            new = copy.copy(self)
-            return (new.join(other)).merge()
+            return self.union(other)
         else:
             raise TypeError("unsupported operand type(s) for |: 'EpochArray' and {}".format(str(type(other))))
 
+    def __xor__(self, other):
+        """symmetric difference of epoch arrays"""
+        if isinstance(other, EpochArray):
+            return self.symmetric_difference(other)
+        else:
+            raise TypeError("unsupported operand type(s) for ^: 'EpochArray' and {}".format(str(type(other))))
+
     def __invert__(self):
         """complement within self.domain"""
         return self.complement()
@@ -536,7 +614,9 @@ class EpochArray:
         """Finds intersection (overlap) between two sets of epoch arrays.
         Sampling rates can be different.
 
-        TODO: verify if this requires a merged EpochArray to work properly?
+        Both epoch arrays are merged first. The overlapping pairs are then
+        found with a binary search of the starts and stops of one array
+        for the starts and stops of the other, in O((n+m) log(n+m)) time.
 
         Parameters
         ----------
@@ -554,50 +634,107 @@ class EpochArray:
             warnings.warn('epoch intersection is empty')
             return EpochArray(empty=True)
 
-        new_starts = []
-        new_stops = []
         epoch_a = self.copy().merge()
         epoch_b = epoch.copy().merge()
 
-        for aa in epoch_a.time:
-            for bb in epoch_b.time:
-                if (aa[0] <= bb[0] < aa[1]) and (aa[0] < bb[1] <= aa[1]):
-                    new_starts.append(bb[0])
-                    new_stops.append(bb[1])
-                elif (aa[0] < bb[0] < aa[1]) and (aa[0] < bb[1] > aa[1]):
-                    new_starts.append(bb[0])
-                    if boundaries:
-                        new_stops.append(aa[1])
-                    else:
-                        new_stops.append(bb[1])
-                elif (aa[0] > bb[0] < aa[1]) and (aa[0] < bb[1] < aa[1]):
-                    if boundaries:
-                        new_starts.append(aa[0])
-                    else:
-                        new_starts.append(bb[0])
-                    new_stops.append(bb[1])
-                elif (aa[0] >= bb[0] < aa[1]) and (aa[0] < bb[1] >= aa[1]):
-                    if boundaries:
-                        new_starts.append(aa[0])
-                        new_stops.append(aa[1])
-                    else:
-                        new_starts.append(bb[0])
-                        new_stops.append(bb[1])
-
-        if not boundaries:
-            new_starts = np.unique(new_starts)
-            new_stops = np.unique(new_stops)
+        # both epoch arrays are now sorted and disjoint, so that the
+        # epochs of A overlapping epoch bb of B are a contiguous run,
+        # from the first one that stops after bb starts, up to (but
+        # excluding) the first one that starts at or after bb stops
+        a_starts, a_stops = epoch_a.starts, epoch_a.stops
+        b_starts, b_stops = epoch_b.starts, epoch_b.stops
+        first = np.searchsorted(a_stops, b_starts, side='right')
+        last = np.searchsorted(a_starts, b_stops, side='left')
+        n_overlaps = np.maximum(last - first, 0)
+
+        # all (aa, bb) pairs with a nonzero overlap, in order of time
+        b_idx = np.repeat(np.arange(len(b_starts)), n_overlaps)
+        offsets = np.insert(np.cumsum(n_overlaps), 0, 0)[:-1]
+        a_idx = first[b_idx] + np.arange(len(b_idx)) - offsets[b_idx]
+
+        if boundaries:
+            new_starts = np.maximum(a_starts[a_idx], b_starts[b_idx])
+            new_stops = np.minimum(a_stops[a_idx], b_stops[b_idx])
+        else:
+            b_idx = np.unique(b_idx)
+            new_starts = b_starts[b_idx]
+            new_stops = b_stops[b_idx]
 
         epoch_a._time = np.hstack(
-            [np.array(new_starts)[..., np.newaxis],
-                np.array(new_stops)[..., np.newaxis]])
+            [np.array(new_starts, dtype=float)[..., np.newaxis],
+                np.array(new_stops, dtype=float)[..., np.newaxis]])
 
         return epoch_a
 
+    def union(self, *epochs):
+        """Set union of this and any number of other epoch arrays.
+
+        All set operations sweep once over the sorted boundaries of all
+        the epoch arrays involved, and return sorted, merged epochs.
+
+        Parameters
+        ----------
+        *epochs : nelpy.EpochArray
+
+        Returns
+        -------
+        union : nelpy.EpochArray
+        """
+        return _set_operation([self] + list(epochs),
+                              lambda membership: membership.any(axis=0))
+
+    def intersection(self, *epochs):
+        """Set intersection of this and any number of other epoch arrays.
+
+        Parameters
+        ----------
+        *epochs : nelpy.EpochArray
+
+        Returns
+        -------
+        intersection : nelpy.EpochArray
+        """
+        return _set_operation([self] + list(epochs),
+                              lambda membership: membership.all(axis=0))
+
+    def difference(self, *epochs):
+        """Time in this epoch array that is not in any of the others.
+
+        Unlike A - B, which is restricted to the domain of B, domains
+        are ignored here.
+
+        Parameters
+        ----------
+        *epochs : nelpy.EpochArray
+
+        Returns
+        -------
+        difference : nelpy.EpochArray
+        """
+        return _set_operation([self] + list(epochs),
+                              lambda membership: membership[0] & ~membership[1:].any(axis=0))
+
+    def symmetric_difference(self, *epochs):
+        """Time covered by an odd number of the epoch arrays.
+
+        For two epoch arrays, this is the time in exactly one of them.
+
+        Parameters
+        ----------
+        *epochs : nelpy.EpochArray
+
+        Returns
+        -------
+        symmetric_difference : nelpy.EpochArray
+        """
+        return _set_operation([self] + list(epochs),
+                              lambda membership: membership.sum(axis=0) % 2 == 1)
+
     def merge(self, *, gap=0.0):
         """Merges epochs that are close or overlapping.
 
-        WARNING! Algorithm only works on SORTED epochs.
+        Epochs are sorted if necessary, and then merged in a single
+        vectorized pass over the running maximum of their stops.
 
         Parameters
         ----------
@@ -612,6 +749,9 @@ class EpochArray:
         if gap < 0:
             raise ValueError("gap cannot be negative")
 
+        if self.isempty:
+            return self
+
         if (self.ismerged) and (gap==0.0):
             # already merged
             return self
@@ -621,32 +761,19 @@ class EpochArray:
         if not newepocharray.issorted:
             newepocharray._sort()
 
-        while not newepocharray.ismerged or gap>0:
-            stops = newepocharray.stops[:-1] + gap
-            starts = newepocharray.starts[1:]
-            to_merge = (stops - starts) >= 0
-
-            new_starts = [newepocharray.starts[0]]
-            new_stops = []
-
-            next_stop = newepocharray.stops[0]
-            for i in range(newepocharray.time.shape[0] - 1):
-                this_stop = newepocharray.stops[i]
-                next_stop = max(next_stop, this_stop)
-                if not to_merge[i]:
-                    new_stops.append(next_stop)
-                    new_starts.append(newepocharray.starts[i + 1])
+        starts = newepocharray.starts
+        stops = newepocharray.stops
 
-            new_stops.append(newepocharray.stops[-1])
+        # an epoch starts a new merged epoch if it starts more than gap
+        # after every earlier epoch has stopped
+        running_stops = np.maximum.accumulate(stops)
+        new_epoch = np.insert(starts[1:] > running_stops[:-1] + gap, 0, True)
+        first = np.flatnonzero(new_epoch)
 
-            new_starts = np.array(new_starts)
-            new_stops = np.array(new_stops)
+        new_starts = starts[first]
+        new_stops = np.maximum.reduceat(stops, first)
 
-            newepocharray._time = np.vstack([new_starts, new_stops]).T
-
-            # after one pass, all the gap offsets have been added, and
-            # then we just need to keep merging...
-            gap = 0.0
+        newepocharray._time = np.vstack([new_starts, new_stops]).T
 
         return newepocharray
 
@@ -741,27 +868,58 @@ class EpochArray:
             ))
         return newepocharray
 
-    def contains(self, value):
+    def contains(self, value, *, return_index=False):
         """Checks whether value is in any epoch.
 
+        Epochs are closed intervals here, so that values equal to an
+        epoch stop are contained in it. Values are located with a binary
+        search over the epoch starts, so that arrays of millions of
+        values can be checked at once.
+
         Parameters
         ----------
-        epochs: nelpy.EpochArray
-        value: float or int
+        value : float, int or array_like
+            Value(s) to look up.
+        return_index : bool, optional
+            If True, return the index of an epoch containing each value
+            instead, or -1 if no epoch contains it. Where epochs overlap,
+            the containing epoch that stops last is returned.
+            Default is False.
 
         Returns
         -------
-        boolean
+        contained : bool, or boolean array with the shape of value
+        OR
+        epoch_idx : int, or int array with the shape of value
 
         """
-        # TODO: consider vectorizing this loop, which should increase
-        # speed, but also greatly increase memory? Alternatively, if we
-        # could assume something about epochs being sorted, this can
-        # also be made much faster than the current O(N)
-        for start, stop in zip(self.starts, self.stops):
-            if start <= value <= stop:
-                return True
-        return False
+        values = np.asarray(value, dtype=float)
+        if self.isempty:
+            if return_index:
+                epoch_idx = np.full(values.shape, -1, dtype=int)
+                return epoch_idx if values.ndim else int(epoch_idx)
+            mask = np.zeros(values.shape, dtype=bool)
+            return mask if values.ndim else bool(mask)
+
+        sort_idx = np.argsort(self.starts, kind='mergesort')
+        starts = self.starts[sort_idx]
+        stops = self.stops[sort_idx]
+        # for the epochs starting at or before each value, the one
+        # that stops last is the only candidate to check
+        running_stops = np.maximum.accumulate(stops)
+        owners = np.maximum.accumulate(
+            np.where(stops >= running_stops, np.arange(len(stops)), 0))
+
+        flat = values.ravel()
+        candidate = np.searchsorted(starts, flat, side='right') - 1
+        found = candidate >= 0
+        found[found] = running_stops[candidate[found]] >= flat[found]
+
+        if return_index:
+            epoch_idx = np.full(flat.shape, -1, dtype=int)
+            epoch_idx[found] = sort_idx[owners[candidate[found]]]
+            return epoch_idx.reshape(values.shape) if values.ndim else int(epoch_idx[0])
+        return found.reshape(values.shape) if values.ndim else bool(found[0])
 
     def _sort(self):
         """Sort epochs by epoch starts"""
@@ -13,6 +13,16 @@ def fsgetter(self):
         warnings.warn("No sampling frequency has been specified!")
     return self._fs
 
+def _restrict_rows(data, mask):
+    """Rows of data restricted to mask, as a 2D array if they stay equally
+    long, or as an object array of 1D arrays otherwise."""
+    rows = [row[keep] for row, keep in zip(data, mask)]
+    if len(set(len(row) for row in rows)) <= 1:
+        return np.array(rows, ndmin=2)
+    out = np.empty(len(rows), dtype=object)
+    out[:] = rows
+    return out
+
 ########################################################################
 # class EventArray
 ########################################################################
@@ -236,26 +246,33 @@ class EventArray:
         except AttributeError:
             raise AttributeError("EpochArray expected")
 
-        indices = []
-        for eptime in epocharray.time:
-            t_start = eptime[0]
-            t_stop = eptime[1]
-            indices.append((self._time >= t_start) & (self._time <= t_stop))
-        indices = np.any(np.column_stack(indices), axis=1)
-        if np.count_nonzero(indices) < len(self._time):
+        # events are kept if they lie in any (closed) epoch; each event is
+        # looked up with a binary search over the epoch starts
+        if self._time.dtype == object:
+            # the series already have different numbers of events, and
+            # are looked up one at a time
+            indices = [epocharray.contains(row) for row in self._time]
+            n_kept = sum(np.count_nonzero(keep) for keep in indices)
+            n_events = sum(keep.size for keep in indices)
+            has_state = self._state.shape == self._time.shape
+        else:
+            indices = epocharray.contains(self._time)
+            n_kept, n_events = np.count_nonzero(indices), indices.size
+            has_state = self._state.size == indices.size
+        if n_kept < n_events:
             warnings.warn("ignoring timestamps outside of support")
-        try:
-            self._tdata = self._tdata[:,indices]
-        except IndexError:
-            self._tdata = np.zeros([0,self._tdata.shape[0]])
-            self._tdata[:] = np.NAN
-            self._time = np.zeros([0,self._time.shape[0]])
-            self._time[:] = np.NAN
-            self._state = np.zeros([0,self._state.shape[0]])
-            self._state = np.NAN
-            self._labels = None
-        self._time = self._time[indices]
-        self._tdata = self._tdata[indices]
+        if self._time.shape[0] == 1:
+            keep = indices[0]
+            self._time = self._time[..., keep]
+            self._tdata = self._tdata[..., keep]
+            if has_state:
+                self._state = self._state[..., keep]
+        else:
+            # each series keeps a different number of events
+            self._time = _restrict_rows(self._time, indices)
+            self._tdata = _restrict_rows(self._tdata, indices)
+            if has_state:
+                self._state = _restrict_rows(self._state, indices)
         if update:
             self._support = epocharray
 
@@ -7,11 +7,8 @@ import copy
 
 from abc import ABC, abstractmethod
 
-from ..utils import is_sorted, \
-                   linear_merge, \
-                   PrettyDuration, \
+from ..utils import PrettyDuration, \
                    PrettyInt, \
-                   swap_rows, \
                    gaussian_filter
 
 from ..utils_.decorators import deprecated
@@ -112,10 +109,7 @@ class ItemGetter_loc(object):
         if not isinstance(unit_idx_list, list):
             unit_idx_list = list(unit_idx_list)
         out = copy.copy(self.obj)
-        out._time = out._time[unit_idx_list]
-        singleunit = len(out._time)==1
-        if singleunit:
-            out._time = np.array(out._time[0], ndmin=2)
+        out._take_units(unit_idx_list)
         out._unit_ids = list(np.atleast_1d(np.atleast_1d(out._unit_ids)[unit_idx_list]))
         out._unit_labels = list(np.atleast_1d(np.atleast_1d(out._unit_labels)[unit_idx_list]))
         # TODO: update tags
@@ -151,10 +145,7 @@ class ItemGetter_iloc(object):
         out = copy.copy(self.obj)
         if isinstance(unitslice, int):
             unitslice = [unitslice]
-        out._time = out._time[unitslice]
-        singleunit = len(out._time)==1
-        if singleunit:
-            out._time = np.array(out._time[0], ndmin=2)
+        out._take_units(unitslice)
         out._unit_ids = list(np.atleast_1d(np.atleast_1d(out._unit_ids)[unitslice]))
         out._unit_labels = list(np.atleast_1d(np.atleast_1d(out._unit_labels)[unitslice]))
         # TODO: update tags
@@ -430,7 +421,7 @@ class SpikeTrain(ABC):
                 return SpikeTrainArray(empty=True)
 
             spiketrainarray = SpikeTrainArray(empty=True)
-            exclude = ["_time", "unit_ids", "unit_labels"]
+            exclude = ["unit_ids", "unit_labels"]
             attrs = (x for x in self.__attributes__ if x not in exclude)
 
             with warnings.catch_warnings():
@@ -438,7 +429,7 @@ class SpikeTrain(ABC):
                 for attr in attrs:
                     exec("spiketrainarray." + attr + " = self." + attr)
 
-            spiketrainarray._time = self.time[unit_subset_ids]
+            spiketrainarray._take_units(unit_subset_ids)
             spiketrainarray._unit_ids = new_unit_ids
             spiketrainarray._unit_labels = new_unit_labels
             spiketrainarray.loc = ItemGetter_loc(spiketrainarray)
@@ -499,7 +490,9 @@ class SpikeTrainArray(SpikeTrain):
     Attributes
     ----------
     time : array of np.array(dtype=np.float64) spike times in seconds.
-        Array of length n_units, each entry with shape (n_time,)
+        Array of length n_units, each entry with shape (n_time,). The
+        entries are views into a single contiguous buffer of spike
+        times, so that no per-unit copies are made.
     support : EpochArray on which spiketrain array is defined.
     n_spikes: np.array(dtype=np.int) of shape (n_units,)
         Number of spikes in each unit.
@@ -513,7 +506,11 @@ class SpikeTrainArray(SpikeTrain):
         Metadata associated with spiketrain.
     """
 
-    __attributes__ = ["_time", "_support"]
+    # spike times are stored in a compressed sparse row (CSR) layout:
+    # _spikes is a contiguous float64 buffer holding the sorted spike
+    # times of all units back to back, and the spike times of unit ii
+    # are _spikes[_unit_offsets[ii]:_unit_offsets[ii+1]].
+    __attributes__ = ["_spikes", "_unit_offsets", "_support"]
     __attributes__.extend(SpikeTrain.__attributes__)
     def __init__(self, timestamps=None, *, fs=None, support=None,
                  unit_ids=None, unit_labels=None, unit_tags=None,
@@ -600,11 +597,6 @@ class SpikeTrainArray(SpikeTrain):
 
         time = standardize_to_2d(timestamps)
 
-        #sort spike trains, but only if necessary:
-        for ii, train in enumerate(time):
-            if not is_sorted(train):
-                time[ii] = np.sort(train)
-
         kwargs = {"fs": fs,
                   "unit_ids": unit_ids,
                   "unit_labels": unit_labels,
@@ -614,23 +606,23 @@ class SpikeTrainArray(SpikeTrain):
         self._time = time  # this is necessary so that
         # super() can determine self.n_units when initializing.
 
+        #sort spike trains, but only if necessary:
+        self._sort_units()
+
         # initialize super so that self.fs is set:
         super().__init__(**kwargs)
 
         # if only empty time were received AND no support, attach an
         # empty support:
-        if np.sum([st.size for st in time]) == 0 and support is None:
+        if self._unit_offsets[-1] == 0 and support is None:
             warnings.warn("no spikes; cannot automatically determine support")
             support = EpochArray(empty=True)
 
         # determine spiketrain array support:
         if support is None:
-            first_spk = np.array([unit[0] for unit in time if len(unit) !=0]).min()
-            # BUG: if spiketrain is empty np.array([]) then unit[-1]
-            # raises an error in the following:
-            # FIX: list[-1] raises an IndexError for an empty list,
-            # whereas list[-1:] returns an empty list.
-            last_spk = np.array([unit[-1:] for unit in time if len(unit) !=0]).max()
+            n_spikes = np.diff(self._unit_offsets)
+            first_spk = self._spikes[self._unit_offsets[:-1][n_spikes > 0]].min()
+            last_spk = self._spikes[self._unit_offsets[1:][n_spikes > 0] - 1].max()
             self._support = EpochArray(np.array([first_spk, last_spk + 1/fs]))
             # in the above, there's no reason to restrict to support
         else:
@@ -638,11 +630,83 @@ class SpikeTrainArray(SpikeTrain):
             # array's support:
             self._support = support
 
-        time = self._restrict_to_epoch_array(
+        self._spikes, self._unit_offsets = self._restrict_to_epoch_array(
             epocharray=self._support,
-            time=time)
+            spikes=self._spikes,
+            unit_offsets=self._unit_offsets)
 
-        self._time = time
+    @property
+    def _time(self):
+        """(array) Spike times of each unit, as views into _spikes.
+
+        If all units have the same number of spikes, a 2D array of shape
+        (n_units, n_spikes) is returned, otherwise an object array of
+        length n_units is returned.
+        """
+        if self._spikes is None:
+            return None
+        offsets = self._unit_offsets
+        n_units = len(offsets) - 1
+        lengths = np.diff(offsets)
+        if n_units == 0:
+            return self._spikes.reshape((0, 0))
+        if np.all(lengths == lengths[0]):
+            return self._spikes.reshape((n_units, lengths[0]))
+        time = np.empty(n_units, dtype=object)
+        for ii in range(n_units):
+            time[ii] = self._spikes[offsets[ii]:offsets[ii+1]]
+        return time
+
+    @_time.setter
+    def _time(self, val):
+        if val is None:
+            self._spikes = None
+            self._unit_offsets = None
+            return
+        if isinstance(val, np.ndarray) and val.ndim == 2 and val.dtype != np.dtype('O'):
+            n_units, n_spikes = val.shape
+            self._spikes = np.ascontiguousarray(val, dtype=float).ravel()
+            self._unit_offsets = np.arange(n_units + 1) * n_spikes
+            return
+        units = [np.asarray(unit, dtype=float).ravel() for unit in val]
+        lengths = np.array([len(unit) for unit in units], dtype=int)
+        self._spikes = np.concatenate(units + [np.array([])])
+        self._unit_offsets = np.insert(np.cumsum(lengths), 0, 0)
+
+    def _take_units(self, unit_idx):
+        """Restrict (or reorder) the spike buffer to a subset of units.
+
+        Parameters
+        ----------
+        unit_idx : int, slice, or array-like
+            Unit indices (not unit_ids) to keep, in the desired order.
+        """
+        if self._spikes is None:
+            return
+        unit_idx = np.arange(self.n_units)[unit_idx]
+        starts = self._unit_offsets[:-1][unit_idx]
+        lengths = np.atleast_1d(np.diff(self._unit_offsets)[unit_idx])
+        offsets = np.insert(np.cumsum(lengths), 0, 0)
+        idx = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        self._spikes = self._spikes[idx]
+        self._unit_offsets = offsets
+
+    def _sort_units(self):
+        """Sort the spike times of each unit, but only if necessary."""
+        unsorted = np.unique(self._unsorted_units())
+        for unit in unsorted:
+            start, stop = self._unit_offsets[unit], self._unit_offsets[unit+1]
+            self._spikes[start:stop] = np.sort(self._spikes[start:stop])
+
+    def _unsorted_units(self):
+        """Return the unit index of every decreasing step in _spikes."""
+        if self._spikes is None or len(self._spikes) < 2:
+            return np.array([], dtype=int)
+        decreasing = np.flatnonzero(~(self._spikes[1:] >= self._spikes[:-1]))
+        # steps across unit boundaries do not count
+        units = np.searchsorted(self._unit_offsets, decreasing, side='right') - 1
+        within = decreasing + 1 < self._unit_offsets[units + 1]
+        return units[within]
 
     def copy(self):
         """Returns a copy of the SpikeTrainArray."""
@@ -663,8 +727,8 @@ class SpikeTrainArray(SpikeTrain):
         support = self.support + other.support
 
         newdata = []
-        for unit in range(self.n_units):
-            newdata.append(np.append(self.time[unit], other.time[unit]))
+        for unit_self, unit_other in zip(self.time, other.time):
+            newdata.append(np.append(unit_self, unit_other))
 
         fs = self.fs
         if self.fs != other.fs:
@@ -685,17 +749,18 @@ class SpikeTrainArray(SpikeTrain):
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             support = self.support[index]
-            time = self._restrict_to_epoch_array(
+            spikes, unit_offsets = self._restrict_to_epoch_array(
                 epocharray=support,
-                time=self.time,
-                copyover=True
+                spikes=self._spikes,
+                unit_offsets=self._unit_offsets
                 )
             spiketrain = SpikeTrainArray(empty=True)
-            exclude = ["_time", "_support"]
+            exclude = ["_spikes", "_unit_offsets", "_support"]
             attrs = (x for x in self.__attributes__ if x not in exclude)
             for attr in attrs:
                 exec("spiketrain." + attr + " = self." + attr)
-            spiketrain._time = time
+            spiketrain._spikes = spikes
+            spiketrain._unit_offsets = unit_offsets
             spiketrain._support = support
             spiketrain.loc = ItemGetter_loc(spiketrain)
             spiketrain.iloc = ItemGetter_iloc(spiketrain)
@@ -719,24 +784,25 @@ class SpikeTrainArray(SpikeTrain):
 
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
-                time = self._restrict_to_epoch_array(
+                spikes, unit_offsets = self._restrict_to_epoch_array(
                     epocharray=support,
-                    time=self.time,
-                    copyover=True
+                    spikes=self._spikes,
+                    unit_offsets=self._unit_offsets
                     )
                 spiketrain = SpikeTrainArray(empty=True)
-                exclude = ["_time", "_support"]
+                exclude = ["_spikes", "_unit_offsets", "_support"]
                 attrs = (x for x in self.__attributes__ if x not in exclude)
                 for attr in attrs:
                     exec("spiketrain." + attr + " = self." + attr)
-                spiketrain._time = time
+                spiketrain._spikes = spikes
+                spiketrain._unit_offsets = unit_offsets
                 spiketrain._support = support
                 spiketrain.loc = ItemGetter_loc(spiketrain)
                 spiketrain.iloc = ItemGetter_iloc(spiketrain)
             return spiketrain
         elif isinstance(idx, int):
             spiketrain = SpikeTrainArray(empty=True)
-            exclude = ["_time", "_support"]
+            exclude = ["_spikes", "_unit_offsets", "_support"]
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
                 attrs = (x for x in self.__attributes__ if x not in exclude)
@@ -749,12 +815,13 @@ class SpikeTrainArray(SpikeTrain):
                 spiketrain.iloc = ItemGetter_iloc(spiketrain)
                 return spiketrain
             else:
-                time = self._restrict_to_epoch_array(
-                        epocharray=support,
-                        time=self.time,
-                        copyover=True
-                        )
-                spiketrain._time = time
+                spikes, unit_offsets = self._restrict_to_epoch_array(
+                    epocharray=support,
+                    spikes=self._spikes,
+                    unit_offsets=self._unit_offsets
+                    )
+                spiketrain._spikes = spikes
+                spiketrain._unit_offsets = unit_offsets
                 spiketrain._support = support
                 spiketrain.loc = ItemGetter_loc(spiketrain)
                 spiketrain.iloc = ItemGetter_iloc(spiketrain)
@@ -764,17 +831,18 @@ class SpikeTrainArray(SpikeTrain):
                 with warnings.catch_warnings():
                     warnings.simplefilter("ignore")
                     support = self.support[idx]
-                    time = self._restrict_to_epoch_array(
+                    spikes, unit_offsets = self._restrict_to_epoch_array(
                         epocharray=support,
-                        time=self.time,
-                        copyover=True
+                        spikes=self._spikes,
+                        unit_offsets=self._unit_offsets
                         )
                     spiketrain = SpikeTrainArray(empty=True)
-                    exclude = ["_time", "_support"]
+                    exclude = ["_spikes", "_unit_offsets", "_support"]
                     attrs = (x for x in self.__attributes__ if x not in exclude)
                     for attr in attrs:
                         exec("spiketrain." + attr + " = self." + attr)
-                    spiketrain._time = time
+                    spiketrain._spikes = spikes
+                    spiketrain._unit_offsets = unit_offsets
                     spiketrain._support = support
                     spiketrain.loc = ItemGetter_loc(spiketrain)
                     spiketrain.iloc = ItemGetter_iloc(spiketrain)
@@ -795,7 +863,7 @@ class SpikeTrainArray(SpikeTrain):
     def isempty(self):
         """(bool) Empty SpikeTrainArray."""
         try:
-            return np.sum([len(st) for st in self.time]) == 0
+            return bool(self._unit_offsets[-1] == 0)
         except TypeError:
             return True  # this happens when self.time == None
 
@@ -803,7 +871,7 @@ class SpikeTrainArray(SpikeTrain):
     def n_units(self):
         """(int) The number of units."""
         try:
-            return PrettyInt(len(self.time))
+            return PrettyInt(len(self._unit_offsets) - 1)
         except TypeError:
             return 0
 
@@ -840,7 +908,7 @@ class SpikeTrainArray(SpikeTrain):
 
         spiketrainarray = SpikeTrainArray(empty=True)
 
-        exclude = ["_time", "unit_ids", "unit_labels", "unit_tags"]
+        exclude = ["_spikes", "_unit_offsets", "unit_ids", "unit_labels", "unit_tags"]
         attrs = (x for x in self.__attributes__ if x not in exclude)
 
         with warnings.catch_warnings():
@@ -851,57 +919,63 @@ class SpikeTrainArray(SpikeTrain):
         spiketrainarray._unit_labels = [unit_label]
         spiketrainarray._unit_tags = None
 
-        alltimes = self.time[0]
-        for unit in range(1,self.n_units):
-            alltimes = linear_merge(alltimes, self.time[unit])
+        # the buffer consists of n_units sorted runs, which a stable
+        # (tim)sort merges efficiently
+        alltimes = np.sort(self._spikes, kind='mergesort')
 
-        spiketrainarray._time = np.array(list(alltimes), ndmin=2)
+        spiketrainarray._spikes = alltimes
+        spiketrainarray._unit_offsets = np.array([0, len(alltimes)])
         spiketrainarray.loc = ItemGetter_loc(spiketrainarray)
         spiketrainarray.iloc = ItemGetter_iloc(spiketrainarray)
         return spiketrainarray
 
     @staticmethod
-    def _restrict_to_epoch_array(epocharray, time, copyover=True):
-        """Return time restricted to an EpochArray.
+    def _restrict_to_epoch_array(epocharray, spikes, unit_offsets):
+        """Return spike buffer restricted to an EpochArray.
+
+        Each spike is located among the sorted epoch starts with a
+        binary search, so that restriction takes O(n_spikes log n_epochs)
+        time for all units at once, without building any dense
+        (n_spikes, n_epochs) masks. Epochs are half-open, [start, stop),
+        and may overlap.
 
         Parameters
         ----------
         epocharray : EpochArray
-        time : array-like
+        spikes : np.array
+            Flat buffer of spike times of all units, of shape (n_spikes,).
+        unit_offsets : np.array
+            Offsets of each unit into spikes, of shape (n_units + 1,).
+
+        Returns
+        -------
+        spikes : np.array
+            Flat buffer of the spike times inside the epochs.
+        unit_offsets : np.array
+            Offsets of each unit into the restricted buffer.
         """
         if epocharray.isempty:
-            n_units = len(time)
-            time = np.zeros((n_units,0))
-            return time
-
-        singleunit = len(time)==1  # bool
-
-        # TODO: is this copy even necessary?
-        if copyover:
-            time = copy.copy(time)
-
-        # NOTE: this used to assume multiple units for the enumeration to work
-        for unit, st_time in enumerate(time):
-            indices = []
-            for eptime in epocharray.time:
-                t_start = eptime[0]
-                t_stop = eptime[1]
-                indices.append((st_time >= t_start) & (st_time < t_stop))
-            indices = np.any(np.column_stack(indices), axis=1)
-            if np.count_nonzero(indices) < len(st_time):
-                warnings.warn(
-                    'ignoring spikes outside of spiketrain support')
-            if singleunit:
-                time = np.array([time[0][indices]], ndmin=2)
-            else:
-                # here we have to do some annoying conversion between
-                # arrays and lists to fully support jagged array
-                # mutation
-                time_ = time.tolist()
-                time_[unit] = np.array(time_[unit])
-                time_[unit] = time_[unit][indices]
-                time = np.array(time_)
-        return time
+            n_units = len(unit_offsets) - 1
+            return np.array([]), np.zeros(n_units + 1, dtype=int)
+
+        starts = np.atleast_1d(epocharray.starts)
+        stops = np.atleast_1d(epocharray.stops)
+        order = np.argsort(starts, kind='mergesort')
+        starts = starts[order]
+        # a spike is inside the support if any epoch starting at or
+        # before it also stops after it
+        stops = np.maximum.accumulate(stops[order])
+
+        epoch_idx = np.searchsorted(starts, spikes, side='right') - 1
+        keep = epoch_idx >= 0
+        keep[keep] = spikes[keep] < stops[epoch_idx[keep]]
+
+        if not np.all(keep):
+            warnings.warn(
+                'ignoring spikes outside of spiketrain support')
+
+        kept = np.insert(np.cumsum(keep), 0, 0)
+        return spikes[keep], kept[unit_offsets]
 
     def __repr__(self):
         address_str = " at " + str(hex(id(self)))
@@ -944,16 +1018,14 @@ class SpikeTrainArray(SpikeTrain):
         """(np.array) The number of spikes in each unit."""
         if self.isempty:
             return 0
-        return np.array([len(unit) for unit in self.time])
+        return np.diff(self._unit_offsets)
 
     @property
     def issorted(self):
         """(bool) Sorted SpikeTrainArray."""
         if self.isempty:
             return True
-        return np.array(
-            [is_sorted(spiketrain) for spiketrain in self.time]
-            ).all()
+        return len(self._unsorted_units()) == 0
 
     def _reorder_units_by_idx(self, neworder, inplace=False):
         """Reorder units according to a specified order.
@@ -974,11 +1046,11 @@ class SpikeTrainArray(SpikeTrain):
         for oi, ni in enumerate(neworder):
             frm = oldorder.index(ni)
             to = oi
-            swap_rows(out._time, frm, to)
             out._unit_ids[frm], out._unit_ids[to] = out._unit_ids[to], out._unit_ids[frm]
             out._unit_labels[frm], out._unit_labels[to] = out._unit_labels[to], out._unit_labels[frm]
             # TODO: re-build unit tags (tag system not yet implemented)
             oldorder[frm], oldorder[to] = oldorder[to], oldorder[frm]
+        out._take_units(neworder)
         out.loc = ItemGetter_loc(out)
         out.iloc = ItemGetter_iloc(out)
         return out
@@ -1016,11 +1088,11 @@ class SpikeTrainArray(SpikeTrain):
         for oi, ni in enumerate(neworder):
             frm = oldorder.index(ni)
             to = oi
-            swap_rows(out._time, frm, to)
             out._unit_ids[frm], out._unit_ids[to] = out._unit_ids[to], out._unit_ids[frm]
             out._unit_labels[frm], out._unit_labels[to] = out._unit_labels[to], out._unit_labels[frm]
             # TODO: re-build unit tags (tag system not yet implemented)
             oldorder[frm], oldorder[to] = oldorder[to], oldorder[frm]
+        out._take_units(neworder)
 
         out.loc = ItemGetter_loc(out)
         out.iloc = ItemGetter_iloc(out)
@@ -1224,26 +1296,26 @@ class BinnedSpikeTrainArray(SpikeTrain):
                 support = self.support[idx]
                 binnedspiketrain._support = support
 
-                bsupport = self.binnedSupport[idx,:] # need to re-index!
-                # now build a list of all elements in bsupport:
-                ll = []
-                for bs in bsupport:
-                    ll.extend(np.arange(bs[0],bs[1]+1, step=1))
+                # normalize slices (open-ended, stepped) and lists alike
+                ii = np.atleast_1d(np.arange(self.n_epochs)[idx])
+                bsupport = self.binnedSupport[ii,:] # need to re-index!
+                # indices of all the bins in bsupport, concatenated:
+                lengths = self.lengths[ii]
+                offsets = np.insert(np.cumsum(lengths), 0, 0)
+                ll = np.repeat(bsupport[:,0] - offsets[:-1], lengths) + np.arange(offsets[-1])
                 binnedspiketrain._bin_centers = self._bin_centers[ll]
                 binnedspiketrain._data = self._data[:,ll]
 
-                lengths = self.lengths[[idx]]
-                # lengths = bsupport[:,1] - bsupport[:,0]
-                bsstarts = np.insert(np.cumsum(lengths),0,0)[:-1]
-                bsends = np.cumsum(lengths) - 1
+                bsstarts = offsets[:-1]
+                bsends = offsets[1:] - 1
                 binnedspiketrain._binnedSupport = np.vstack((bsstarts, bsends)).T
 
                 binindices = np.insert(0, 1, np.cumsum(self.lengths + 1)) # indices of bins
-                binstarts = binindices[idx]
-                binstops = binindices[1:][idx]  # equivalent to binindices[idx + 1], but if idx is a slice, we can't add 1 to it
-                ll = []
-                for start, stop in zip(binstarts, binstops):
-                    ll.extend(np.arange(start,stop,step=1))
+                binstarts = binindices[ii]
+                binstops = binindices[ii + 1]
+                n_edges = binstops - binstarts
+                edge_offsets = np.insert(np.cumsum(n_edges), 0, 0)
+                ll = np.repeat(binstarts - edge_offsets[:-1], n_edges) + np.arange(edge_offsets[-1])
                 binnedspiketrain._bins = self._bins[ll]
                 binnedspiketrain.loc = ItemGetter_loc(binnedspiketrain)
                 binnedspiketrain.iloc = ItemGetter_iloc(binnedspiketrain)
@@ -1413,48 +1485,131 @@ class BinnedSpikeTrainArray(SpikeTrain):
         centers = bins[:-1] + (ds / 2)
         return bins, centers
 
-    def _bin_spikes(self, spiketrainarray, epochArray, ds):
+    @staticmethod
+    def _get_bins_inside_epochs(epochArray, ds):
+        """Return bin edges and centers for all epochs at once.
+
+        This is the vectorized equivalent of calling
+        _get_bins_inside_epoch on each epoch in turn, and the bin edges
+        are identical (element for element) to those returned by
+        np.linspace for each epoch. Epochs shorter than ds are dropped.
+
+        Parameters
+        ----------
+        epochArray : EpochArray
+            EpochArray containing one or more epochs.
+        ds : float
+            Time bin width, in seconds.
+
+        Returns
+        -------
+        bins : array
+            Concatenated bin edges of all retained epochs, with shape
+            (sum(n_bins) + n_epochs,).
+        centers : array
+            Concatenated bin centers, with shape (sum(n_bins),).
+        n_bins : array
+            Number of bins in each retained epoch.
         """
-        Docstring goes here. TBD. For use with bins that are contained
-        wholly inside the epochs.
+        starts = np.asarray(epochArray.starts, dtype=float)
+        durations = np.asarray(epochArray.stops, dtype=float) - starts
+
+        keep = durations >= ds
+        if not np.all(keep):
+            warnings.warn(
+                "epoch duration is less than bin size: ignoring...")
+        starts = starts[keep]
+        n_bins = np.floor(durations[keep] / ds).astype(int)
+
+        # reproduce np.linspace(start, start + n*ds, n+1) for every epoch
+        stops = starts + n_bins*ds
+        step = (stops - starts) / n_bins
+        edge_offsets = np.insert(np.cumsum(n_bins+1), 0, 0)
+        epoch_ids = np.repeat(np.arange(len(n_bins)), n_bins+1)
+        jj = np.arange(edge_offsets[-1]) - edge_offsets[epoch_ids]
+        bins = jj*step[epoch_ids] + starts[epoch_ids]
+        bins[edge_offsets[1:]-1] = stops
+
+        last_edges = np.zeros(len(bins), dtype=bool)
+        last_edges[edge_offsets[1:]-1] = True
+        centers = bins[~last_edges] + (ds / 2)
 
+        return bins, centers, n_bins
+
+    def _bin_spikes(self, spiketrainarray, epochArray, ds):
+        """Bin spikes of all units into bins wholly contained in epochs.
+
+        All units are binned in a single pass: the spike times of every
+        unit are pooled, the spikes falling inside each epoch are located
+        with a binary search, and the counts are accumulated with
+        np.bincount directly into the (n_units, n_bins) data array. The
+        result is identical to calling np.histogram for every unit and
+        epoch, i.e., bins are [a, b), except for the last bin of each
+        epoch, which is [a, b].
+
+        Parameters
+        ----------
+        spiketrainarray : SpikeTrainArray
+            SpikeTrainArray to bin.
+        epochArray : EpochArray
+            Epochs inside of which to bin the spikes.
+        ds : float
+            Time bin width, in seconds.
         """
-        b = []  # bin list
-        c = []  # centers list
-        s = []  # data list
-        for nn in range(spiketrainarray.n_units):
-            s.append([])
-        left_edges = []
-        right_edges = []
-        counter = 0
-        for epoch in epochArray:
-            bins, centers = self._get_bins_inside_epoch(epoch, ds)
-            if bins is not None:
-                for uu, spiketraintimes in enumerate(spiketrainarray.time):
-                    spike_counts, _ = np.histogram(
-                        spiketraintimes,
-                        bins=bins,
-                        density=False,
-                        range=(epoch.start,epoch.stop)
-                        ) # TODO: is it faster to limit range, or to cut out spikes?
-                    s[uu].extend(spike_counts.tolist())
-                left_edges.append(counter)
-                counter += len(centers) - 1
-                right_edges.append(counter)
-                counter += 1
-                b.extend(bins.tolist())
-                c.extend(centers.tolist())
-        self._bins = np.array(b)
-        self._bin_centers = np.array(c)
-        self._data = np.array(s)
-        le = np.array(left_edges)
-        le = le[:, np.newaxis]
-        re = np.array(right_edges)
-        re = re[:, np.newaxis]
-        self._binnedSupport = np.hstack((le, re))
-        support_starts = self.bins[np.insert(np.cumsum(self.lengths+1),0,0)[:-1]]
-        support_stops = self.bins[np.insert(np.cumsum(self.lengths+1)-1,0,0)[1:]]
-        supportdata = np.vstack([support_starts, support_stops]).T
+        n_units = spiketrainarray.n_units
+        bins, centers, n_bins = self._get_bins_inside_epochs(epochArray, ds)
+        n_epochs = len(n_bins)
+        n_total = int(n_bins.sum())
+
+        edge_offsets = np.insert(np.cumsum(n_bins+1), 0, 0)
+        bin_offsets = np.insert(np.cumsum(n_bins), 0, 0)
+
+        # pool spike times of all units, sorted in time
+        if spiketrainarray._spikes is not None:
+            n_spikes = np.diff(spiketrainarray._unit_offsets)
+            flat_times = spiketrainarray._spikes
+        else:
+            n_spikes = np.array([], dtype=int)
+            flat_times = np.array([])
+        flat_units = np.repeat(np.arange(n_units), n_spikes)
+        order = np.argsort(flat_times, kind='mergesort')
+        flat_times = flat_times[order]
+        flat_units = flat_units[order]
+
+        # contiguous run of spikes inside [first edge, last edge] per epoch
+        lo = np.searchsorted(flat_times, bins[edge_offsets[:-1]], side='left')
+        hi = np.searchsorted(flat_times, bins[edge_offsets[1:]-1], side='right')
+        counts = hi - lo
+        epoch_ids = np.repeat(np.arange(n_epochs), counts)
+        run_offsets = np.insert(np.cumsum(counts), 0, 0)[:-1]
+        spike_idx = np.arange(counts.sum()) - run_offsets[epoch_ids] + lo[epoch_ids]
+        times = flat_times[spike_idx]
+        units = flat_units[spike_idx]
+
+        # bin index within each epoch; the estimate from the bin width is
+        # corrected against the actual edges so that the assignment is
+        # exactly that of np.histogram
+        nb = n_bins[epoch_ids]
+        eoff = edge_offsets[:-1][epoch_ids]
+        local = np.floor((times - bins[eoff]) / ds).astype(int)
+        local = np.clip(local, 0, nb-1)
+        too_high = times < bins[eoff + local]
+        local[too_high] -= 1
+        too_low = (times >= bins[eoff + local + 1]) & (local < nb-1)
+        local[too_low] += 1
+        local = np.clip(local, 0, nb-1)
+
+        flat_bins = units*n_total + bin_offsets[:-1][epoch_ids] + local
+        data = np.bincount(flat_bins, minlength=n_units*n_total)
+        self._data = data.reshape((n_units, n_total))
+
+        self._bins = bins
+        self._bin_centers = centers
+        le = bin_offsets[:-1]
+        re = bin_offsets[1:] - 1
+        self._binnedSupport = np.vstack((le, re)).T
+        supportdata = np.vstack([bins[edge_offsets[:-1]],
+                                 bins[edge_offsets[1:]-1]]).T
         self._support = EpochArray(supportdata) # set support to TRUE bin support
 
     def smooth(self, *, sigma=None, inplace=False,  bw=None):
@@ -1571,7 +1726,7 @@ class BinnedSpikeTrainArray(SpikeTrain):
         if w is None:
             w = 1
 
-        if not float(w).is_integer:
+        if not float(w).is_integer():
             raise ValueError("w has to be an integer!")
 
         w = int(w)
@@ -1607,42 +1762,47 @@ class BinnedSpikeTrainArray(SpikeTrain):
         if w == 1:
             return bst
 
-        edges = np.insert(np.cumsum(bst.lengths), 0, 0)
-        newlengths = [0]
-        binedges = np.insert(np.cumsum(bst.lengths+1), 0, 0)
-        n_events = bst.support.n_epochs
-        new_centers = []
-
-        newdata = None
-
-        for ii in range(n_events):
-            data = bst.data[:,edges[ii]:edges[ii+1]]
-            bins = bst.bins[binedges[ii]:binedges[ii+1]]
-
-            datalen = data.shape[1]
-            if w <= datalen:
-                rebinned, binidx = bst._rebin_array(data, w=w)
-                bins = bins[np.insert(binidx+1, 0, 0)]
-
-                newlengths.append(rebinned.shape[1])
+        # every epoch contributes lengths // w new bins; trailing bins
+        # that do not fill a whole new bin are dropped, and so are epochs
+        # that are shorter than w
+        lengths = bst.lengths
+        n_new = lengths // w
+        keep = np.flatnonzero(n_new > 0)
+        n_new = n_new[keep]
+        n_new_bins = n_new.sum()
 
-                if newdata is None:
-                    newdata = rebinned
-                    newbins = bins
-                    newcenters = bins[:-1] + np.diff(bins) / 2
-                    newsupport = np.array([bins[0], bins[-1]])
-                else:
-                    newdata = np.hstack((newdata, rebinned))
-                    newbins = np.hstack((newbins, bins))
-                    newcenters = np.hstack((newcenters, bins[:-1] + np.diff(bins) / 2))
-                    newsupport = np.vstack((newsupport, np.array([bins[0], bins[-1]])))
-            else:
-                pass
-
-        # assemble new binned spike train array:
-        newedges = np.cumsum(newlengths)
         newbst = copy.copy(bst)
-        if newdata is not None:
+        if n_new_bins > 0:
+            bin_offsets = np.insert(np.cumsum(lengths), 0, 0)[keep]
+            edge_offsets = np.insert(np.cumsum(lengths + 1), 0, 0)[keep]
+            newedges = np.insert(np.cumsum(n_new), 0, 0)
+
+            # index of every new bin within its epoch
+            epoch_idx = np.repeat(np.arange(len(keep)), n_new)
+            jj = np.arange(n_new_bins) - newedges[epoch_idx]
+
+            # sum each group of w bins with a single reduceat; the group
+            # boundaries are interleaved with their ends, so that the
+            # dropped bins between epochs end up in the odd columns
+            group_starts = bin_offsets[epoch_idx] + jj*w
+            boundaries = np.empty(2*n_new_bins, dtype=int)
+            boundaries[0::2] = group_starts
+            boundaries[1::2] = group_starts + w
+            if boundaries[-1] == bst.data.shape[1]:
+                boundaries = boundaries[:-1]
+            newdata = np.add.reduceat(bst.data, boundaries, axis=1)[:,0::2]
+
+            # keep every w-th bin edge, including the last edge of each epoch
+            edge_epoch_idx = np.repeat(np.arange(len(keep)), n_new + 1)
+            kk = np.arange(n_new_bins + len(keep)) - (newedges + np.arange(len(keep)+1))[edge_epoch_idx]
+            newbins = bst.bins[edge_offsets[edge_epoch_idx] + kk*w]
+
+            left = bst.bins[edge_offsets[epoch_idx] + jj*w]
+            right = bst.bins[edge_offsets[epoch_idx] + (jj+1)*w]
+            newcenters = left + (right - left) / 2
+            newsupport = np.vstack((bst.bins[edge_offsets],
+                                    bst.bins[edge_offsets + n_new*w])).T
+
             newbst._data = newdata
             newbst._support = EpochArray(newsupport)
             newbst._bins = newbins
@@ -1650,7 +1810,7 @@ class BinnedSpikeTrainArray(SpikeTrain):
             newbst._ds = bst.ds*w
             newbst._binnedSupport = np.array((newedges[:-1], newedges[1:]-1)).T
         else:
-            warnings.warn("No events are long enough to contain any bins of width {}".format(PrettyDuration(ds)))
+            warnings.warn("No events are long enough to contain any bins of width {}".format(PrettyDuration(bst.ds*w)))
             newbst._data = None
             newbst._support = None
             newbst._binnedSupport = None
@@ -2,14 +2,22 @@
 
 __all__ = ['decode1D',
            'decode2D',
+           'StreamingDecoder',
            'k_fold_cross_validation',
+           'decoding_errors_using_xval',
            'cumulative_dist_decoding_error_using_xval',
            'cumulative_dist_decoding_error',
            'get_mode_pth_from_array',
            'get_mean_pth_from_array']
 
+import os
+import numbers
 import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from . import auxiliary
+from .auxiliary._tuningcurve import _extern_cache
 
 def get_mode_pth_from_array(posterior, tuningcurve=None):
     """If tuningcurve is provided, then we map it back to the external coordinates / units.
@@ -58,10 +66,138 @@ def get_mean_pth_from_array(posterior, tuningcurve=None):
 
     return mean_pth
 
-def decode1D(bst, ratemap, xmin=0, xmax=100, w=1, nospk_prior=None, _skip_empty_bins=True):
+def _window_bounds(lengths, w):
+    """Return the bin bounds of sliding windows of w bins, for all epochs.
+
+    Windows never straddle epoch boundaries. An epoch with fewer than w
+    bins contributes a single (partial) window containing all of its
+    bins.
+
+    Parameters
+    ----------
+    lengths : array_like
+        Number of bins in each epoch, with shape (n_epochs,).
+    w : int
+        Number of bins per window.
+
+    Returns
+    -------
+    left : array
+        Index of the first bin of each window, with shape (n_windows,).
+    right : array
+        Index one past the last bin of each window, with shape (n_windows,).
+    posterior_lengths : array
+        Number of windows in each epoch, with shape (n_epochs,).
+    """
+    lengths = np.atleast_1d(np.asarray(lengths, dtype=int))
+
+    posterior_lengths = np.maximum(1, lengths - w + 1)
+    cum_posterior_lengths = np.insert(np.cumsum(posterior_lengths), 0, 0)
+    bin_offsets = np.insert(np.cumsum(lengths), 0, 0)[:-1]
+
+    epoch_idx = np.repeat(np.arange(len(lengths)), posterior_lengths)
+    tt = np.arange(cum_posterior_lengths[-1]) - cum_posterior_lengths[epoch_idx]
+    left = bin_offsets[epoch_idx] + tt
+    right = bin_offsets[epoch_idx] + np.minimum(tt + w, lengths[epoch_idx])
+
+    return left, right, posterior_lengths
+
+def _windowed_observations(data, left, right):
+    """Return spike counts in the windows [left, right) of binned data.
+
+    Only the bins spanned by the windows are accumulated, so that a
+    chunk of windows can be evaluated without touching the rest of the
+    data.
+
+    Parameters
+    ----------
+    data : array_like
+        Binned spike counts with shape (n_units, n_bins).
+    left : array_like
+        Index of the first bin of each window, with shape (n_windows,).
+    right : array_like
+        Index one past the last bin of each window, with shape (n_windows,).
+
+    Returns
+    -------
+    obs : array
+        Spike counts in each window, with shape (n_units, n_windows).
+    """
+    n_units = data.shape[0]
+    if len(left) == 0:
+        return np.zeros((n_units, 0))
+    lo = left.min()
+    hi = right.max()
+
+    # cumulative spike counts, with a column of zeros prepended
+    datacum = np.hstack((np.zeros((n_units, 1)),
+                         np.cumsum(data[:, lo:hi], axis=1)))
+    obs = datacum[:, right - lo] - datacum[:, left - lo]
+
+    return obs
+
+def _get_chunk_size(n_tbins, bytes_per_tbin, memory_budget):
+    """Return the number of posterior bins to decode at a time.
+
+    If memory_budget is None, all bins are decoded at once.
+    """
+    if memory_budget is None:
+        return max(1, n_tbins)
+    if memory_budget <= 0:
+        raise ValueError("memory_budget must be positive")
+    return int(max(1, memory_budget // bytes_per_tbin))
+
+def _decode_posterior(obs, lfx, eterm, nospk_prior, _skip_empty_bins=True):
+    """Return the normalized posterior for a set of observation windows.
+
+    Parameters
+    ----------
+    obs : array_like
+        Spike counts with shape (n_units, n_windows).
+    lfx : array_like
+        Log of the ratemap, with shape (n_units, n_ext).
+    eterm : array_like
+        Exponential term -ratemap.sum(axis=0)*ds*w, with shape (n_ext,).
+    nospk_prior : array_like
+        Prior with shape (n_ext,) used for windows without any spikes.
+    _skip_empty_bins : bool, optional
+        If False, windows without spikes are decoded like any other.
+
+    Returns
+    -------
+    posterior : array
+        Posterior distribution with shape (n_ext, n_windows).
+    """
+    posterior = np.dot(lfx.T, obs)
+    posterior += eterm[:, np.newaxis]
+
+    if _skip_empty_bins:
+        # no spikes to decode in these windows!
+        empty = obs.sum(axis=0) == 0
+        posterior[:, empty] = nospk_prior[:, np.newaxis]
+
+    # normalize posterior using the log-sum-exp trick, see
+    # http://timvieira.github.io/blog/post/2014/02/11/exp-normalize-trick/
+    posterior -= posterior.max(axis=0)
+    np.exp(posterior, out=posterior)
+    posterior /= posterior.sum(axis=0)
+
+    return posterior
+
+def decode1D(bst, ratemap, xmin=0, xmax=100, w=1, nospk_prior=None, _skip_empty_bins=True,
+             *, out=None, return_posterior=True, memory_budget=None):
     """Decodes binned spike trains using a ratemap with shape (n_units, n_ext)
 
-    TODO: complete docstring
+    All decoding windows, across all epochs, are decoded at once: the
+    windowed spike counts are collected in an observation matrix, and
+    the log posterior is obtained as a single matrix product with the
+    log ratemap, followed by a log-sum-exp normalization.
+
+    For long sessions, the posterior can be computed in chunks of time
+    bins whose intermediate arrays fit in memory_budget bytes, and either
+    be written into a caller-supplied (possibly memory-mapped) array, or
+    be discarded so that only mode_pth and mean_pth are returned.
+
     TODO: what if we have higher dimensional external correlates? This
     function assumes a 1D correlate. Even if we linearize a 2D
     environment, for example, then mean_pth decoding no longer works as
@@ -69,14 +205,17 @@ def decode1D(bst, ratemap, xmin=0, xmax=100, w=1, nospk_prior=None, _skip_empty_
 
     Parameters
     ----------
-    bst :
-    ratemap: array_like
+    bst : BinnedSpikeTrainArray
+    ratemap: array_like or TuningCurve1D
         Firing rate map with shape (n_units, n_ext), where n_ext is the
         number of external correlates, e.g., position bins. The rate map
         is in spks/second.
     xmin : float
+        Ignored if ratemap is a TuningCurve1D.
     xmax : float
+        Ignored if ratemap is a TuningCurve1D.
     w : int
+        Number of bins per decoding window.
     nospk_prior : array_like
         Prior distribution over external correlates with shape (n_ext,)
         that will be used if no spikes are observed in a decoding window
@@ -86,6 +225,18 @@ def decode1D(bst, ratemap, xmin=0, xmax=100, w=1, nospk_prior=None, _skip_empty_
     _skip_empty_bins is only used to return the posterior regardless of
     whether any spikes were observed, so that we can understand the spatial
     distribution in the absence of spikes, or at low firing rates.
+    out : array_like, optional
+        Array with shape (n_ext, n_posterior_bins) into which the
+        posterior is written, e.g., a np.memmap. If given, it is
+        returned in place of the posterior.
+    return_posterior : bool, optional
+        If False (and out is None), the posterior is not kept, and None
+        is returned in its place. Default is True.
+    memory_budget : int, optional
+        Approximate number of bytes that the intermediate arrays of each
+        chunk of time bins may use. Default is to decode all time bins
+        at once, unless out is given or return_posterior is False, in
+        which case the default is 256 MB.
 
     Returns
     -------
@@ -94,25 +245,22 @@ def decode1D(bst, ratemap, xmin=0, xmax=100, w=1, nospk_prior=None, _skip_empty_
         where n_posterior bins <= bst.n_bins, but depends on w and the
         event lengths.
     cum_posterior_lengths : array
-
+        Cumulative number of posterior bins per epoch, with a leading 0.
     mode_pth :
-
+        Mode of the posterior in each posterior bin.
     mean_pth :
-
-    Examples
-    --------
-
+        Mean of the posterior in each posterior bin.
     """
 
     if w is None:
         w=1
     assert float(w).is_integer(), "w must be a positive integer!"
     assert w > 0, "w must be a positive integer!"
-
-    n_units, t_bins = bst.data.shape
+    w = int(w)
 
     # if we pass a TuningCurve1D object, extract the ratemap and re-order
     # units if necessary
+    bin_centers = None
     if isinstance(ratemap, auxiliary.TuningCurve1D):
         xmin = ratemap.bins[0]
         xmax = ratemap.bins[-1]
@@ -123,9 +271,13 @@ def decode1D(bst, ratemap, xmin=0, xmax=100, w=1, nospk_prior=None, _skip_empty_
 
     _, n_xbins = ratemap.shape
 
+    if bin_centers is None:
+        bins = np.linspace(xmin, xmax, n_xbins + 1)
+        bin_centers = bins[:-1] + (bins[1] - bins[0]) / 2
+
     if nospk_prior is None:
         nospk_prior = np.full(n_xbins, np.nan)
-    elif isinstance(nospk_priors, numbers.Number):
+    elif isinstance(nospk_prior, numbers.Number):
         nospk_prior = np.full(n_xbins, 1.0)
 
     assert nospk_prior.shape[0] == n_xbins, "prior must have length {}".format(n_xbins)
@@ -135,67 +287,65 @@ def decode1D(bst, ratemap, xmin=0, xmax=100, w=1, nospk_prior=None, _skip_empty_
 
     eterm = -ratemap.sum(axis=0)*bst.ds*w
 
-    # if we decode using multiple bins at a time (w>1) then we have to decode each epoch separately:
-
-    # first, we determine the number of bins we will decode. This requires us to scan over the epochs
-    n_bins = 0
-    cumlengths = np.cumsum(bst.lengths)
-    posterior_lengths = np.zeros(bst.n_epochs, dtype=np.int)
-    prev_idx = 0
-    for ii, to_idx in enumerate(cumlengths):
-        datalen = to_idx - prev_idx
-        prev_idx = to_idx
-        posterior_lengths[ii] = np.max((1,datalen - w + 1))
-
-    n_bins = posterior_lengths.sum()
-    posterior = np.zeros((n_xbins, n_bins))
-
-    # next, we decode each epoch separately, one bin at a time
+    # if we decode using multiple bins at a time (w>1) then windows are
+    # taken within each epoch separately; an epoch shorter than w is
+    # decoded as a single window, ignoring the scaling problem where the
+    # window size is now possibly less than bst.ds*w
+    left, right, posterior_lengths = _window_bounds(bst.lengths, w)
     cum_posterior_lengths = np.insert(np.cumsum(posterior_lengths),0,0)
-    prev_idx = 0
-    for ii, to_idx in enumerate(cumlengths):
-        data = bst.data[:,prev_idx:to_idx]
-        prev_idx = to_idx
-        datacum = np.cumsum(data, axis=1) # ii'th data segment, with column of zeros prepended
-        datacum = np.hstack((np.zeros((n_units,1)), datacum))
-        re = w # right edge ptr
-        # TODO: check if datalen < w and act appropriately
-        if posterior_lengths[ii] > 1: # more than one full window fits into data length
-            for tt in range(posterior_lengths[ii]):
-                obs = datacum[:, re] - datacum[:, re-w] # spikes in window of size w
-                re+=1
-                post_idx = cum_posterior_lengths[ii] + tt
-                if obs.sum() == 0 and _skip_empty_bins:
-                    # no spikes to decode in window!
-                    posterior[:,post_idx] = nospk_prior
-                else:
-                    posterior[:,post_idx] = (np.tile(np.array(obs, ndmin=2).T, n_xbins) * lfx).sum(axis=0) + eterm
-        else: # only one window can fit in, and perhaps only partially. We just take all the data we can get,
-              # and ignore the scaling problem where the window size is now possibly less than bst.ds*w
-            post_idx = cum_posterior_lengths[ii]
-            obs = datacum[:, -1] # spikes in window of size at most w
-            if obs.sum() == 0 and _skip_empty_bins:
-                # no spikes to decode in window!
-                posterior[:,post_idx] = nospk_prior
-            else:
-                posterior[:,post_idx] = (np.tile(np.array(obs, ndmin=2).T, n_xbins) * lfx).sum(axis=0) + eterm
-
-    # normalize posterior:
-    posterior = np.exp(posterior) / np.tile(np.exp(posterior).sum(axis=0),(n_xbins,1))
-
-    # TODO: what was my rationale behid the following? Why not use bin centers?
-    # _, bins = np.histogram([], bins=n_xbins, range=(xmin,xmax))
-    # xbins = (bins + xmax/n_xbins)[:-1]
+    n_tbins = cum_posterior_lengths[-1]
+
+    if out is not None:
+        if out.shape != (n_xbins, n_tbins):
+            raise ValueError("out must have shape {}".format((n_xbins, n_tbins)))
+        posterior = out
+    elif return_posterior and memory_budget is None:
+        posterior = None # decoded in a single chunk below
+    elif return_posterior:
+        posterior = np.zeros((n_xbins, n_tbins))
+    else:
+        posterior = None
+
+    if memory_budget is None and (out is not None or not return_posterior):
+        memory_budget = 2**28
+    n_units = ratemap.shape[0]
+    chunksize = _get_chunk_size(n_tbins, 8*(2*n_units + 2*n_xbins), memory_budget)
+
+    mode_pth = np.zeros(n_tbins)
+    mean_pth = np.zeros(n_tbins)
+    data = bst.data
+    for start in range(0, n_tbins, chunksize):
+        chunk = slice(start, start + chunksize)
+        obs = _windowed_observations(data, left[chunk], right[chunk])
+        posterior_ = _decode_posterior(obs, lfx, eterm, nospk_prior,
+                                       _skip_empty_bins=_skip_empty_bins)
+
+        # TODO: what was my rationale behid the following? Why not use bin centers?
+        # _, bins = np.histogram([], bins=n_xbins, range=(xmin,xmax))
+        # xbins = (bins + xmax/n_xbins)[:-1]
+
+        mode_ = np.argmax(posterior_, axis=0)*xmax/n_xbins
+        mode_pth[chunk] = np.where(np.isnan(posterior_.sum(axis=0)), np.nan, mode_)
+        mean_pth[chunk] = (bin_centers * posterior_.T).sum(axis=1)
+
+        if posterior is not None:
+            posterior[:, chunk] = posterior_
+        elif return_posterior:
+            posterior = posterior_
+
+    if posterior is None and return_posterior:
+        posterior = np.zeros((n_xbins, n_tbins))
 
-    mode_pth = np.argmax(posterior, axis=0)*xmax/n_xbins
-    mode_pth = np.where(np.isnan(posterior.sum(axis=0)), np.nan, mode_pth)
-    mean_pth = (bin_centers * posterior.T).sum(axis=1)
     return posterior, cum_posterior_lengths, mode_pth, mean_pth
 
-def decode2D(bst, ratemap, xmin=0, xmax=100, ymin=0, ymax=100, w=1, nospk_prior=None, _skip_empty_bins=True):
+def decode2D(bst, ratemap, xmin=0, xmax=100, ymin=0, ymax=100, w=1, nospk_prior=None, _skip_empty_bins=True,
+             *, out=None, return_posterior=True, memory_budget=None):
     """Decodes binned spike trains using a ratemap with shape (n_units, ext_nx, ext_ny)
 
-    TODO: complete docstring
+    All decoding windows are decoded at once, exactly as in decode1D,
+    after flattening the (ext_nx, ext_ny) spatial bins. Whole-session
+    posteriors can be decoded in memory-bounded chunks, as in decode1D.
+
     TODO: what if we have higher dimensional external correlates? This
     function assumes a 2D correlate. Even if we linearize a 2D
     environment, for example, then mean_pth decoding no longer works as
@@ -203,54 +353,62 @@ def decode2D(bst, ratemap, xmin=0, xmax=100, ymin=0, ymax=100, w=1, nospk_prior=
 
     Parameters
     ----------
-    bst :
-    ratemap: array_like
+    bst : BinnedSpikeTrainArray
+    ratemap: array_like or TuningCurve2D
         Firing rate map with shape (n_units, ext_nx, ext_ny), where n_ext is the
         number of external correlates, e.g., position bins. The rate map
         is in spks/second.
     xmin : float
+        Ignored if ratemap is a TuningCurve2D.
     xmax : float
+        Ignored if ratemap is a TuningCurve2D.
+    ymin : float
+        Ignored if ratemap is a TuningCurve2D.
+    ymax : float
+        Ignored if ratemap is a TuningCurve2D.
     w : int
+        Number of bins per decoding window.
     nospk_prior : array_like
-        Prior distribution over external correlates with shape (n_ext,)
-        that will be used if no spikes are observed in a decoding window
-        Default is np.nan.
+        Prior distribution over external correlates with shape
+        (ext_nx, ext_ny) that will be used if no spikes are observed in
+        a decoding window. Default is np.nan.
         If nospk_prior is any scalar, then a uniform prior is assumed.
 
     _skip_empty_bins is only used to return the posterior regardless of
     whether any spikes were observed, so that we can understand the spatial
     distribution in the absence of spikes, or at low firing rates.
+    out : array_like, optional
+        Array with shape (ext_ny, ext_nx, n_posterior_bins) into which
+        the posterior is written, e.g., a np.memmap. If given, it is
+        returned in place of the posterior.
+    return_posterior : bool, optional
+        If False (and out is None), the posterior is not kept, and None
+        is returned in its place. Default is True.
+    memory_budget : int, optional
+        Approximate number of bytes that the intermediate arrays of each
+        chunk of time bins may use. Default is to decode all time bins
+        at once, unless out is given or return_posterior is False, in
+        which case the default is 256 MB.
 
     Returns
     -------
     posteriors : array
-        Posterior distribution with shape (ext_nx, ext_ny, n_posterior_bins),
+        Posterior distribution with shape (ext_ny, ext_nx, n_posterior_bins),
         where n_posterior bins <= bst.n_tbins, but depends on w and the
         event lengths.
     cum_posterior_lengths : array
-
+        Cumulative number of posterior bins per epoch, with a leading 0.
     mode_pth :
-
+        Mode of the posterior, with shape (2, n_posterior_bins).
     mean_pth :
-
-    Examples
-    --------
-
+        Mean of the posterior, with shape (2, n_posterior_bins).
     """
 
-    def tile_obs(obs, nx, ny):
-        n_units = len(obs)
-        out = np.zeros((n_units, nx, ny))
-        for unit in range(n_units):
-            out[unit,:,:] = obs[unit]
-        return out
-
     if w is None:
         w=1
     assert float(w).is_integer(), "w must be a positive integer!"
     assert w > 0, "w must be a positive integer!"
-
-    n_units, t_bins = bst.data.shape
+    w = int(w)
 
     xbins = None
     ybins = None
@@ -266,11 +424,18 @@ def decode2D(bst, ratemap, xmin=0, xmax=100, ymin=0, ymax=100, w=1, nospk_prior=
         ratemap = ratemap.reorder_units_by_ids(bst.unit_ids)
         ratemap = ratemap.ratemap
 
-    _, n_xbins, n_ybins = ratemap.shape
+    n_units, n_xbins, n_ybins = ratemap.shape
+
+    if xbins is None:
+        xbins = np.linspace(xmin, xmax, n_xbins + 1)
+        xbin_centers = xbins[:-1] + (xbins[1] - xbins[0]) / 2
+    if ybins is None:
+        ybins = np.linspace(ymin, ymax, n_ybins + 1)
+        ybin_centers = ybins[:-1] + (ybins[1] - ybins[0]) / 2
 
     if nospk_prior is None:
         nospk_prior = np.full((n_xbins, n_ybins), np.nan)
-    elif isinstance(nospk_priors, numbers.Number):
+    elif isinstance(nospk_prior, numbers.Number):
         nospk_prior = np.full((n_xbins, n_ybins), 1.0)
 
     assert nospk_prior.shape == (n_xbins, n_ybins), "prior must have shape ({}, {})".format(n_xbins, n_ybins)
@@ -279,84 +444,224 @@ def decode2D(bst, ratemap, xmin=0, xmax=100, ymin=0, ymax=100, w=1, nospk_prior=
 
     eterm = -ratemap.sum(axis=0)*bst.ds*w
 
-    # if we decode using multiple bins at a time (w>1) then we have to decode each epoch separately:
+    left, right, posterior_lengths = _window_bounds(bst.lengths, w)
+    cum_posterior_lengths = np.insert(np.cumsum(posterior_lengths),0,0)
+    n_tbins = cum_posterior_lengths[-1]
+
+    if out is not None:
+        if out.shape != (n_ybins, n_xbins, n_tbins):
+            raise ValueError("out must have shape {}".format((n_ybins, n_xbins, n_tbins)))
+        posterior = out
+    elif return_posterior and memory_budget is None:
+        posterior = None # decoded in a single chunk below
+    elif return_posterior:
+        posterior = np.zeros((n_ybins, n_xbins, n_tbins))
+    else:
+        posterior = None
 
-    # first, we determine the number of bins we will decode. This requires us to scan over the epochs
-    n_tbins = 0
-    cumlengths = np.cumsum(bst.lengths)
-    posterior_lengths = np.zeros(bst.n_epochs, dtype=np.int)
-    prev_idx = 0
-    for ii, to_idx in enumerate(cumlengths):
-        datalen = to_idx - prev_idx
-        prev_idx = to_idx
-        posterior_lengths[ii] = np.max((1,datalen - w + 1))
+    if memory_budget is None and (out is not None or not return_posterior):
+        memory_budget = 2**28
+    n_ext = n_xbins*n_ybins
+    chunksize = _get_chunk_size(n_tbins, 8*(2*n_units + 3*n_ext), memory_budget)
 
-    n_tbins = posterior_lengths.sum()
+    # decode over the flattened (n_xbins*n_ybins) spatial bins
+    lfx = lfx.reshape(n_units, n_ext)
+    eterm = eterm.ravel()
+    nospk_prior = nospk_prior.ravel()
 
-    ########################################################################
-    posterior = np.zeros((n_xbins, n_ybins, n_tbins))
+    mode_pth = np.zeros((2, n_tbins))
+    mean_pth = np.zeros((2, n_tbins))
+    data = bst.data
+    for start in range(0, n_tbins, chunksize):
+        chunk = slice(start, start + chunksize)
+        obs = _windowed_observations(data, left[chunk], right[chunk])
+        posterior_ = _decode_posterior(obs, lfx, eterm, nospk_prior,
+                                       _skip_empty_bins=_skip_empty_bins)
+
+        x_, y_ = np.unravel_index(np.argmax(posterior_, axis=0), (n_xbins, n_ybins))
+        mode_pth[0, chunk] = xbins[x_]
+        mode_pth[1, chunk] = ybins[y_]
+        mode_pth[:, chunk][:, np.isnan(posterior_).any(axis=0)] = np.nan
+
+        posterior_ = posterior_.reshape((n_xbins, n_ybins, -1))
+        mean_pth[0, chunk] = (xbin_centers * posterior_.sum(axis=1).T).sum(axis=1)
+        mean_pth[1, chunk] = (ybin_centers * posterior_.sum(axis=0).T).sum(axis=1)
+
+        posterior_ = np.transpose(posterior_, axes=[1,0,2])
+        if posterior is not None:
+            posterior[:, :, chunk] = posterior_
+        elif return_posterior:
+            posterior = posterior_
+
+    if posterior is None and return_posterior:
+        posterior = np.zeros((n_ybins, n_xbins, n_tbins))
 
-    # next, we decode each epoch separately, one bin at a time
-    cum_posterior_lengths = np.insert(np.cumsum(posterior_lengths),0,0)
-    prev_idx = 0
-    for ii, to_idx in enumerate(cumlengths):
-        data = bst.data[:,prev_idx:to_idx]
-        prev_idx = to_idx
-        datacum = np.cumsum(data, axis=1) # ii'th data segment, with column of zeros prepended
-        datacum = np.hstack((np.zeros((n_units,1)), datacum))
-        re = w # right edge ptr
-        # TODO: check if datalen < w and act appropriately
-        if posterior_lengths[ii] > 1: # more than one full window fits into data length
-            for tt in range(posterior_lengths[ii]):
-                obs = datacum[:, re] - datacum[:, re-w] # spikes in window of size w
-                re+=1
-                post_idx = cum_posterior_lengths[ii] + tt
-                if obs.sum() == 0 and _skip_empty_bins:
-                    # no spikes to decode in window!
-                    posterior[:,:,post_idx] = nospk_prior
-                else:
-                    posterior[:,:,post_idx] = (tile_obs(obs, n_xbins, n_ybins) * lfx).sum(axis=0) + eterm
-        else: # only one window can fit in, and perhaps only partially. We just take all the data we can get,
-              # and ignore the scaling problem where the window size is now possibly less than bst.ds*w
-            post_idx = cum_posterior_lengths[ii]
-            obs = datacum[:, -1] # spikes in window of size at most w
-            if obs.sum() == 0 and _skip_empty_bins:
-                # no spikes to decode in window!
-                posterior[:,:,post_idx] = nospk_prior
-            else:
-                posterior[:,:,post_idx] = (tile_obs(obs, n_xbins, n_ybins) * lfx).sum(axis=0) + eterm
-
-    # normalize posterior:
-    # see http://timvieira.github.io/blog/post/2014/02/11/exp-normalize-trick/
-    for tt in range(n_tbins):
-        posterior[:,:,tt] = posterior[:,:,tt] - posterior[:,:,tt].max()
-        posterior[:,:,tt] = np.exp(posterior[:,:,tt])
-        posterior[:,:,tt] = posterior[:,:,tt] / posterior[:,:,tt].sum()
-
-    # if xbins is None:
-    #     _, bins = np.histogram([], bins=n_xbins, range=(xmin,xmax))
-    #     xbins = (bins + xmax/n_xbins)[:-1]
-    # if ybins is None:
-    #     _, bins = np.histogram([], bins=n_ybins, range=(ymin,ymax))
-    #     ybins = (bins + ymax/n_ybins)[:-1]
+    return posterior, cum_posterior_lengths, mode_pth, mean_pth
 
-    mode_pth = np.zeros((2, n_tbins))
-    for tt in range(n_tbins):
-        if np.any(np.isnan(posterior[:,:,tt])):
-            mode_pth[0,tt] = np.nan
-            mode_pth[0,tt] = np.nan
-        else:
-            x_, y_ = np.unravel_index(np.argmax(posterior[:,:,tt]), (n_xbins, n_ybins))
-            mode_pth[0,tt] = xbins[x_]
-            mode_pth[1,tt] = ybins[y_]
+class StreamingDecoder:
+    """Online Bayesian decoder of spike counts that arrive one bin at a time.
 
-    expected_x = (xbin_centers * posterior.sum(axis=1).T).sum(axis=1)
-    expected_y = (ybin_centers * posterior.sum(axis=0).T).sum(axis=1)
-    mean_pth = np.vstack((expected_x, expected_y))
+    The log ratemap and the exponential term are computed once, when the
+    decoder is built. Every call to update adds one bin of spike counts
+    to a ring buffer holding the last w bins, updates the running window
+    count, and decodes the window into a preallocated posterior, so that
+    the work per bin is a single (n_units, n_ext) product and nothing is
+    reallocated.
 
-    posterior = np.transpose(posterior, axes=[1,0,2])
+    The posterior of a window is the same as that computed by decode1D
+    (or decode2D) for the same window. Until w bins have been seen, the
+    window holds all the bins seen so far, and the exponential term is
+    scaled by the number of bins in it.
 
-    return posterior, cum_posterior_lengths, mode_pth, mean_pth
+    Parameters
+    ----------
+    ratemap : TuningCurve1D, TuningCurve2D or array_like
+        Firing rate map with shape (n_units, n_ext) or
+        (n_units, ext_nx, ext_ny), in spks/second.
+    ds : float
+        Bin size in seconds of the incoming spike counts.
+    w : int, optional
+        Number of bins per decoding window. Default is 1.
+    unit_ids : array_like, optional
+        Order of the units in the incoming spike counts. If given, and
+        ratemap is a tuning curve, its units are re-ordered to match.
+    nospk_prior : array_like or scalar, optional
+        Prior used if no spikes are in a decoding window, with the same
+        meaning as in decode1D. Default is np.nan.
+
+    Attributes
+    ----------
+    posterior : array
+        Posterior of the most recent window, with shape (n_ext,), or
+        (ext_ny, ext_nx) for 2D ratemaps. It is overwritten by the next
+        update.
+    n_bins : int
+        Number of bins decoded since the decoder was built or reset.
+    """
+
+    def __init__(self, ratemap, ds, w=1, *, unit_ids=None, nospk_prior=None,
+                 _skip_empty_bins=True):
+
+        if w is None:
+            w=1
+        assert float(w).is_integer(), "w must be a positive integer!"
+        assert w > 0, "w must be a positive integer!"
+        w = int(w)
+
+        if isinstance(ratemap, (auxiliary.TuningCurve1D, auxiliary.TuningCurve2D)):
+            if unit_ids is not None:
+                ratemap = ratemap.reorder_units_by_ids(unit_ids)
+            ratemap = ratemap.ratemap
+        ratemap = np.asarray(ratemap, dtype=float)
+
+        n_units = ratemap.shape[0]
+        self._ext_shape = ratemap.shape[1:]
+        n_ext = int(np.prod(self._ext_shape))
+        ratemap = ratemap.reshape(n_units, n_ext)
+
+        if nospk_prior is None:
+            nospk_prior = np.full(n_ext, np.nan)
+        elif isinstance(nospk_prior, numbers.Number):
+            nospk_prior = np.full(n_ext, 1.0)
+        nospk_prior = np.asarray(nospk_prior, dtype=float)
+        assert nospk_prior.size == n_ext, "prior must have {} elements".format(n_ext)
+
+        self._ds = ds
+        self._w = w
+        self._skip_empty_bins = _skip_empty_bins
+        self._lfx = np.log(ratemap)
+        # exponential term for windows of 1, 2, ..., w bins
+        self._eterm = -np.outer(np.arange(1, w + 1), ratemap.sum(axis=0)*ds)
+        self._nospk_prior = nospk_prior.ravel()
+
+        self._buffer = np.zeros((w, n_units))
+        self._window = np.zeros(n_units)
+        self._logposterior = np.zeros(n_ext)
+        self._posterior = np.full(n_ext, np.nan)
+        self.reset()
+
+    def __repr__(self):
+        address_str = " at " + str(hex(id(self)))
+        return "<StreamingDecoder%s: %d units, w=%d>" % (address_str, self.n_units, self.w)
+
+    def reset(self):
+        """Forget all the bins seen so far."""
+        self._buffer[:] = 0
+        self._window[:] = 0
+        self._posterior[:] = np.nan
+        self._head = 0
+        self._n_bins = 0
+
+    def update(self, counts, out=None):
+        """Add one bin of spike counts, and decode the current window.
+
+        Parameters
+        ----------
+        counts : array_like
+            Spike counts of each unit in the new bin, with shape
+            (n_units,).
+        out : array_like, optional
+            Array with the shape of posterior into which the posterior
+            is copied. If not given, the internal posterior is returned,
+            which is overwritten by the next update.
+
+        Returns
+        -------
+        posterior : array
+            Posterior of the window ending with the new bin.
+        """
+        # replace the oldest bin in the ring buffer
+        self._window -= self._buffer[self._head]
+        self._buffer[self._head] = counts
+        self._window += self._buffer[self._head]
+        self._head = (self._head + 1) % self._w
+        self._n_bins += 1
+
+        logposterior = self._logposterior
+        if self._skip_empty_bins and not self._window.any():
+            # no spikes to decode in this window!
+            logposterior[:] = self._nospk_prior
+        else:
+            np.dot(self._window, self._lfx, out=logposterior)
+            logposterior += self._eterm[min(self._n_bins, self._w) - 1]
+
+        # normalize posterior using the log-sum-exp trick
+        logposterior -= logposterior.max()
+        np.exp(logposterior, out=self._posterior)
+        self._posterior /= self._posterior.sum()
+
+        if out is not None:
+            out[...] = self.posterior
+            return out
+        return self.posterior
+
+    @property
+    def posterior(self):
+        """Posterior of the most recent window."""
+        if len(self._ext_shape) == 2:
+            # (ext_ny, ext_nx), as returned by decode2D
+            return self._posterior.reshape(self._ext_shape).T
+        return self._posterior
+
+    @property
+    def n_bins(self):
+        """Number of bins decoded since the decoder was built or reset."""
+        return self._n_bins
+
+    @property
+    def n_units(self):
+        """Number of units expected in each bin of spike counts."""
+        return self._lfx.shape[0]
+
+    @property
+    def w(self):
+        """Number of bins per decoding window."""
+        return self._w
+
+    @property
+    def ds(self):
+        """Bin size in seconds of the incoming spike counts."""
+        return self._ds
 
 def k_fold_cross_validation(X, k=None, randomize=False):
     """
@@ -408,7 +713,159 @@ def k_fold_cross_validation(X, k=None, randomize=False):
         validation = [x for i, x in enumerate(X) if i % k == _k_]
         yield training, validation
 
-def cumulative_dist_decoding_error_using_xval(bst, extern,*, decodefunc=decode1D, tuningcurve=None, k=5, transfunc=None, n_extern=100, extmin=0, extmax=100, sigma=3, n_bins=None):
+# state shared with the cross-validation worker processes; it is set
+# once per worker by _init_xval_worker, so that the bst is only pickled
+# once per worker, and not once per fold
+_xval_shared = None
+
+def _init_xval_worker(shared):
+    global _xval_shared
+    _xval_shared = shared
+
+def _xval_fold(training, validation, shared=None):
+    """Absolute decoding errors of a single cross-validation fold.
+
+    A TuningCurve1D is estimated from the training epochs, and used to
+    decode the validation epochs. The extern values and bin indices are
+    taken from shared, so that they are not recomputed for every fold.
+    """
+    if shared is None:
+        shared = _xval_shared
+    bst = shared['bst']
+    extern = shared['extern']
+    ext = shared['ext']
+    epoch_bin_idx = shared['epoch_bin_idx']
+
+    # estimate place fields using bst[training]
+    bst_training = bst[training]
+    idx = np.concatenate([epoch_bin_idx[ii] for ii in training])
+    _extern_cache.insert(extern, bst_training.bin_centers, ext[..., idx],
+                         bins=shared['bins'], bin_idx=shared['bin_idx'][idx])
+    tc = auxiliary.TuningCurve1D(bst=bst_training, extern=extern, **shared['tc_kwargs'])
+
+    # decode position using bst[validation]
+    bst_validation = bst[validation]
+    posterior, _, mode_pth, mean_pth = shared['decodefunc'](bst_validation, tc)
+
+    # calculate validation error (for current fold) by comparing
+    # decoded pos v target pos
+    if shared['transfunc'] is None:
+        idx = np.concatenate([epoch_bin_idx[ii] for ii in validation])
+        target = ext[..., idx]
+    else:
+        target = shared['transfunc'](extern, at=bst_validation.bin_centers)
+
+    return np.abs(target - mean_pth)
+
+def decoding_errors_using_xval(bst, extern, *, decodefunc=decode1D, k=5,
+                               transfunc=None, n_extern=100, extmin=0,
+                               extmax=100, sigma=3, n_jobs=1,
+                               backend='process'):
+    """Decoding errors of every fold of a k-fold cross-validation over
+    the epochs in a BinnedSpikeTrainArray, possibly in parallel.
+
+    The extern is evaluated at all of the bins, and these are assigned to
+    tuning curve bins, only once; every fold then works on its own subset.
+    The results are identical regardless of n_jobs or backend.
+
+    Parameters
+    ----------
+    bst: BinnedSpikeTrainArray
+        BinnedSpikeTrainArray containing all the epochs to be decoded.
+    extern : query-able object of external correlates (e.g. pos AnalogSignalArray)
+    decodefunc : callable, optional
+        Decoding function, called as decodefunc(bst, tuningcurve). Default
+        is decode1D.
+    k : int, optional
+        Number of fold for k-fold cross-validation. Default is k=5.
+    transfunc : callable, optional
+        Function with signature transfunc(extern, at) returning the target
+        values for the validation bins. Default evaluates extern at the
+        bin centers.
+    n_extern, extmin, extmax, sigma : optional
+        Passed on to TuningCurve1D.
+    n_jobs : int, optional
+        Number of workers. If n_jobs < 0, os.cpu_count() workers are
+        used. Default is 1 (no parallelism).
+    backend : str, optional
+        Either 'process' (default) or 'thread'. With the 'process' backend,
+        bst, extern, decodefunc and transfunc must be picklable.
+
+    Returns
+    -------
+    fold_errors : list of np.array
+        Absolute decoding error of every validation bin, with one array
+        per fold, in fold order.
+    """
+    at = bst.bin_centers
+    ext = _extern_cache.get(extern, at)
+    bins = np.linspace(extmin, extmax, n_extern+1)
+
+    shared = {'bst': bst,
+              'extern': extern,
+              'ext': ext,
+              'bins': bins,
+              'bin_idx': np.digitize(ext, bins, True),
+              'epoch_bin_idx': np.split(np.arange(len(at)),
+                                        np.cumsum(bst.lengths)[:-1]),
+              'decodefunc': decodefunc,
+              'transfunc': transfunc,
+              'tc_kwargs': {'n_extern': n_extern,
+                            'extmin': extmin,
+                            'extmax': extmax,
+                            'sigma': sigma}}
+
+    folds = list(k_fold_cross_validation(bst.n_epochs, k=k))
+
+    if n_jobs is None:
+        n_jobs = 1
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(folds))
+
+    if n_jobs <= 1:
+        return [_xval_fold(training, validation, shared)
+                for training, validation in folds]
+
+    if backend == 'process':
+        executor = ProcessPoolExecutor(max_workers=n_jobs,
+                                       initializer=_init_xval_worker,
+                                       initargs=(shared,))
+        extra_args = ()
+    elif backend == 'thread':
+        executor = ThreadPoolExecutor(max_workers=n_jobs)
+        extra_args = (shared,)
+    else:
+        raise ValueError("backend must be either 'process' or 'thread'")
+
+    with executor:
+        futures = [executor.submit(_xval_fold, training, validation, *extra_args)
+                   for training, validation in folds]
+        fold_errors = [future.result() for future in futures]
+
+    return fold_errors
+
+def _cumulative_error_distribution(errors, n_bins, max_error):
+    """Cumulative distribution of (absolute) decoding errors, starting at
+    (0,0) and ending at (max_error,1)."""
+    hist, bins = np.histogram(errors, bins=n_bins, range=(0, max_error))
+
+    # build cumulative error distribution
+    cumhist = np.cumsum(hist)
+    cumhist = cumhist / cumhist[-1]
+    bincenters = (bins + (bins[1] - bins[0])/2)[:-1]
+
+    # modify to start at (0,0):
+    cumhist = np.insert(cumhist, 0, 0)
+    bincenters = np.insert(bincenters, 0, 0)
+
+    # modify to end at (max_error,1):
+    cumhist = np.append(cumhist, 1)
+    bincenters = np.append(bincenters, max_error)
+
+    return cumhist, bincenters
+
+def cumulative_dist_decoding_error_using_xval(bst, extern,*, decodefunc=decode1D, tuningcurve=None, k=5, transfunc=None, n_extern=100, extmin=0, extmax=100, sigma=3, n_bins=None, n_jobs=1, backend='process', return_fold_errors=False):
     """Cumulative distribution of decoding errors during epochs in
     BinnedSpikeTrainArray, evaluated using a k-fold cross-validation
     procedure.
@@ -429,6 +886,14 @@ def cumulative_dist_decoding_error_using_xval(bst, extern,*, decodefunc=decode1D
     n_bins : int
         Number of decoding error bins, ranging from tuningcurve.extmin
         to tuningcurve.extmax.
+    n_jobs : int, optional
+        Number of workers over which the folds are spread. Default is 1.
+        See decoding_errors_using_xval.
+    backend : str, optional
+        Either 'process' (default) or 'thread'.
+    return_fold_errors : bool, optional
+        If True, also return the decoding errors of every fold. Default
+        is False.
 
     Returns
     -------
@@ -436,55 +901,35 @@ def cumulative_dist_decoding_error_using_xval(bst, extern,*, decodefunc=decode1D
     (error, cum_prob)
         (see Fig 3.(b) of "Analysis of Hippocampal Memory Replay Using
         Neural Population Decoding", Fabian Kloosterman, 2012)
+    fold_errors : list of np.array, optional
+        Absolute decoding error of every validation bin, with one array
+        per fold. Only returned if return_fold_errors is True.
 
     NOTE: should we allow for an optional tuning curve to be specified,
           or should we always recompute it ourselves?
     """
 
-    def _trans_func(extern, at):
-        """Default transform function to map extern into numerical bins"""
-
-        _, ext = extern.asarray(at=at)
-
-        return ext
-
-    if transfunc is None:
-        transfunc = _trans_func
-
     if n_bins is None:
         n_bins = 200
 
     max_error = extmax - extmin
 
-    # indices of training and validation epochs / events
-
-    n_bins = n_bins # number of bins for error histogram
-    hist = np.zeros(n_bins)
-    for training, validation in k_fold_cross_validation(bst.n_epochs, k=k):
-        # estimate place fields using bst[training]
-        tc = auxiliary.TuningCurve1D(bst=bst[training], extern=extern, n_extern=n_extern, extmin=extmin, extmax=extmax, sigma=sigma)
-        # decode position using bst[validation]
-        posterior, _, mode_pth, mean_pth = decodefunc(bst[validation], tc)
-        # calculate validation error (for current fold) by comapring
-        # decoded pos v target pos
-        target = transfunc(extern, at=bst[validation].bin_centers)
-
-        histnew, bins = np.histogram(np.abs(target - mean_pth), bins=n_bins, range=(0, max_error))
-        hist = hist + histnew
-
-    # build cumulative error distribution
-    cumhist = np.cumsum(hist)
-    cumhist = cumhist / cumhist[-1]
-    bincenters = (bins + (bins[1] - bins[0])/2)[:-1]
-
-    # modify to start at (0,0):
-    cumhist = np.insert(cumhist, 0, 0)
-    bincenters = np.insert(bincenters, 0, 0)
-
-    # modify to end at (max_error,1):
-    cumhist = np.append(cumhist, 1)
-    bincenters = np.append(bincenters, max_error)
-
+    fold_errors = decoding_errors_using_xval(bst, extern,
+                                             decodefunc=decodefunc,
+                                             k=k,
+                                             transfunc=transfunc,
+                                             n_extern=n_extern,
+                                             extmin=extmin,
+                                             extmax=extmax,
+                                             sigma=sigma,
+                                             n_jobs=n_jobs,
+                                             backend=backend)
+
+    cumhist, bincenters = _cumulative_error_distribution(
+        np.concatenate(fold_errors), n_bins, max_error)
+
+    if return_fold_errors:
+        return cumhist, bincenters, fold_errors
     return cumhist, bincenters
 
 def cumulative_dist_decoding_error(bst, *, tuningcurve, extern,
@@ -517,7 +962,7 @@ def cumulative_dist_decoding_error(bst, *, tuningcurve, extern,
     def _trans_func(extern, at):
         """Default transform function to map extern into numerical bins"""
 
-        _, ext = extern.asarray(at=at)
+        ext = _extern_cache.get(extern, at)
 
         return ext
 
@@ -532,25 +977,9 @@ def cumulative_dist_decoding_error(bst, *, tuningcurve, extern,
 
     posterior, _, mode_pth, mean_pth = decodefunc(bst=bst, ratemap=tuningcurve)
     target = transfunc(extern, at=bst.bin_centers)
-    hist, bins = np.histogram(
-        np.abs(target - mean_pth),
-        bins=n_bins,
-        range=(0, max_error))
-
-    # build cumulative error distribution
-    cumhist = np.cumsum(hist)
-    cumhist = cumhist / cumhist[-1]
-    bincenters = (bins + (bins[1] - bins[0])/2)[:-1]
-
-    # modify to start at (0,0):
-    cumhist = np.insert(cumhist, 0, 0)
-    bincenters = np.insert(bincenters, 0, 0)
 
-    # modify to end at (max_error,1):
-    cumhist = np.append(cumhist, 1)
-    bincenters = np.append(bincenters, max_error)
-
-    return cumhist, bincenters
+    return _cumulative_error_distribution(np.abs(target - mean_pth),
+                                          n_bins, max_error)
 
 def rmse(predictions, targets):
     """Calculate the root mean squared error of an array of predictions.
@@ -10,15 +10,84 @@ with hmmlearn.
 # see https://github.com/ckemere/hmmlearn
 from hmmlearn.hmm import PoissonHMM as PHMM
 from .core import BinnedSpikeTrainArray # may have to be from . import core, and then core.BinnedSpikeTrainArray
+from .decoding import _window_bounds, _windowed_observations
 from .utils import swap_cols, swap_rows
 from warnings import warn
 import numpy as np
+from scipy.special import gammaln
 from pandas import unique
 from . import plotting
 from matplotlib.pyplot import subplots
 import copy
 
-__all__ = ['PoissonHMM']
+__all__ = ['PoissonHMM',
+           'StreamingHMMFilter']
+
+def _cumulative_forward_logprob(framelogprob, startprob, transmat, lengths=None):
+    """Log likelihood of every prefix of every sequence, from one forward pass.
+
+    The forward variables are rescaled to sum to one in every bin, so
+    that the log likelihood of the first t bins of a sequence is the sum
+    of the logs of its first t scaling coefficients. All sequences are
+    advanced together, one bin at a time.
+
+    Parameters
+    ----------
+    framelogprob : array, shape (n_samples, n_components)
+        Log likelihood of each sample under each state.
+    startprob : array, shape (n_components, )
+    transmat : array, shape (n_components, n_components)
+    lengths : array-like of integers, shape (n_sequences, ), optional
+        Lengths of the individual sequences in framelogprob. Default is
+        a single sequence.
+
+    Returns
+    -------
+    cumlogprob : array, shape (n_samples, )
+        Log likelihood of each sample and all the samples preceding it
+        in its sequence.
+    """
+    n_samples = framelogprob.shape[0]
+    if lengths is None:
+        lengths = [n_samples]
+    lengths = np.asarray(lengths, dtype=int)
+    starts = np.insert(np.cumsum(lengths), 0, 0)[:-1]
+    cumlogprob = np.full(n_samples, -np.inf)
+    if n_samples == 0:
+        return cumlogprob
+
+    # rescale each frame by its max, to avoid underflow in exp
+    framemax = framelogprob.max(axis=1, keepdims=True)
+    frameprob = np.exp(framelogprob - framemax)
+    framemax = framemax.ravel()
+
+    n_sequences = len(lengths)
+    logprob = np.zeros(n_sequences)
+    alpha = np.tile(startprob, (n_sequences, 1))
+    alive = np.ones(n_sequences, dtype=bool)
+    for tt in range(lengths.max()):
+        alive &= lengths > tt
+        seqs = np.flatnonzero(alive)
+        if len(seqs) == 0:
+            break
+        idx = starts[seqs] + tt
+        if tt > 0:
+            alpha[seqs] = np.dot(alpha[seqs], transmat)
+        alpha[seqs] *= frameprob[idx]
+        scale = alpha[seqs].sum(axis=1)
+        # sequences that are impossible from here on are dropped
+        possible = scale > 0
+        seqs, idx, scale = seqs[possible], idx[possible], scale[possible]
+        alive[:] = False
+        alive[seqs] = True
+        alpha[seqs] /= scale[:, np.newaxis]
+        logprob[seqs] += np.log(scale) + framemax[idx]
+        cumlogprob[idx] = logprob[seqs]
+    return cumlogprob
+
+def _split_by_lengths(arr, lengths, axis=0):
+    """Split arr into views, one per sequence."""
+    return np.split(arr, np.cumsum(lengths)[:-1], axis=axis)
 
 class PoissonHMM(PHMM):
     """Nelpy extension of PoissonHMM: Hidden Markov Model with
@@ -348,7 +417,8 @@ class PoissonHMM(PHMM):
         Returns
         -------
         unwrapped : new data array of shape (n_sliding_bins, n_units)
-        lengths : array of shape (n_sliding_bins,)
+        lengths : array of shape (n_epochs,)
+            Number of sliding bins in each epoch.
         """
 
         if w is None:
@@ -367,46 +437,12 @@ class PoissonHMM(PHMM):
         if w == 1:
             return bst.data.T, bst.lengths
 
-        n_units, t_bins = bst.data.shape
-
-        # if we decode using multiple bins at a time (w>1) then we have to decode each epoch separately:
-
-        # first, we determine the number of bins we will decode. This requires us to scan over the epochs
-        n_bins = 0
-        cumlengths = np.cumsum(bst.lengths)
-        lengths = np.zeros(bst.n_epochs, dtype=np.int)
-        prev_idx = 0
-        for ii, to_idx in enumerate(cumlengths):
-            datalen = to_idx - prev_idx
-            prev_idx = to_idx
-            lengths[ii] = np.max((1,datalen - w + 1))
-
-        n_bins = lengths.sum()
-
-        unwrapped = np.zeros((n_units, n_bins))
-
-        # next, we decode each epoch separately, one bin at a time
-        cum_lengths = np.insert(np.cumsum(lengths),0,0)
-
-        prev_idx = 0
-        for ii, to_idx in enumerate(cumlengths):
-            data = bst.data[:,prev_idx:to_idx]
-            prev_idx = to_idx
-            datacum = np.cumsum(data, axis=1) # ii'th data segment, with column of zeros prepended
-            datacum = np.hstack((np.zeros((n_units,1)), datacum))
-            re = w # right edge ptr
-            # TODO: check if datalen < w and act appropriately
-            if lengths[ii] > 1: # more than one full window fits into data length
-                for tt in range(lengths[ii]):
-                    obs = datacum[:, re] - datacum[:, re-w] # spikes in window of size w
-                    re+=1
-                    post_idx = lengths[ii] + tt
-                    unwrapped[:,post_idx] = obs
-            else: # only one window can fit in, and perhaps only partially. We just take all the data we can get,
-                # and ignore the scaling problem where the window size is now possibly less than bst.ds*w
-                post_idx = cum_lengths[ii]
-                obs = datacum[:, -1] # spikes in window of size at most w
-                unwrapped[:,post_idx] = obs
+        # all windows of all epochs at once; windows never straddle epoch
+        # boundaries, and an epoch shorter than w bins contributes a
+        # single window with all of its bins (ignoring the scaling
+        # problem that window is then shorter than bst.ds*w)
+        left, right, lengths = _window_bounds(bst.lengths, int(w))
+        unwrapped = _windowed_observations(bst.data, left, right)
 
         return unwrapped.T, lengths
 
@@ -454,17 +490,24 @@ class PoissonHMM(PHMM):
                 raise NotImplementedError ("sliding window decoding for feature matrices not yet implemented!")
             return self._decode(self, X=X, lengths=lengths), None
         else:
-            # we have a BinnedSpikeTrainArray
-            logprobs = []
-            state_sequences = []
-            centers = []
-            for seq in X:
-                windowed_arr, lengths = self._sliding_window_array(bst=seq, w=w)
-                logprob, state_sequence = self._decode(self, windowed_arr, lengths=lengths, algorithm=algorithm)
-                logprobs.append(logprob)
-                state_sequences.append(state_sequence)
-                centers.append(seq.centers)
-            return logprobs, state_sequences, centers
+            # we have a BinnedSpikeTrainArray; all events are decoded
+            # with a single call to the backend, and split afterwards
+            if X.isempty:
+                return [], [], []
+            windowed_arr, lengths = self._sliding_window_array(bst=X, w=w)
+            if algorithm is None:
+                algorithm = self.algorithm
+            if algorithm == 'viterbi':
+                _, state_sequence = self._decode(self, windowed_arr, lengths=lengths, algorithm=algorithm)
+                logprobs = self._path_logprob(windowed_arr, state_sequence, lengths)
+            else:
+                _, posteriors = self._score_samples(self, windowed_arr, lengths=lengths)
+                state_sequence = np.argmax(posteriors, axis=1)
+                starts = np.insert(np.cumsum(lengths), 0, 0)[:-1]
+                logprobs = np.add.reduceat(posteriors.max(axis=1), starts)
+            state_sequences = _split_by_lengths(state_sequence, lengths)
+            centers = _split_by_lengths(X.centers, X.lengths)
+            return list(logprobs), state_sequences, centers
 
     def predict_proba(self, X, lengths=None, w=None, returnLengths=False):
         """Compute the posterior probability for each state in the model.
@@ -590,15 +633,15 @@ class PoissonHMM(PHMM):
                 raise NotImplementedError ("sliding window decoding for feature matrices not yet implemented!")
             return self._score_samples(self, X, lengths=lengths)
         else:
-            # we have a BinnedSpikeTrainArray
-            logprobs = []
-            posteriors = []
-            for seq in X:
-                windowed_arr, lengths = self._sliding_window_array(bst=seq, w=w)
-                logprob, posterior = self._score_samples(self, X=windowed_arr, lengths=lengths)
-                logprobs.append(logprob)
-                posteriors.append(posterior.T)
-            return logprobs, posteriors
+            # we have a BinnedSpikeTrainArray; all events are scored
+            # with a single call to the backend, and split afterwards
+            if X.isempty:
+                return [], []
+            windowed_arr, lengths = self._sliding_window_array(bst=X, w=w)
+            _, posterior = self._score_samples(self, X=windowed_arr, lengths=lengths)
+            logprobs = self._sequence_logprob(windowed_arr, lengths)
+            posteriors = _split_by_lengths(posterior.T, lengths, axis=1)
+            return list(logprobs), posteriors
 
     def score(self, X, lengths=None, w=None):
         """Compute the log probability under the model.
@@ -633,32 +676,71 @@ class PoissonHMM(PHMM):
                 raise NotImplementedError ("sliding window decoding for feature matrices not yet implemented!")
             return self._score(self, X, lengths=lengths)
         else:
-            # we have a BinnedSpikeTrainArray
-            logprobs = []
-            for seq in X:
-                windowed_arr, lengths = self._sliding_window_array(bst=seq, w=w)
-                logprob = self._score(self, X=windowed_arr, lengths=lengths)
-                logprobs.append(logprob)
-        return logprobs
+            # we have a BinnedSpikeTrainArray; all events are scored in
+            # a single forward pass
+            if X.isempty:
+                return []
+            windowed_arr, lengths = self._sliding_window_array(bst=X, w=w)
+            return list(self._sequence_logprob(windowed_arr, lengths))
 
     def _cum_score_per_bin(self, X, lengths=None, w=None):
-        """Compute the log probability under the model, cumulatively for each bin per event."""
+        """Compute the log probability under the model, cumulatively for each bin per event.
+
+        A single scaled forward pass is made over each sequence, so that
+        the cost is linear in the sequence length.
+
+        Returns
+        -------
+        logprobs : array, shape (n_samples, )
+            Log likelihood of each bin and all the bins preceding it in
+            its sequence.
+        """
 
         if not isinstance(X, BinnedSpikeTrainArray):
             # assume we have a feature matrix
             if w is not None:
                 raise NotImplementedError ("sliding window decoding for feature matrices not yet implemented!")
-            return self._score(self, X, lengths=lengths)
+            X = np.asarray(X)
         else:
             # we have a BinnedSpikeTrainArray
-            logprobs = []
-            for seq in X:
-                windowed_arr, lengths = self._sliding_window_array(bst=seq, w=w)
-                n_bins, _ = windowed_arr.shape
-                for ii in range(1, n_bins+1):
-                    logprob = self._score(self, X=windowed_arr[:ii,:])
-                    logprobs.append(logprob)
-        return logprobs
+            if X.isempty:
+                return np.array([])
+            X, lengths = self._sliding_window_array(bst=X, w=w)
+
+        return _cumulative_forward_logprob(self._compute_log_likelihood(X),
+                                           self.startprob_,
+                                           self.transmat_,
+                                           lengths=lengths)
+
+    def _sequence_logprob(self, X, lengths=None):
+        """Log likelihood of each sequence in the feature matrix X."""
+        if lengths is None:
+            lengths = [len(X)]
+        cumlogprob = _cumulative_forward_logprob(self._compute_log_likelihood(X),
+                                                 self.startprob_,
+                                                 self.transmat_,
+                                                 lengths=lengths)
+        return cumlogprob[np.cumsum(lengths) - 1]
+
+    def _path_logprob(self, X, state_sequence, lengths=None):
+        """Log probability of each sequence in X jointly with its state path.
+
+        This is the log probability that hmmlearn's viterbi decoder
+        reports for each sequence.
+        """
+        if lengths is None:
+            lengths = [len(X)]
+        starts = np.insert(np.cumsum(lengths), 0, 0)[:-1]
+        framelogprob = self._compute_log_likelihood(X)
+        with np.errstate(divide='ignore'):
+            logstartprob = np.log(self.startprob_)
+            logtransmat = np.log(self.transmat_)
+        transitions = np.zeros(len(state_sequence))
+        transitions[1:] = logtransmat[state_sequence[:-1], state_sequence[1:]]
+        # the first bin of each sequence starts afresh
+        transitions[starts] = logstartprob[state_sequence[starts]]
+        terms = framelogprob[np.arange(len(state_sequence)), state_sequence]
+        return np.add.reduceat(terms + transitions, starts)
 
     def fit(self, X, lengths=None, w=None):
         """Estimate model parameters using nelpy objects.
@@ -977,6 +1059,147 @@ class PoissonHMM(PHMM):
 
         return fig, ax
 
+class StreamingHMMFilter:
+    """Online forward filter of a PoissonHMM, for spike counts that arrive
+    one bin at a time.
+
+    The (scaled) forward message alpha_t is kept between bins. Every
+    call to update advances it by one transition and one Poisson
+    emission, which costs O(n_components**2 + n_components*n_units) per
+    bin, and returns the filtered state posterior Pr(S_t | X_0, ..., X_t).
+    The running log likelihood log Pr(X_0, ..., X_t) is accumulated from
+    the scaling coefficients, and equals the cumulative score of the
+    whole sequence under the model.
+
+    The model parameters are copied when the filter is built, so that
+    later changes to the PoissonHMM do not affect it.
+
+    Parameters
+    ----------
+    hmm : PoissonHMM
+        Trained hidden Markov model.
+    unit_ids : array_like, optional
+        Order of the units in the incoming spike counts. Default is the
+        unit order of hmm.
+
+    Attributes
+    ----------
+    posterior : array, shape (n_components, )
+        Filtered state posterior after the most recent bin. It is
+        overwritten by the next update.
+    logprob : float
+        Log likelihood of all the bins seen so far.
+    n_bins : int
+        Number of bins seen since the filter was built or reset.
+    """
+
+    def __init__(self, hmm, unit_ids=None):
+        means = np.array(hmm.means_, dtype=float)
+        if unit_ids is not None and hmm.unit_ids is not None:
+            hmm_unit_ids = list(hmm.unit_ids)
+            try:
+                unit_idx = [hmm_unit_ids.index(unit_id) for unit_id in unit_ids]
+            except ValueError:
+                raise ValueError("unit_ids must all be units of the hmm!")
+            means = means[:, unit_idx]
+
+        with np.errstate(divide='ignore'):
+            self._logmeans = np.log(means)
+        self._summeans = means.sum(axis=1)
+        self._startprob = np.array(hmm.startprob_, dtype=float)
+        self._transmat = np.array(hmm.transmat_, dtype=float)
+
+        n_components = len(self._startprob)
+        self._framelogprob = np.zeros(n_components)
+        self._frameprob = np.zeros(n_components)
+        self._predicted = np.zeros(n_components)
+        self._alpha = np.zeros(n_components)
+        self.reset()
+
+    def __repr__(self):
+        address_str = " at " + str(hex(id(self)))
+        return "<StreamingHMMFilter%s: %d states, %d bins>" % (address_str, self.n_components, self.n_bins)
+
+    def reset(self):
+        """Forget all the bins seen so far."""
+        self._alpha[:] = np.nan
+        self._logprob = 0.0
+        self._n_bins = 0
+
+    def update(self, counts, out=None):
+        """Add one bin of spike counts, and advance the forward message.
+
+        Parameters
+        ----------
+        counts : array_like
+            Spike counts of each unit in the new bin, with shape
+            (n_units,).
+        out : array_like, optional
+            Array of shape (n_components,) into which the filtered
+            posterior is copied. If not given, the internal posterior is
+            returned, which is overwritten by the next update.
+
+        Returns
+        -------
+        posterior : array, shape (n_components, )
+            Filtered state posterior after the new bin.
+        """
+        counts = np.asarray(counts, dtype=float)
+
+        # Poisson log likelihood of the new bin under each state
+        framelogprob = self._framelogprob
+        # only units that spiked contribute count*log(rate); this avoids
+        # -inf*0 for states in which a silent unit has a rate of zero
+        spiked = counts > 0
+        np.dot(self._logmeans[:, spiked], counts[spiked], out=framelogprob)
+        framelogprob -= self._summeans
+        framelogprob -= gammaln(counts + 1).sum()
+        # rescale by the max, to avoid underflow in exp
+        framemax = framelogprob.max()
+        np.subtract(framelogprob, framemax, out=self._frameprob)
+        np.exp(self._frameprob, out=self._frameprob)
+
+        if self._n_bins == 0:
+            np.multiply(self._startprob, self._frameprob, out=self._alpha)
+        elif np.isfinite(self._logprob):
+            np.dot(self._alpha, self._transmat, out=self._predicted)
+            np.multiply(self._predicted, self._frameprob, out=self._alpha)
+        self._n_bins += 1
+
+        scale = self._alpha.sum()
+        if scale > 0:
+            self._alpha /= scale
+            self._logprob += np.log(scale) + framemax
+        else:
+            # the sequence is impossible under the model
+            self._alpha[:] = np.nan
+            self._logprob = -np.inf
+
+        if out is not None:
+            out[...] = self._alpha
+            return out
+        return self._alpha
+
+    @property
+    def posterior(self):
+        """Filtered state posterior after the most recent bin."""
+        return self._alpha
+
+    @property
+    def logprob(self):
+        """Log likelihood of all the bins seen so far."""
+        return self._logprob
+
+    @property
+    def n_bins(self):
+        """Number of bins seen since the filter was built or reset."""
+        return self._n_bins
+
+    @property
+    def n_components(self):
+        """Number of hidden states."""
+        return len(self._startprob)
+
 # def score_samples_ext(self, X, lengths=None):
 #         """Compute the log probability under the model and compute posteriors.
 
@@ -894,6 +894,10 @@ def gaussian_filter(obj, *, fs=None, sigma=None, bw=None, inplace=False):
     cum_lengths = np.insert(np.cumsum(out.lengths), 0, 0)
 
     if isinstance(out, core.AnalogSignalArray):
+        if inplace and out._ydata.base is not None:
+            # the data may be a view into another AnalogSignalArray (e.g.
+            # a single epoch of it), which must not be changed
+            out._ydata = out._ydata.copy()
         # now smooth each epoch separately
         for idx in range(asa.n_epochs):
             out._ydata[:,cum_lengths[idx]:cum_lengths[idx+1]] = scipy.ndimage.filters.gaussian_filter(asa._ydata[:,cum_lengths[idx]:cum_lengths[idx+1]], sigma=(0,sigma), truncate=bw)
@@ -1059,8 +1063,8 @@ def spiketrain_union(st1, st2):
     support = st1.support.join(st2.support)
 
     newdata = []
-    for unit in range(st1.n_units):
-        newdata.append(np.append(st1.time[unit], st2.time[unit]))
+    for unit_st1, unit_st2 in zip(st1.time, st2.time):
+        newdata.append(np.append(unit_st1, unit_st2))
 
     fs = None
     if st1.fs == st2.fs:
@@ -1180,8 +1184,9 @@ def collapse_time(obj, gap=0):
         duration = 0
         for st_ in obj:
             le = st_.support.start
+            st_time = st_._time
             for unit_ in range(obj.n_units):
-                new_time[unit_].extend(st_._time[unit_] - le + duration)
+                new_time[unit_].extend(st_time[unit_] - le + duration)
             duration += st_.support.duration
         new_time = np.asanyarray([np.asanyarray(unittime) for unittime in new_time])
         new_obj._time = new_time
@@ -1,4 +1,4 @@
-from nelpy.core import SpikeTrainArray
+from nelpy.core import SpikeTrainArray, EpochArray
 import numpy as np
 
 class TestSpikeTrainArrayEtienne:
@@ -68,3 +68,54 @@ class TestSpikeTrainArrayEtienne:
         sta = SpikeTrainArray([[1,2,3,5,10,11,12,15], [1,2,3,5,10,11,12,15]], fs=5)
         sta = sta.partition(n_epochs=5)
         assert np.allclose(np.array([[5, 15], [5, 15]]), sta.iloc[[1,4],:].time)
+
+    def test_17(self):
+        sta = SpikeTrainArray([[1, 1.5, 2, 2.2, 3, 5, 5.5], [0.5, 1, 2.9, 3]], fs=10,
+                              support=EpochArray([[1, 3], [5, 6.25]]))
+        bst = sta.bin(ds=0.5)
+        expected = np.array([[1, 1, 2, 0, 1, 1],
+                             [1, 0, 0, 1, 0, 0]])
+        assert np.array_equal(bst.data, expected)
+        assert np.array_equal(bst.binnedSupport, np.array([[0, 3], [4, 5]]))
+        assert np.allclose(bst.support.time, np.array([[1, 3], [5, 6]]))
+
+    def test_18(self):
+        sta = SpikeTrainArray([[3, 1, 2], [5], [], [4, 0.5]], fs=10)
+        assert np.array_equal(sta.n_spikes, np.array([3, 1, 0, 2]))
+        assert sta.issorted
+        assert np.allclose(sta.flatten().time, np.array([[0.5, 1, 2, 3, 4, 5]]))
+        assert np.shares_memory(sta.time[3], sta._spikes)
+        assert np.allclose(sta.iloc[:, [3, 0]].time[0], np.array([0.5, 4]))
+
+    def test_19(self):
+        sta = SpikeTrainArray([[1, 2, 3, 4, 5, 6], [2.5, 4, 7]], fs=10,
+                              support=EpochArray([[1, 2.5], [2, 4], [6, 7]]))
+        assert np.array_equal(sta.n_spikes, np.array([4, 1]))
+        assert np.allclose(sta.time[0], np.array([1, 2, 3, 6]))
+        assert np.allclose(sta.time[1], np.array([2.5]))
+
+    def test_20(self):
+        sta = SpikeTrainArray([[0.5, 1.5, 2.5, 6.5, 7.5], [0.5, 3.5, 5.5]], fs=10,
+                              support=EpochArray([[0, 5], [5, 6], [6, 9]]))
+        bst = sta.bin(ds=1)
+        rebinned = bst.rebin(w=2)
+        # trailing bins are dropped, as is the epoch shorter than w
+        assert np.array_equal(rebinned.data, np.array([[2, 1, 2], [1, 1, 0]]))
+        assert np.allclose(rebinned.bins, np.array([0, 2, 4, 6, 8]))
+        assert np.allclose(rebinned.bin_centers, np.array([1, 3, 7]))
+        assert np.allclose(rebinned.support.time, np.array([[0, 4], [6, 8]]))
+        assert np.array_equal(rebinned.lengths, np.array([2, 1]))
+        assert rebinned.ds == 2
+
+    def test_21(self):
+        sta = SpikeTrainArray([[1, 2, 3, 15, 25, 26, 31, 33]], fs=10,
+                              support=EpochArray([[0, 5], [10, 20], [24, 30], [31, 34]]))
+        bst = sta.bin(ds=1)
+        for idx, epochs in ((slice(1, None), [1, 2, 3]), (slice(None, None, 2), [0, 2])):
+            sliced = bst[idx]
+            parts = [bst[ii] for ii in epochs]
+            assert np.array_equal(sliced.data, np.hstack([part.data for part in parts]))
+            assert np.array_equal(sliced.bins, np.hstack([part.bins for part in parts]))
+            assert np.array_equal(sliced.bin_centers,
+                                  np.hstack([part.bin_centers for part in parts]))
+            assert np.array_equal(sliced.lengths, [part.n_bins for part in parts])
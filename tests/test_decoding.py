@@ -0,0 +1,128 @@
+import nelpy as nel
+from nelpy.core import *
+from nelpy.decoding import decode1D, decode2D, StreamingDecoder
+from nelpy.decoding import decoding_errors_using_xval, cumulative_dist_decoding_error_using_xval
+from nelpy.analysis import decoding_parameter_sweep
+import numpy as np
+import pytest
+
+def _bst():
+    sta = SpikeTrainArray([[0.1, 0.15, 0.32, 0.6, 1.25],
+                           [0.05, 0.33, 0.35, 0.61, 1.21, 1.4]],
+                          fs=100, support=EpochArray([[0, 0.8], [1.2, 1.5]]))
+    return sta.bin(ds=0.1)
+
+class TestDecoding:
+
+    def test_decode1D_matches_direct_evaluation(self):
+        bst = _bst()
+        ratemap = np.array([[1.0, 5.0, 2.0], [4.0, 1.0, 3.0]])
+        posterior, cum_lengths, _, _ = decode1D(bst, ratemap, xmin=0, xmax=3, w=2)
+        assert np.array_equal(cum_lengths, np.array([0, 7, 9]))
+        # first window spans the first two bins of the first epoch
+        obs = bst.data[:, :2].sum(axis=1)
+        logp = (obs[:, np.newaxis]*np.log(ratemap)).sum(axis=0) - ratemap.sum(axis=0)*bst.ds*2
+        expected = np.exp(logp) / np.exp(logp).sum()
+        assert np.allclose(posterior[:, 0], expected)
+        assert np.allclose(posterior.sum(axis=0), 1)
+
+    def test_decode1D_no_spikes_prior(self):
+        bst = _bst()
+        ratemap = np.array([[1.0, 5.0, 2.0], [4.0, 1.0, 3.0]])
+        posterior, _, mode_pth, _ = decode1D(bst, ratemap, xmin=0, xmax=3, w=1)
+        empty = bst.data.sum(axis=0) == 0
+        assert np.all(np.isnan(posterior[:, empty]))
+        assert np.all(np.isnan(mode_pth[empty]))
+
+    def test_decode2D_matches_decode1D(self):
+        bst = _bst()
+        ratemap = np.array([[[1.0, 5.0], [2.0, 0.5]], [[4.0, 1.0], [3.0, 2.0]]])
+        posterior2d, _, _, _ = decode2D(bst, ratemap, w=3)
+        posterior1d, _, _, _ = decode1D(bst, ratemap.reshape(2, 4), w=3)
+        posterior2d = np.transpose(posterior2d, axes=[1,0,2]).reshape(4, -1)
+        assert np.allclose(posterior2d, posterior1d, equal_nan=True)
+
+    def test_decode1D_chunked(self):
+        bst = _bst()
+        ratemap = np.array([[1.0, 5.0, 2.0], [4.0, 1.0, 3.0]])
+        posterior, _, mode_pth, mean_pth = decode1D(bst, ratemap, xmin=0, xmax=3, w=2)
+        out = np.zeros_like(posterior)
+        posterior_, _, mode_pth_, mean_pth_ = decode1D(bst, ratemap, xmin=0, xmax=3, w=2,
+                                                       out=out, memory_budget=100)
+        assert posterior_ is out
+        assert np.allclose(out, posterior, equal_nan=True)
+        assert np.allclose(mode_pth_, mode_pth, equal_nan=True)
+        summary = decode1D(bst, ratemap, xmin=0, xmax=3, w=2, return_posterior=False)
+        assert summary[0] is None
+        assert np.allclose(summary[3], mean_pth, equal_nan=True)
+
+    def test_streaming_decoder_matches_decode1D(self):
+        bst = _bst()
+        ratemap = np.array([[1.0, 5.0, 2.0], [4.0, 1.0, 3.0]])
+        posterior, cum_lengths, _, _ = decode1D(bst, ratemap, xmin=0, xmax=3, w=2)
+        decoder = StreamingDecoder(ratemap, ds=bst.ds, w=2)
+        data = bst.data[:, :bst.lengths[0]]
+        streamed = np.array([decoder.update(counts).copy() for counts in data.T]).T
+        # once the ring buffer is full, every bin completes a window
+        assert np.allclose(streamed[:, 1:], posterior[:, :cum_lengths[1]], equal_nan=True)
+        assert decoder.n_bins == bst.lengths[0]
+
+    def test_streaming_decoder_2D(self):
+        bst = _bst()
+        ratemap = np.array([[[1.0, 5.0], [2.0, 0.5]], [[4.0, 1.0], [3.0, 2.0]]])
+        posterior, _, _, _ = decode2D(bst, ratemap, w=1)
+        decoder = StreamingDecoder(ratemap, ds=bst.ds)
+        out = np.zeros((2, 2))
+        decoder.update(bst.data[:, 0], out=out)
+        assert np.allclose(out, posterior[:, :, 0])
+
+    def test_decoding_errors_using_xval(self):
+        rng = np.random.RandomState(0)
+        starts = np.arange(0, 60, 10.0)
+        sta = SpikeTrainArray([np.sort(rng.uniform(0, 60, 400)) for _ in range(5)],
+                              fs=1000, support=EpochArray(np.c_[starts, starts + 8]))
+        bst = sta.bin(ds=0.5)
+        t = np.linspace(0, 60, 601)
+        pos = AnalogSignalArray(50 + 40*np.sin(t/3), timestamps=t, fs=10)
+        fold_errors = decoding_errors_using_xval(bst, pos, k=3, n_extern=20)
+        assert len(fold_errors) == 3
+        assert sum(len(errors) for errors in fold_errors) == bst.n_bins
+        threaded = decoding_errors_using_xval(bst, pos, k=3, n_extern=20,
+                                              n_jobs=2, backend='thread')
+        for errors, errors_ in zip(fold_errors, threaded):
+            assert np.allclose(errors, errors_, equal_nan=True)
+        cumhist, bincenters, fold_errors_ = cumulative_dist_decoding_error_using_xval(
+            bst, pos, k=3, n_extern=20, return_fold_errors=True)
+        assert cumhist[0] == 0 and cumhist[-1] == 1
+        assert np.allclose(np.concatenate(fold_errors_), np.concatenate(fold_errors),
+                           equal_nan=True)
+
+    def test_decoding_parameter_sweep(self):
+        rng = np.random.RandomState(0)
+        starts = np.arange(0, 60, 10.0)
+        sta = SpikeTrainArray([np.sort(rng.uniform(0, 60, 400)) for _ in range(5)],
+                              fs=1000, support=EpochArray(np.c_[starts, starts + 8]))
+        t = np.linspace(0, 60, 601)
+        pos = AnalogSignalArray(50 + 40*np.sin(t/3), timestamps=t, fs=10)
+        table = decoding_parameter_sweep(sta, pos, ds=[0.25, 0.5], sigma=[0, 2],
+                                         n_extern=20, w=[1, 2], k=3)
+        assert len(table) == 8
+        assert np.array_equal(table.ds, [0.25]*4 + [0.5]*4)
+        assert np.array_equal(table.w, [1, 2]*4)
+        # coarser bins are derived by rebinning the finest binning
+        bst = sta.bin(ds=0.25).rebin(w=2)
+        errors = np.concatenate(decoding_errors_using_xval(bst, pos, k=3, n_extern=20,
+                                                           sigma=2))
+        errors = errors[~np.isnan(errors)]
+        row = table[(table.ds == 0.5) & (table.sigma == 2) & (table.w == 1)][0]
+        assert np.isclose(row.median_error, np.median(errors))
+        assert row.n_decoded == len(errors)
+        assert np.all(table.time > 0)
+        # memory is only traced on request, in an untimed pass
+        assert np.all(np.isnan(table.peak_memory))
+        table = decoding_parameter_sweep(sta, pos, ds=0.5, sigma=2, n_extern=20, k=3,
+                                         measure_memory=True)
+        assert np.all(table.peak_memory > 0)
+        assert np.isclose(table.median_error[0], row.median_error)
+        with pytest.raises(ValueError):
+            decoding_parameter_sweep(sta, pos, ds=0.5, backend='loky')
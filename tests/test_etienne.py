@@ -20,6 +20,62 @@ class TestEvenMore:
         assert np.allclose(merged.starts, np.array([1.0, 12.0, 15.0, 20.0, 30.0]))
         assert np.allclose(merged.stops, np.array([8.0, 13.0, 18.0, 25.0, 35.0]))
 
+    def test_EpochArray_merge_nested(self):
+        epoch = EpochArray([[1.0, 10.0], [2.0, 3.0], [10.5, 11.0]])
+        merged = epoch.merge()
+        assert np.allclose(merged.time, np.array([[1.0, 10.0], [10.5, 11.0]]))
+        merged = epoch.merge(gap=0.5)
+        assert np.allclose(merged.time, np.array([[1.0, 11.0]]))
+
+    def test_EpochArray_contains(self):
+        epoch = EpochArray([[5.0, 6.0], [1.0, 3.0], [2.0, 2.5]])
+        values = np.array([0.5, 1.0, 2.2, 3.0, 4.0, 6.0])
+        assert epoch.contains(2.2)
+        assert not epoch.contains(4.0)
+        assert np.array_equal(epoch.contains(values),
+                              [False, True, True, True, False, True])
+        # indices into the (sorted) epochs, -1 where not contained
+        epoch_idx = epoch.contains(values, return_index=True)
+        assert np.array_equal(epoch_idx, [-1, 0, 0, 0, -1, 2])
+
+    def test_EpochArray_set_operations(self):
+        a = EpochArray([[0.0, 4.0], [6.0, 10.0]])
+        b = EpochArray([[2.0, 7.0]])
+        c = EpochArray([[9.0, 12.0]])
+        assert np.allclose((a | b).time, [[0.0, 10.0]])
+        assert np.allclose(a.union(b, c).time, [[0.0, 12.0]])
+        assert np.allclose(a.intersection(b).time, [[2.0, 4.0], [6.0, 7.0]])
+        assert np.allclose((a - b).time, [[0.0, 2.0], [7.0, 10.0]])
+        assert np.allclose(a.difference(b, c).time, [[0.0, 2.0], [7.0, 9.0]])
+        assert np.allclose((a ^ b).time, [[0.0, 2.0], [4.0, 6.0], [7.0, 10.0]])
+        # time covered by an odd number of the arrays
+        assert np.allclose(a.symmetric_difference(b, c).time,
+                           [[0.0, 2.0], [4.0, 6.0], [7.0, 9.0], [10.0, 12.0]])
+
+    def test_EpochArray_sub_domain(self):
+        a = EpochArray([[0.0, 10.0]])
+        b = EpochArray([[4.0, 5.0]], domain=EpochArray([[3.0, 8.0]]))
+        # A - B is A intersect ~B, which stays within the domain of B
+        assert np.allclose((a - b).time, [[3.0, 4.0], [5.0, 8.0]])
+        assert np.allclose((a - b).time, a.intersect(~b).time)
+        # while difference ignores domains
+        assert np.allclose(a.difference(b).time, [[0.0, 4.0], [5.0, 10.0]])
+
+    def test_EpochArray_intersect(self):
+        a = EpochArray([[0.0, 4.0], [6.0, 10.0], [12.0, 14.0]])
+        b = EpochArray([[1.0, 2.0], [3.0, 7.0], [10.0, 12.0], [13.0, 20.0]])
+        intersect = a.intersect(b)
+        assert np.allclose(intersect.time, np.array([[1.0, 2.0],
+                                                     [3.0, 4.0],
+                                                     [6.0, 7.0],
+                                                     [13.0, 14.0]]))
+        # epochs of b that overlap a, without clipping; [10, 12) only
+        # touches a, so it is excluded
+        intersect = a.intersect(b, boundaries=False)
+        assert np.allclose(intersect.time, np.array([[1.0, 2.0],
+                                                     [3.0, 7.0],
+                                                     [13.0, 20.0]]))
+
     def test_add_signal1D_1(self):
         """Add a signal to an 1D AnalogSignalArray"""
         asa = AnalogSignalArray([1,2,4])
@@ -80,6 +136,32 @@ class TestEvenMore:
         -1.04719755]])
         assert np.all(np.isclose(casa.angle._ydata, expected))
 
+    def test_AnalogSignalArray_epoch_views(self):
+        asa = AnalogSignalArray([np.arange(10), 10*np.arange(10)],
+                                timestamps=np.arange(10), fs=1,
+                                support=EpochArray([[0, 3], [5, 9]]))
+        assert np.array_equal(asa.lengths, [3, 4])
+        segments = [segment for segment in asa]
+        assert np.array_equal(segments[1].time, [5, 6, 7, 8])
+        assert np.shares_memory(segments[1].ydata, asa.ydata)
+        assert np.array_equal(asa[0].ydata, [[0, 1, 2], [0, 10, 20]])
+        assert np.array_equal(asa[-1, 1].ydata, [[50, 60, 70, 80]])
+
+    def test_AnalogSignalArray_epoch_view_smooth_inplace(self):
+        asa = AnalogSignalArray([np.arange(10.0), 10*np.arange(10.0)],
+                                timestamps=np.arange(10), fs=1,
+                                support=EpochArray([[0, 3], [5, 9]]))
+        ydata = asa.ydata.copy()
+        for segment in asa:
+            segment.smooth(sigma=1, inplace=True)
+        asa[1].smooth(sigma=1, inplace=True)
+        asa[-1, 0].smooth(sigma=1, inplace=True)
+        assert np.array_equal(asa.ydata, ydata)
+        # while the segment itself is smoothed
+        segment = asa[1]
+        segment.smooth(sigma=1, inplace=True)
+        assert not np.allclose(segment.ydata, ydata[:, 3:])
+
     def test_AnalogSignalArray_ydata_format1(self):
         asa = AnalogSignalArray([[1, 2, 4], [7, 8, 9]])
         asa.add_signal([3, 4, 5])
@@ -24,3 +24,38 @@ class TestHalfOpenIntervals:
         asa = AnalogSignalArray([0,0,0,1,1,1,2,2,2])
         epochs = nel.utils.get_inactive_epochs(asa, v1=1, v2=1)
         assert np.allclose(epochs.time, np.array([0, 6]))
+
+    def test_AnalogSignalArray_restrict_overlapping(self):
+        asa = AnalogSignalArray([np.arange(10)], timestamps=np.arange(10), fs=1,
+                                support=EpochArray([[5, 7], [1, 3], [2, 4]]))
+        # stops are excluded, and samples in overlapping epochs are kept once
+        assert np.array_equal(asa.time, [1, 2, 3, 5, 6])
+
+    def test_AnalogSignalArray_restrict_copies(self):
+        asa = AnalogSignalArray([np.arange(10.0)], timestamps=np.arange(10), fs=1)
+        # one or several kept runs of samples are copies alike
+        for epochs in ([[2, 5]], [[2, 5], [7, 9]]):
+            restricted = asa[EpochArray(epochs)]
+            assert not np.shares_memory(restricted.ydata, asa.ydata)
+            assert not np.shares_memory(restricted.time, asa.time)
+        ydata = asa.ydata.copy()
+        asa[EpochArray([[2, 5]])].smooth(sigma=1, inplace=True)
+        assert np.array_equal(asa.ydata, ydata)
+
+    def test_EventArray_restrict_closed(self):
+        from nelpy.core._eventarray import EventArray
+        events = EventArray([1, 2, 3, 5, 7], support=EpochArray([[0, 2], [4, 5]]))
+        # unlike for AnalogSignalArrays, epoch stops are included
+        assert np.array_equal(events.time, [[1, 2, 5]])
+
+    def test_EventArray_restrict_twice(self):
+        from nelpy.core._eventarray import EventArray
+        events = EventArray([[1, 2, 3, 4], [1, 2, 4, 5]], state=[[1, 2, 3, 4], [5, 6, 7, 8]],
+                            support=EpochArray([[0, 10]]))
+        # the series keep different numbers of events, and are restricted again
+        events._restrict_to_epoch_array(epocharray=EpochArray([[0, 4.2]]))
+        events._restrict_to_epoch_array(epocharray=EpochArray([[0, 3]]))
+        assert np.array_equal(events.time[0], [1, 2, 3])
+        assert np.array_equal(events.time[1], [1, 2])
+        assert np.array_equal(events.state[0], [1, 2, 3])
+        assert np.array_equal(events.state[1], [5, 6])
@@ -0,0 +1,183 @@
+import numpy as np
+import pytest
+from scipy.special import logsumexp
+from scipy.stats import poisson
+
+pytest.importorskip('hmmlearn')
+pytest.importorskip('pandas')
+
+from nelpy.core import SpikeTrainArray, EpochArray
+from nelpy import hmmutils
+
+STARTPROB = np.array([0.5, 0.3, 0.2])
+TRANSMAT = np.array([[0.8, 0.1, 0.1],
+                     [0.2, 0.7, 0.1],
+                     [0.1, 0.3, 0.6]])
+# the third unit never fires in the second state
+MEANS = np.array([[1.0, 0.5, 2.0],
+                  [0.2, 3.0, 0.0],
+                  [2.5, 1.0, 0.4]])
+
+def _poisson_hmm(means=MEANS):
+    hmm = hmmutils.PoissonHMM(n_components=len(STARTPROB))
+    hmm.startprob_ = STARTPROB.copy()
+    hmm.transmat_ = TRANSMAT.copy()
+    # the nelpy fork of hmmlearn calls the rates means_, while upstream
+    # hmmlearn calls them lambdas_
+    hmm.means_ = means.copy()
+    hmm.lambdas_ = means.copy()
+    return hmm
+
+def _framelogprob(X, means=MEANS):
+    return poisson.logpmf(X[:, np.newaxis, :], means[np.newaxis]).sum(axis=-1)
+
+def _forward_logprob(framelogprob, startprob=STARTPROB, transmat=TRANSMAT):
+    """Log likelihood of every prefix of a single sequence, in log space."""
+    with np.errstate(divide='ignore'):
+        logtransmat = np.log(transmat)
+        logalpha = np.log(startprob) + framelogprob[0]
+    cumlogprob = [logsumexp(logalpha)]
+    for frame in framelogprob[1:]:
+        logalpha = logsumexp(logalpha[:, np.newaxis] + logtransmat, axis=0) + frame
+        cumlogprob.append(logsumexp(logalpha))
+    return np.array(cumlogprob)
+
+def _forward_posteriors(framelogprob, startprob=STARTPROB, transmat=TRANSMAT):
+    """Filtered state posteriors of a single sequence, in log space."""
+    with np.errstate(divide='ignore'):
+        logtransmat = np.log(transmat)
+        logalpha = np.log(startprob) + framelogprob[0]
+    posteriors = [np.exp(logalpha - logsumexp(logalpha))]
+    for frame in framelogprob[1:]:
+        logalpha = logsumexp(logalpha[:, np.newaxis] + logtransmat, axis=0) + frame
+        posteriors.append(np.exp(logalpha - logsumexp(logalpha)))
+    return np.array(posteriors)
+
+def _counts(n_bins, seed=0):
+    # the third unit is silent, so that the second state stays possible
+    counts = np.random.RandomState(seed).poisson(1.0, size=(n_bins, 3))
+    counts[:, 2] = 0
+    return counts
+
+def _binned_spikes():
+    # three events of 5, 1 and 6 bins; the third unit spikes in bins 1 and 10
+    sta = SpikeTrainArray([[0.5, 1.2, 1.7, 3.5, 7.5, 11.5, 12.5, 12.7, 15.5],
+                           [0.2, 2.5, 2.7, 4.5, 10.5, 13.5, 13.6, 14.5],
+                           [1.5, 14.2]], fs=10,
+                          support=EpochArray([[0, 5], [7, 8], [10, 16]]))
+    return sta.bin(ds=1)
+
+class TestHMMUtils:
+
+    def test_cumulative_forward_logprob(self):
+        counts = _counts(11)
+        # a spike from the third unit rules out the second state
+        counts[[2, 7], 2] = 1
+        framelogprob = _framelogprob(counts)
+        cumlogprob = hmmutils._cumulative_forward_logprob(framelogprob, STARTPROB, TRANSMAT)
+        assert np.all(np.isfinite(cumlogprob))
+        assert np.allclose(cumlogprob, _forward_logprob(framelogprob))
+
+    def test_cum_score_per_bin(self):
+        lengths = [4, 1, 6]
+        counts = _counts(sum(lengths))
+        counts[[2, 7], 2] = 1
+        framelogprob = _framelogprob(counts)
+        expected = np.hstack([_forward_logprob(frames) for frames in
+                              np.split(framelogprob, np.cumsum(lengths)[:-1])])
+        hmm = _poisson_hmm()
+        assert np.allclose(hmm._cum_score_per_bin(counts, lengths=lengths), expected)
+        # a single sequence by default
+        assert np.allclose(hmm._cum_score_per_bin(counts),
+                           _forward_logprob(framelogprob))
+
+    def test_cumulative_forward_logprob_lengths(self):
+        lengths = [4, 1, 6]
+        counts = _counts(sum(lengths))
+        counts[[2, 7], 2] = 1
+        framelogprob = _framelogprob(counts)
+        cumlogprob = hmmutils._cumulative_forward_logprob(framelogprob, STARTPROB,
+                                                          TRANSMAT, lengths=lengths)
+        expected = np.hstack([_forward_logprob(frames) for frames in
+                              np.split(framelogprob, np.cumsum(lengths)[:-1])])
+        assert np.allclose(cumlogprob, expected)
+
+    def test_batched_score_decode(self):
+        bst = _binned_spikes()
+        hmm = _poisson_hmm()
+        events = [bst[ii] for ii in range(bst.n_epochs)]
+
+        expected = [_forward_logprob(_framelogprob(event.data.T))[-1] for event in events]
+        assert np.allclose(hmm.score(bst), expected)
+        assert np.allclose(hmm.score(bst), [hmm.score(event)[0] for event in events])
+
+        logprobs, state_sequences, centers = hmm.decode(bst, algorithm='viterbi')
+        for logprob, state_sequence, center, event in zip(logprobs, state_sequences, centers, events):
+            expected_logprob, expected_sequence = hmm._decode(hmm, event.data.T, algorithm='viterbi')
+            assert np.isclose(logprob, expected_logprob)
+            assert np.array_equal(state_sequence, expected_sequence)
+            assert np.allclose(center, event.bin_centers)
+        # the second state is ruled out wherever the third unit spiked
+        assert np.all(np.concatenate(state_sequences)[[1, 10]] != 1)
+
+    def test_sliding_window_array(self):
+        bst = _binned_spikes()
+        hmm = _poisson_hmm()
+        for w in (1, 2, 3):
+            windows = []
+            for ii in range(bst.n_epochs):
+                data = bst[ii].data
+                # an epoch shorter than w is a single, partial window
+                n_windows = max(1, data.shape[1] - w + 1)
+                windows.append(np.array([data[:, tt:tt+w].sum(axis=1)
+                                         for tt in range(n_windows)]))
+            unwrapped, lengths = hmm._sliding_window_array(bst, w=w)
+            assert np.array_equal(unwrapped, np.vstack(windows))
+            assert np.array_equal(lengths, [len(window) for window in windows])
+            expected = [_forward_logprob(_framelogprob(window))[-1] for window in windows]
+            assert np.allclose(hmm.score(bst, w=w), expected)
+
+    def test_streaming_filter(self):
+        counts = _counts(12)
+        framelogprob = _framelogprob(counts)
+        filt = hmmutils.StreamingHMMFilter(_poisson_hmm())
+        posteriors = np.array([filt.update(row).copy() for row in counts])
+        assert filt.n_bins == len(counts)
+        assert np.all(np.isfinite(posteriors))
+        assert np.allclose(posteriors, _forward_posteriors(framelogprob))
+        assert np.isclose(filt.logprob, _forward_logprob(framelogprob)[-1])
+
+    def test_streaming_filter_zero_rate(self):
+        filt = hmmutils.StreamingHMMFilter(_poisson_hmm())
+        # a silent third unit is possible in every state
+        posterior = filt.update([1, 0, 0])
+        assert np.all(np.isfinite(posterior))
+        assert posterior[1] > 0
+        # while a spike from it rules out the second state
+        posterior = filt.update([0, 2, 1])
+        assert np.all(np.isfinite(posterior))
+        assert posterior[1] == 0
+        framelogprob = _framelogprob(np.array([[1, 0, 0], [0, 2, 1]]))
+        assert np.isclose(filt.logprob, _forward_logprob(framelogprob)[-1])
+
+    def test_streaming_filter_chunked(self):
+        lengths = [5, 8]
+        counts = _counts(sum(lengths))
+        counts[[2, 9], 2] = 1
+        hmm = _poisson_hmm()
+        filt = hmmutils.StreamingHMMFilter(hmm)
+        posteriors = np.zeros((len(counts), len(STARTPROB)))
+        logprobs = np.zeros(len(counts))
+        # each sequence arrives in chunks of uneven size, and the filter
+        # is reset between sequences
+        for sequence in np.split(np.arange(len(counts)), np.cumsum(lengths)[:-1]):
+            filt.reset()
+            for chunk in np.array_split(sequence, 3):
+                for tt in chunk:
+                    filt.update(counts[tt], out=posteriors[tt])
+                    logprobs[tt] = filt.logprob
+        assert np.allclose(logprobs, hmm._cum_score_per_bin(counts, lengths=lengths))
+        framelogprob = _framelogprob(counts)
+        expected = np.vstack([_forward_posteriors(frames) for frames in
+                              np.split(framelogprob, np.cumsum(lengths)[:-1])])
+        assert np.allclose(posteriors, expected)
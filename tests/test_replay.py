@@ -0,0 +1,121 @@
+from nelpy.analysis import replay
+import numpy as np
+import pytest
+
+def _permuted_sum(rng, x):
+    return np.cumsum(rng.permutation(x))
+
+class TestReplay:
+
+    def test_run_shuffles_reproducible(self):
+        x = np.arange(20)
+        serial = replay.run_shuffles(_permuted_sum, 10, args=(x,), random_state=42)
+        threaded = replay.run_shuffles(_permuted_sum, 10, args=(x,), random_state=42,
+                                       n_jobs=3, backend='thread')
+        assert len(serial) == 10
+        assert np.array_equal(np.array(serial), np.array(threaded))
+        # every shuffle gets its own stream
+        assert not np.array_equal(serial[0], serial[1])
+        processes = replay.run_shuffles(_permuted_sum, 10, args=(x,), random_state=42,
+                                        n_jobs=2, backend='process')
+        assert np.array_equal(np.array(serial), np.array(processes))
+
+    def test_run_shuffles_global_seed(self):
+        x = np.arange(20)
+        np.random.seed(0)
+        first = replay.run_shuffles(_permuted_sum, 5, args=(x,))
+        np.random.seed(0)
+        second = replay.run_shuffles(_permuted_sum, 5, args=(x,), n_jobs=2,
+                                     backend='thread')
+        assert np.array_equal(np.array(first), np.array(second))
+
+    def test_non_integer_arguments(self):
+        with pytest.raises(ValueError):
+            replay.linregress_ting(None, None, n_shuffles=2.5)
+        with pytest.raises(ValueError):
+            replay.trajectory_score_bst(None, None, w=1.5)
+        with pytest.raises(ValueError):
+            replay.trajectory_score_bst(None, None, n_shuffles=2.5)
+        with pytest.raises(ValueError):
+            replay.trajectory_score_array(np.ones((4, 3)), w=0.5)
+        with pytest.raises(ValueError):
+            replay.score_hmm_transmat_shuffle(None, None, n_shuffles=2.5)
+        with pytest.raises(ValueError):
+            replay.score_hmm_time_resolved(None, None, n_shuffles=2.5)
+
+    def test_trajectory_score_surrogates(self):
+        rs = np.random.RandomState(1)
+        posterior = rs.dirichlet(np.ones(12)*0.3, size=9).T
+        posterior[:, 4] = np.nan
+        ts, cc = replay.trajectory_score_surrogates(posterior, n_shuffles=5,
+                                                    w=1, rng=7)
+        # the same surrogates, built and scored one at a time
+        rng = np.random.default_rng(7)
+        perms = replay.time_swap_indices(9, 5, rng=rng)
+        shifts = replay.column_cycle_shifts(12, 9, 5, rng=rng)
+        for ii in range(5):
+            assert np.isclose(ts[ii], replay.trajectory_score_array(
+                posterior[:, perms[ii]], w=1))
+            assert np.isclose(cc[ii], replay.trajectory_score_array(
+                replay.column_cycle_array(posterior, amt=shifts[ii]), w=1))
+
+    def test_trajectory_score_surrogates_tied_modes(self):
+        rs = np.random.RandomState(3)
+        posterior = rs.dirichlet(np.ones(30)*0.3, size=12).T
+        # flat columns, and a column with two tied maxima
+        posterior[:, [3, 8]] = 1/30
+        posterior[:, 5] = 0
+        posterior[[2, 17], 5] = 0.5
+        ts, cc = replay.trajectory_score_surrogates(posterior, n_shuffles=50,
+                                                    w=1, rng=7)
+        rng = np.random.default_rng(7)
+        replay.time_swap_indices(12, 50, rng=rng)
+        shifts = replay.column_cycle_shifts(30, 12, 50, rng=rng)
+        expected = [replay.trajectory_score_array(
+            replay.column_cycle_array(posterior, amt=shifts[ii]), w=1) for ii in range(50)]
+        assert np.allclose(cc, expected)
+
+    def test_linregress_segments(self):
+        from scipy import stats
+        y = np.array([1, 2, np.nan, 4, 3, 0, np.nan, 5, 1, 1, 2, 7])
+        bdries = np.array([0, 4, 4, 9, 12])
+        x = np.arange(len(y))
+        slopes, intercepts, r2values = replay._linregress_segments(x, y, bdries)
+        for ii in [0, 2, 3]:
+            xx = x[bdries[ii]:bdries[ii+1]]
+            yy = y[bdries[ii]:bdries[ii+1]]
+            res = stats.linregress(xx[~np.isnan(yy)], yy[~np.isnan(yy)])
+            assert np.isclose(slopes[ii], res.slope)
+            assert np.isclose(intercepts[ii], res.intercept)
+            assert np.isclose(r2values[ii], res.rvalue**2)
+        # empty segment
+        assert np.isnan(r2values[1])
+
+    def test_linregress_shuffle_trailing_nan_event(self):
+        from scipy import stats
+        mode_pth = np.array([1, 3, 2, 5, 2, 4, 1, 6, 3, 7, 2, 8, np.nan, np.nan])
+        bdries = np.array([0, 4, 12, 14])
+        r2values = replay._linregress_shuffle(np.random.default_rng(0), mode_pth, bdries)
+        # repeat the permutation of the time bins of the shuffle
+        rng = np.random.default_rng(0)
+        x = np.arange(12)
+        seg_id = np.repeat([0, 1], [4, 8])
+        perm = np.argsort(seg_id + rng.random(12), kind='mergesort')
+        res = stats.linregress(x[perm][4:], mode_pth[4:12])
+        assert np.isclose(r2values[1], res.rvalue**2)
+        # the last event has no decoded bins at all
+        assert np.isnan(r2values[2])
+        assert np.allclose(replay._segment_sums(np.arange(1, 6), [0, 2, 5, 5]),
+                           [3, 12, 0])
+
+    def test_trajectory_line_search_array(self):
+        posterior = np.full((10, 6), 0.02)
+        posterior[np.arange(2, 8), np.arange(6)] = 0.82
+        posterior[:, 3] = np.nan
+        score, slope, intercept = replay.trajectory_line_search_array(posterior)
+        assert np.isclose(score, 5*0.82)
+        assert slope == 1
+        assert intercept == 2
+        # a band of 3 rows around the line
+        score, _, _ = replay.trajectory_line_search_array(posterior, w=1)
+        assert np.isclose(score, 5*(0.82 + 2*0.02))
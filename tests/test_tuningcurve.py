@@ -0,0 +1,54 @@
+import nelpy as nel
+from nelpy.core import *
+from nelpy.auxiliary._tuningcurve import _ExternCache
+import numpy as np
+
+def _bst():
+    sta = SpikeTrainArray([[0.05, 0.12, 0.15, 0.33, 0.71],
+                           [0.21, 0.25, 0.52, 0.55, 0.58]],
+                          fs=100, support=EpochArray([[0, 0.8]]))
+    return sta.bin(ds=0.1)
+
+class TestTuningCurve:
+
+    def test_TuningCurve1D_ratemap(self):
+        bst = _bst()
+        t = np.linspace(0, 0.8, 81)
+        # position sweeps through the four bins in 0.2 s blocks
+        extern = AnalogSignalArray(np.floor(t/0.2) + 0.5, timestamps=t, fs=100)
+        tc = nel.TuningCurve1D(bst=bst, extern=extern, n_extern=4,
+                               extmin=0, extmax=4, minbgrate=0)
+        assert np.array_equal(tc.occupancy, [2, 2, 2, 2])
+        # spike counts per bin, divided by ds and by occupancy
+        expected = np.array([[3, 1, 0, 1], [0, 2, 3, 0]]) / 0.2
+        assert np.allclose(tc.ratemap, expected)
+
+    def test_TuningCurve2D_ratemap(self):
+        bst = _bst()
+        t = np.linspace(0, 0.8, 81)
+        x = np.floor(t/0.2) % 2 + 0.5
+        y = np.floor(t/0.4) + 0.5
+        extern = AnalogSignalArray([x, y], timestamps=t, fs=100)
+        tc = nel.TuningCurve2D(bst=bst, extern=extern, ext_nx=2, ext_ny=2,
+                               ext_xmin=0, ext_xmax=2, ext_ymin=0,
+                               ext_ymax=2, minbgrate=0)
+        assert np.array_equal(tc.occupancy, [[2, 2], [2, 2]])
+        expected = np.array([[[3, 0], [1, 1]], [[0, 3], [2, 0]]]) / 0.2
+        assert np.allclose(tc.ratemap, expected)
+
+    def test_extern_cache(self):
+        t = np.linspace(0, 10, 101)
+        extern = AnalogSignalArray(2*t, timestamps=t, fs=10)
+        cache = _ExternCache(maxsize=2)
+        at = np.array([0.25, 1.5, 7.0])
+        ext = cache.get(extern, at)
+        assert np.allclose(ext, extern.asarray(at=at).yvals)
+        # same points, different array object
+        assert cache.get(extern, at.copy()) is ext
+        assert np.array_equal(cache.bin_indices(extern, at, [0, 5, 10, 15]),
+                              [1, 1, 3])
+        cache.prefetch(extern, [np.array([1.0, 2.0]), np.array([2.0, 3.0])])
+        assert len(cache) == 2
+        assert np.allclose(cache.get(extern, np.array([2.0, 3.0])), [4, 6])
+        # the least recently used entry (at) was evicted
+        assert cache.get(extern, at) is not ext